@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Packaging benchmark - Times package_skill's archive writer on a synthetic skill
+
+Generates a skill tree of source files, large text datasets and incompressible
+assets, then packages it cold with one worker and with a process pool, again
+after editing one file, and once more with nothing changed.
+
+Usage:
+    python skill-tools/bench_package.py [--size-mb 200] [--files 2000] [--workers N]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from package_skill import collect_files, write_archive
+
+
+def make_skill(root, size_mb, n_files, seed=1):
+    """Write a synthetic skill; returns its path and one source file to edit."""
+    rng = random.Random(seed)
+    skill = root / "bench-skill"
+    (skill / "scripts").mkdir(parents=True)
+    (skill / "references").mkdir()
+    (skill / "assets").mkdir()
+    (skill / "SKILL.md").write_text("---\nname: bench-skill\ndescription: Benchmark skill\n---\n\n# Bench\n")
+
+    words = [f"word{i}" for i in range(500)]
+    for i in range(n_files):
+        lines = (" ".join(rng.choices(words, k=12)) for _ in range(40))
+        (skill / "scripts" / f"module_{i:05d}.py").write_text("\n".join(f"# {line}" for line in lines))
+
+    # Half the volume as compressible datasets, half as compressed assets.
+    data_bytes = size_mb * (1 << 20) // 2
+    n_data = 4
+    for i in range(n_data):
+        with open(skill / "references" / f"data_{i}.csv", "w") as f:
+            written = 0
+            while written < data_bytes // n_data:
+                row = f"{rng.randrange(10**6)},{rng.uniform(-90, 90):.6f},{rng.uniform(-180, 180):.6f},{rng.choice(words)}\n"
+                f.write(row)
+                written += len(row)
+    for i in range(16):
+        (skill / "assets" / f"image_{i:02d}.png").write_bytes(os.urandom(data_bytes // 16))
+    return skill, skill / "scripts" / "module_00000.py"
+
+
+def run(skill, out, workers):
+    archive = out / f"{skill.name}.skill"
+    manifest = out / f"{skill.name}.skill.manifest.json"
+    start = time.perf_counter()
+    files = collect_files(skill, exclude=(archive, manifest))
+    stats = write_archive(archive, manifest, files, workers)
+    return time.perf_counter() - start, stats
+
+
+def report(label, seconds, stats):
+    if stats is None:
+        print(f"{label:<24} {seconds * 1e3:9.0f} ms  up to date")
+        return
+    mb = stats["bytes_in"] / 1e6
+    print(
+        f"{label:<24} {seconds * 1e3:9.0f} ms  {mb / seconds:7.1f} MB/s  "
+        f"{stats['deflated']:5d} deflated {stats['stored']:3d} stored {stats['reused']:5d} reused  "
+        f"{stats['bytes_out'] / 1e6:.1f} MB out"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark skill packaging")
+    parser.add_argument("--size-mb", type=int, default=200, help="Approximate size of the data files")
+    parser.add_argument("--files", type=int, default=2000, help="Number of small source files")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        skill, source = make_skill(tmp, args.size_mb, args.files)
+        print(f"skill: {args.files} source files, ~{args.size_mb} MB of data, {args.workers} CPU worker(s)\n")
+
+        out_serial, out_pool = tmp / "serial", tmp / "pool"
+        out_serial.mkdir()
+        out_pool.mkdir()
+        report("cold, 1 worker", *run(skill, out_serial, 1))
+        report(f"cold, {args.workers} workers", *run(skill, out_pool, args.workers))
+        source.write_text(source.read_text() + "\n# edited\n")
+        report("one file changed", *run(skill, out_pool, args.workers))
+        report("nothing changed", *run(skill, out_pool, args.workers))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,27 +2,483 @@
 """
 Skill Packager - Creates a distributable .skill file of a skill folder
 
+Files matched by a .gitignore (in the skill folder or the enclosing git
+repository) or a .skillignore are left out. Packaging is incremental: a
+manifest of content hashes is written next to the .skill file, and files
+unchanged since the previous run are copied from the previous archive
+without being recompressed. Entries are sorted and carry fixed timestamps,
+so the same sources always produce the same archive. Files are deflated
+in parallel in a process pool and streamed into the archive; formats that
+are compressed already (images, archives, Parquet...) are stored as is.
+
 Usage:
-    python utils/package_skill.py <path/to/skill-folder> [output-directory]
+    python utils/package_skill.py <path/to/skill-folder> [output-directory] [--workers N]
+        [--extra SOURCE=PATH ...]
 
 Example:
     python utils/package_skill.py skills/public/my-skill
     python utils/package_skill.py skills/public/my-skill ./dist
 """
 
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import stat
+import struct
 import sys
+import tempfile
+import time
 import zipfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 from quick_validate import validate_skill
 
+MANIFEST_VERSION = 2
+COMPRESSLEVEL = 6
+CHUNK_SIZE = 1 << 20
+# Compressed members larger than this are spooled to disk by the pool workers.
+SPOOL_THRESHOLD = 4 << 20
+# Small files are deflated in batches of about this many bytes per pool task.
+BATCH_BYTES = 1 << 20
+# Below this many bytes to deflate, starting a process pool costs more than it saves.
+POOL_MIN_BYTES = 4 << 20
+# Deflated members not smaller than this fraction of the original are stored.
+MAX_DEFLATE_RATIO = 0.95
+# Formats that are compressed already: deflating them only costs time.
+STORED_SUFFIXES = {
+    ".png", ".jpg", ".jpeg", ".gif", ".webp", ".avif", ".heic", ".ico",
+    ".mp3", ".mp4", ".m4a", ".ogg", ".webm", ".mov",
+    ".zip", ".gz", ".tgz", ".bz2", ".xz", ".zst", ".7z", ".br", ".lz4",
+    ".whl", ".jar", ".skill", ".parquet", ".arrow", ".feather", ".npz",
+    ".pdf", ".woff", ".woff2", ".docx", ".xlsx", ".pptx",
+}
+# Earliest date a zip archive can hold; used for every entry.
+FIXED_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+# Never packaged, whatever the ignore files say.
+DEFAULT_IGNORES = [".git/", "__pycache__/", "*.py[cod]", ".DS_Store", ".skillignore"]
+IGNORE_FILES = (".gitignore", ".skillignore")
+
+
+# ----------------------------------------------------------------------
+# Ignore rules
+# ----------------------------------------------------------------------
 
-def package_skill(skill_path, output_dir=None):
+def _glob_to_regex(pattern):
+    """Translate a gitignore glob into a regex over "/"-separated paths."""
+    out, i = [], 0
+    while i < len(pattern):
+        c = pattern[i]
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+            continue
+        if c == "*":
+            out.append("[^/]*")
+        elif c == "?":
+            out.append("[^/]")
+        elif c == "[":
+            end = pattern.find("]", i + 1)
+            if end == -1:
+                out.append(re.escape(c))
+            else:
+                body = pattern[i + 1:end]
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                out.append(f"[{body}]")
+                i = end
+        elif c == "\\" and i + 1 < len(pattern):
+            i += 1
+            out.append(re.escape(pattern[i]))
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return "".join(out)
+
+
+class IgnoreRules:
+    """
+    gitignore-style rules: later rules win, "!" re-includes, a trailing "/"
+    only matches directories, and a pattern containing "/" is anchored to
+    the directory of the file that defines it.
+    """
+
+    def __init__(self):
+        self._rules = []  # (base directory, regex, negate, dir_only)
+
+    def add(self, base, lines):
+        base = Path(base).as_posix().rstrip("/")
+        for line in lines:
+            line = line.rstrip("\n")
+            if not line.strip() or line.startswith("#"):
+                continue
+            line = line.rstrip()
+            negate = line.startswith("!")
+            if negate:
+                line = line[1:]
+            elif line.startswith("\\"):
+                line = line[1:]
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            if not line:
+                continue
+            regex = _glob_to_regex(line.lstrip("/"))
+            if "/" not in line:
+                regex = "(?:.*/)?" + regex
+            self._rules.append((base, re.compile(regex + r"\Z"), negate, dir_only))
+
+    def add_file(self, path):
+        path = Path(path)
+        if path.is_file():
+            self.add(path.parent, path.read_text(encoding="utf-8", errors="replace").splitlines())
+
+    def ignored(self, path, is_dir):
+        path = Path(path).as_posix()
+        result = False
+        for base, regex, negate, dir_only in self._rules:
+            if dir_only and not is_dir:
+                continue
+            if not path.startswith(base + "/"):
+                continue
+            if regex.match(path, len(base) + 1):
+                result = not negate
+        return result
+
+
+def _repository_ignores(skill_path, rules):
+    """Load the .gitignore files between the git repository root and the skill."""
+    ancestors = []
+    for directory in skill_path.parents:
+        ancestors.append(directory)
+        if (directory / ".git").exists():
+            break
+    else:
+        return  # Not in a git repository: only the skill's own files apply.
+    for directory in reversed(ancestors):
+        rules.add_file(directory / ".gitignore")
+
+
+def collect_files(skill_path, exclude=()):
+    """
+    List the files to package, sorted by archive name.
+
+    Args:
+        skill_path: Resolved path to the skill folder
+        exclude: Paths never to package (e.g. the output archive)
+
+    Returns:
+        List of (archive name, path) tuples
+    """
+    rules = IgnoreRules()
+    rules.add(skill_path, DEFAULT_IGNORES)
+    _repository_ignores(skill_path, rules)
+    exclude = {Path(p) for p in exclude}
+
+    files = []
+    for root, dirs, names in os.walk(skill_path):
+        root = Path(root)
+        for name in IGNORE_FILES:
+            rules.add_file(root / name)
+        # Prune ignored directories so virtualenvs and caches are never walked.
+        dirs[:] = sorted(d for d in dirs if not rules.ignored(root / d, True))
+        for name in names:
+            path = root / name
+            if path in exclude or rules.ignored(path, False) or not path.is_file():
+                continue
+            files.append((path.relative_to(skill_path.parent).as_posix(), path))
+    files.sort()
+    return files
+
+
+# ----------------------------------------------------------------------
+# Archive
+# ----------------------------------------------------------------------
+
+def _file_mode(path):
+    """Normalized permissions: executable or not, nothing else."""
+    return 0o755 if path.stat().st_mode & 0o111 else 0o644
+
+
+def _digest(entries):
+    """Digest of the archive contents, for caching packaged skills."""
+    h = hashlib.sha256()
+    for arcname, entry in sorted(entries.items()):
+        h.update(f"{arcname}\0{entry['sha256']}\0{entry['mode']:o}\n".encode())
+    return h.hexdigest()
+
+
+def _sha256_file(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _load_manifest(manifest_path, archive_path):
+    """Return the previous manifest if it still describes the archive on disk."""
+    try:
+        manifest = json.loads(manifest_path.read_text())
+    except (OSError, ValueError):
+        return None
+    if manifest.get("version") != MANIFEST_VERSION or manifest.get("compresslevel") != COMPRESSLEVEL:
+        return None
+    if not archive_path.is_file() or _sha256_file(archive_path) != manifest.get("archive_sha256"):
+        return None
+    return manifest
+
+
+def _raw_chunks(archive, zinfo):
+    """Compressed bytes of an archive member, as stored, in chunks."""
+    fp = archive.fp
+    fp.seek(zinfo.header_offset)
+    header = fp.read(zipfile.sizeFileHeader)
+    name_length, extra_length = struct.unpack("<HH", header[26:30])
+    fp.seek(zinfo.header_offset + zipfile.sizeFileHeader + name_length + extra_length)
+    remaining = zinfo.compress_size
+    while remaining:
+        chunk = fp.read(min(CHUNK_SIZE, remaining))
+        if not chunk:
+            raise zipfile.BadZipFile(f"Truncated member in previous archive: {zinfo.filename}")
+        remaining -= len(chunk)
+        yield chunk
+
+
+def _file_chunks(path):
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            yield chunk
+
+
+def _write_member(zipf, arcname, entry, chunks):
+    """
+    Stream an already compressed (or stored) member into an archive being written.
+
+    zipfile has no public API for this; the member is written the way
+    ZipFile.writestr does it, so close() writes a normal central directory.
+    """
+    zinfo = zipfile.ZipInfo(arcname, date_time=FIXED_DATE_TIME)
+    zinfo.create_system = 3
+    zinfo.external_attr = (stat.S_IFREG | entry["mode"]) << 16
+    zinfo.compress_type = entry["compress_type"]
+    zinfo.CRC = entry["crc"]
+    zinfo.file_size = entry["size"]
+    zinfo.compress_size = entry["compress_size"]
+    zinfo.header_offset = zipf.fp.tell()
+    zipf.fp.write(zinfo.FileHeader())
+    written = 0
+    for chunk in chunks:
+        zipf.fp.write(chunk)
+        written += len(chunk)
+    if written != entry["compress_size"]:
+        raise OSError(f"{arcname} changed while it was being packaged")
+    zipf.filelist.append(zinfo)
+    zipf.NameToInfo[arcname] = zinfo
+    zipf.start_dir = zipf.fp.tell()
+    zipf._didModify = True
+
+
+def _stored(path):
+    """Whether a file is kept as is: its format is compressed already."""
+    return path.suffix.lower() in STORED_SUFFIXES
+
+
+def _hash_file(path):
+    """Content hash, CRC-32 and size of a file, read in chunks."""
+    h, crc, size = hashlib.sha256(), 0, 0
+    for chunk in _file_chunks(path):
+        h.update(chunk)
+        crc = zlib.crc32(chunk, crc)
+        size += len(chunk)
+    return {"sha256": h.hexdigest(), "size": size, "crc": crc, "mode": _file_mode(path)}
+
+
+def _deflate_file(path, spool_dir):
+    """
+    Deflate one file; runs in the compression pool.
+
+    Returns:
+        (crc, compressed size, compressed bytes or None, spool file or None).
+        Large outputs are spooled to a file in ``spool_dir`` rather than sent
+        back through the pool; (crc, None, None, None) means deflate saved too
+        little and the file should be stored.
+    """
+    compressor = zlib.compressobj(COMPRESSLEVEL, zlib.DEFLATED, -15)
+    crc = size = compressed = 0
+    buffer, spool = [], None
+    for chunk in _file_chunks(path):
+        crc = zlib.crc32(chunk, crc)
+        size += len(chunk)
+        out = compressor.compress(chunk)
+        if spool is None and compressed + len(out) > SPOOL_THRESHOLD:
+            spool = tempfile.NamedTemporaryFile(dir=spool_dir, delete=False)
+            spool.writelines(buffer)
+            buffer = []
+        (buffer.append if spool is None else spool.write)(out)
+        compressed += len(out)
+    out = compressor.flush()
+    (buffer.append if spool is None else spool.write)(out)
+    compressed += len(out)
+    if spool is not None:
+        spool.close()
+    if compressed > size * MAX_DEFLATE_RATIO:
+        if spool is not None:
+            os.unlink(spool.name)
+        return crc, None, None, None
+    if spool is not None:
+        return crc, compressed, None, spool.name
+    return crc, compressed, b"".join(buffer), None
+
+
+def _deflate_batch(paths, spool_dir):
+    return [_deflate_file(path, spool_dir) for path in paths]
+
+
+def _batches(jobs):
+    """Group consecutive small files so each pool task is worth its overhead."""
+    batch, batch_size = [], 0
+    for path, size in jobs:
+        if batch and batch_size + size > BATCH_BYTES:
+            yield batch
+            batch, batch_size = [], 0
+        batch.append(path)
+        batch_size += size
+    if batch:
+        yield batch
+
+
+def write_archive(skill_filename, manifest_path, files, workers=None):
+    """
+    Write the archive of ``files``, reusing unchanged members of the previous one.
+
+    Hashing runs in threads and deflating in a process pool; members are
+    streamed into the archive in name order as their compressed data arrives.
+
+    Args:
+        skill_filename: Path of the .skill file to write
+        manifest_path: Path of its manifest
+        files: (archive name, path) tuples, sorted by archive name
+        workers: Compression processes (default: one per CPU)
+
+    Returns:
+        Packaging statistics, or None if the archive was already up to date
+    """
+    start = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    previous = _load_manifest(manifest_path, skill_filename)
+    previous_files = previous["files"] if previous else {}
+
+    with ThreadPoolExecutor(max_workers=min(32, workers + 4)) as hashers:
+        hashed = hashers.map(_hash_file, [path for _, path in files])
+        entries = {arcname: entry for (arcname, _), entry in zip(files, hashed)}
+
+    digest = _digest(entries)
+    if previous and previous.get("digest") == digest:
+        return None
+
+    old = zipfile.ZipFile(skill_filename) if previous else None
+    plan, to_deflate = {}, []
+    for arcname, path in files:
+        entry = entries[arcname]
+        before = previous_files.get(arcname)
+        if before and before["sha256"] == entry["sha256"]:
+            try:
+                zinfo = old.getinfo(arcname)
+            except KeyError:
+                zinfo = None
+            if zinfo is not None and zinfo.CRC == entry["crc"] and zinfo.file_size == entry["size"]:
+                plan[arcname] = ("reuse", zinfo)
+                continue
+        if _stored(path) or not entry["size"]:
+            plan[arcname] = ("store", path)
+        else:
+            plan[arcname] = ("deflate", path)
+            to_deflate.append((path, entry["size"]))
+
+    stats = {
+        "files": len(files), "reused": 0, "deflated": 0, "stored": 0,
+        "bytes_in": sum(e["size"] for e in entries.values()), "bytes_out": 0,
+        "workers": 1,
+    }
+    tmp = skill_filename.with_name(skill_filename.name + ".tmp")
+    spool_dir = tempfile.mkdtemp(prefix="package_skill-", dir=skill_filename.parent)
+    pool = None
+    try:
+        batches = list(_batches(to_deflate))
+        if workers > 1 and len(batches) > 1 and sum(size for _, size in to_deflate) >= POOL_MIN_BYTES:
+            pool = ProcessPoolExecutor(max_workers=workers)
+            stats["workers"] = workers
+            results = pool.map(_deflate_batch, batches, [spool_dir] * len(batches))
+        else:
+            results = (_deflate_batch(batch, spool_dir) for batch in batches)
+        deflated = (result for batch in results for result in batch)
+
+        with zipfile.ZipFile(tmp, "w") as zipf:
+            for arcname, entry in entries.items():
+                action, source = plan[arcname]
+                if action == "reuse":
+                    entry["compress_type"] = source.compress_type
+                    entry["compress_size"] = source.compress_size
+                    chunks = _raw_chunks(old, source)
+                    stats["reused"] += 1
+                elif action == "deflate":
+                    crc, compressed, data, spool = next(deflated)
+                    if crc != entry["crc"]:
+                        raise OSError(f"{arcname} changed while it was being packaged")
+                    if compressed is None:
+                        action = "store"
+                    else:
+                        entry["compress_type"] = zipfile.ZIP_DEFLATED
+                        entry["compress_size"] = compressed
+                        chunks = [data] if spool is None else _file_chunks(spool)
+                        stats["deflated"] += 1
+                if action == "store":
+                    entry["compress_type"] = zipfile.ZIP_STORED
+                    entry["compress_size"] = entry["size"]
+                    chunks = _file_chunks(source)
+                    stats["stored"] += 1
+                _write_member(zipf, arcname, entry, chunks)
+                stats["bytes_out"] += entry["compress_size"]
+                if action == "deflate" and spool is not None:
+                    os.unlink(spool)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        if old is not None:
+            old.close()
+        shutil.rmtree(spool_dir, ignore_errors=True)
+    os.replace(tmp, skill_filename)
+
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "compresslevel": COMPRESSLEVEL,
+        "digest": digest,
+        "archive_sha256": _sha256_file(skill_filename),
+        "files": entries,
+    }
+    manifest_path.write_text(json.dumps(manifest, indent=2, sort_keys=True) + "\n")
+    stats["seconds"] = time.perf_counter() - start
+    return stats
+
+
+def package_skill(skill_path, output_dir=None, workers=None, extra_files=()):
     """
     Package a skill folder into a .skill file.
 
     Args:
         skill_path: Path to the skill folder
         output_dir: Optional output directory for the .skill file (defaults to current directory)
+        workers: Compression processes (default: one per CPU)
+        extra_files: (source path, path inside the skill) pairs of files that
+            are not in the skill folder, e.g. a generated cache snapshot
 
     Returns:
         Path to the created .skill file, or None if error
@@ -44,15 +500,6 @@ def package_skill(skill_path, output_dir=None):
         print(f"❌ Error: SKILL.md not found in {skill_path}")
         return None
 
-    # Run validation before packaging
-    print("🔍 Validating skill...")
-    valid, message = validate_skill(skill_path)
-    if not valid:
-        print(f"❌ Validation failed: {message}")
-        print("   Please fix the validation errors before packaging.")
-        return None
-    print(f"✅ {message}\n")
-
     # Determine output location
     skill_name = skill_path.name
     if output_dir:
@@ -62,19 +509,40 @@ def package_skill(skill_path, output_dir=None):
         output_path = Path.cwd()
 
     skill_filename = output_path / f"{skill_name}.skill"
+    manifest_path = output_path / f"{skill_name}.skill.manifest.json"
+    files = collect_files(skill_path, exclude=(skill_filename, manifest_path))
+    if extra_files:
+        extras = {}
+        for source, inside in extra_files:
+            source = Path(source).resolve()
+            if not source.is_file():
+                print(f"❌ Error: Extra file not found: {source}")
+                return None
+            extras[f"{skill_name}/{Path(inside).as_posix().lstrip('/')}"] = source
+        files = sorted([(arcname, path) for arcname, path in files if arcname not in extras] + list(extras.items()))
+
+    # Run validation before packaging, on the files that will be packaged
+    print("🔍 Validating skill...")
+    valid, message = validate_skill(skill_path, files)
+    if not valid:
+        print(f"❌ Validation failed: {message}")
+        print("   Please fix the validation errors before packaging.")
+        return None
+    print(f"✅ {message}\n")
 
     # Create the .skill file (zip format)
     try:
-        with zipfile.ZipFile(skill_filename, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            # Walk through the skill directory
-            for file_path in skill_path.rglob('*'):
-                if file_path.is_file():
-                    # Calculate the relative path within the zip
-                    arcname = file_path.relative_to(skill_path.parent)
-                    zipf.write(file_path, arcname)
-                    print(f"  Added: {arcname}")
-
-        print(f"\n✅ Successfully packaged skill to: {skill_filename}")
+        stats = write_archive(skill_filename, manifest_path, files, workers)
+        if stats is None:
+            print(f"✅ Up to date: {skill_filename} ({len(files)} files unchanged)")
+            return skill_filename
+
+        mb_in, mb_out = stats["bytes_in"] / 1e6, stats["bytes_out"] / 1e6
+        print(f"✅ Successfully packaged skill to: {skill_filename}")
+        print(f"   {stats['files']} files: {stats['deflated']} deflated, {stats['stored']} stored, "
+              f"{stats['reused']} reused from the previous archive")
+        print(f"   {mb_in:.1f} MB -> {mb_out:.1f} MB in {stats['seconds']:.2f}s "
+              f"({mb_in / max(stats['seconds'], 1e-6):.1f} MB/s, {stats['workers']} worker(s))")
         return skill_filename
 
     except Exception as e:
@@ -83,22 +551,32 @@ def package_skill(skill_path, output_dir=None):
 
 
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: python utils/package_skill.py <path/to/skill-folder> [output-directory]")
-        print("\nExample:")
-        print("  python utils/package_skill.py skills/public/my-skill")
-        print("  python utils/package_skill.py skills/public/my-skill ./dist")
-        sys.exit(1)
-
-    skill_path = sys.argv[1]
-    output_dir = sys.argv[2] if len(sys.argv) > 2 else None
+    parser = argparse.ArgumentParser(
+        description="Package a skill folder into a distributable .skill file",
+        epilog="Example: python utils/package_skill.py skills/public/my-skill ./dist",
+    )
+    parser.add_argument("skill_path", help="Path to the skill folder")
+    parser.add_argument("output_dir", nargs="?", help="Output directory (default: current directory)")
+    parser.add_argument("--workers", type=int, help="Compression processes (default: one per CPU)")
+    parser.add_argument(
+        "--extra", action="append", default=[], metavar="SOURCE=PATH",
+        help="Add a file from outside the skill folder at PATH inside the skill "
+             "(repeatable), e.g. --extra cache.snapshot=scripts/cache.snapshot",
+    )
+    args = parser.parse_args()
+    extra_files = []
+    for extra in args.extra:
+        source, sep, inside = extra.partition("=")
+        if not sep or not source or not inside:
+            parser.error(f"--extra expects SOURCE=PATH, got {extra!r}")
+        extra_files.append((source, inside))
 
-    print(f"📦 Packaging skill: {skill_path}")
-    if output_dir:
-        print(f"   Output directory: {output_dir}")
+    print(f"📦 Packaging skill: {args.skill_path}")
+    if args.output_dir:
+        print(f"   Output directory: {args.output_dir}")
     print()
 
-    result = package_skill(skill_path, output_dir)
+    result = package_skill(args.skill_path, args.output_dir, args.workers, extra_files)
 
     if result:
         sys.exit(0)
@@ -0,0 +1,543 @@
+#!/usr/bin/env python3
+"""
+Quick Skill Validator - Checks a skill folder before it is packaged
+
+Checks the SKILL.md frontmatter, that every Python script only imports
+modules of the skill, the standard library or its declared dependencies
+(pyproject.toml / requirements.txt), and the signatures of MCP tools
+(@tool / @mcp.tool functions): docstring, annotated parameters, unique names.
+
+Files are parsed concurrently, and results are cached by content hash in
+~/.cache/skill-tools/validate.json (SKILL_VALIDATE_CACHE): an unchanged
+skill validates without parsing anything, and after an edit only the
+changed files are parsed again.
+
+Usage:
+    python utils/quick_validate.py <path/to/skill-folder>... [--no-cache]
+"""
+
+import argparse
+import ast
+import hashlib
+import importlib.metadata
+import importlib.util
+import json
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import yaml
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11: pyproject.toml dependencies are not read.
+    tomllib = None
+
+# Bump when the checks change, so cached results are not reused.
+VALIDATOR_VERSION = 1
+CACHE_PATH = Path(
+    os.getenv("SKILL_VALIDATE_CACHE")
+    or Path(os.getenv("XDG_CACHE_HOME") or Path.home() / ".cache") / "skill-tools" / "validate.json"
+)
+# File analyses kept in the cache, most recently used last.
+MAX_CACHED_FILES = 10000
+
+ALLOWED_FRONTMATTER_KEYS = {"name", "description", "license", "allowed-tools", "metadata", "compatibility"}
+MAX_NAME_LENGTH = 64
+MAX_DESCRIPTION_LENGTH = 1024
+
+# Distributions whose import name differs from the project name.
+IMPORT_ALIASES = {
+    "pyyaml": "yaml",
+    "pillow": "PIL",
+    "beautifulsoup4": "bs4",
+    "python_dotenv": "dotenv",
+    "scikit_learn": "sklearn",
+    "opencv_python": "cv2",
+    "python_dateutil": "dateutil",
+    "protobuf": "google",
+}
+
+
+def _normalize(name):
+    return re.sub(r"[-_.]+", "_", name).lower()
+
+
+# ----------------------------------------------------------------------
+# Per-file analysis (cached by content hash)
+# ----------------------------------------------------------------------
+
+def _guards_import_error(node):
+    """Whether a try statement handles ImportError, making its imports optional."""
+    for handler in node.handlers:
+        names = handler.type.elts if isinstance(handler.type, ast.Tuple) else [handler.type]
+        for name in names:
+            if name is None or (isinstance(name, ast.Name) and name.id in (
+                "ImportError", "ModuleNotFoundError", "Exception", "BaseException",
+            )):
+                return True
+    return False
+
+
+def _tool_decorator(node):
+    """Tool name if a function is decorated with @tool / @mcp.tool, else None."""
+    for decorator in node.decorator_list:
+        call = decorator if isinstance(decorator, ast.Call) else None
+        target = call.func if call else decorator
+        if (isinstance(target, ast.Name) and target.id == "tool") or (
+            isinstance(target, ast.Attribute) and target.attr == "tool"
+        ):
+            for keyword in call.keywords if call else ():
+                if keyword.arg == "name" and isinstance(keyword.value, ast.Constant):
+                    return keyword.value.value
+            return node.name
+    return None
+
+
+def _documented_args(docstring):
+    """Parameter names of the Google-style "Args:" section of a docstring."""
+    match = re.search(r"^\s*Args:\s*$(.*?)(?=^\s*\w+:\s*$|\Z)", docstring, re.M | re.S)
+    if not match:
+        return None
+    return set(re.findall(r"^\s{2,}\*{0,2}(\w+)\s*(?:\(.*?\))?:", match.group(1), re.M))
+
+
+def _check_tool(node, name):
+    problems, warnings = [], []
+    docstring = ast.get_docstring(node)
+    if not docstring:
+        problems.append(f"tool {name!r} has no docstring (its description for the model)")
+    args = node.args
+    if args.vararg or args.kwarg:
+        problems.append(f"tool {name!r} takes *args/**kwargs, which have no input schema")
+    params = []
+    for arg in args.posonlyargs + args.args + args.kwonlyargs:
+        if arg.arg in ("self", "cls"):
+            continue
+        annotation = ast.unparse(arg.annotation) if arg.annotation else ""
+        if "Context" in annotation:
+            continue  # Injected by FastMCP, not part of the input schema.
+        if not annotation:
+            problems.append(f"tool {name!r}: parameter {arg.arg!r} has no type annotation")
+        params.append(arg.arg)
+    documented = _documented_args(docstring or "")
+    if documented is not None:
+        for param in params:
+            if param not in documented:
+                warnings.append(f"tool {name!r}: parameter {param!r} is not documented under Args")
+    return problems, warnings
+
+
+def analyze_python(source):
+    """
+    Analyze one Python file without importing it.
+
+    Returns:
+        Dict of syntax error, imports, top-level names and tools; a pure
+        function of ``source``, so it is cached by content hash
+    """
+    try:
+        tree = ast.parse(source)
+    except SyntaxError as e:
+        return {"syntax_error": [e.lineno or 0, e.msg]}
+
+    imports, defines, tools = [], set(), []
+    dynamic = False
+
+    def visit(nodes, optional):
+        for node in nodes:
+            if isinstance(node, ast.Try):
+                guarded = optional or _guards_import_error(node)
+                visit(node.body, guarded)
+                for handler in node.handlers:
+                    visit(handler.body, optional)
+                visit(node.orelse + node.finalbody, optional)
+                continue
+            if isinstance(node, ast.Import):
+                for alias in node.names:
+                    imports.append([alias.name, [], 0, node.lineno, optional])
+            elif isinstance(node, ast.ImportFrom):
+                names = [alias.name for alias in node.names]
+                imports.append([node.module or "", names, node.level, node.lineno, optional])
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                name = _tool_decorator(node)
+                if name is not None:
+                    problems, warnings = _check_tool(node, name)
+                    tools.append([name, node.lineno, problems, warnings])
+            for child in ast.iter_child_nodes(node):
+                if isinstance(child, ast.stmt):
+                    visit([child], optional)
+
+    visit(tree.body, False)
+
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            defines.add(node.name)
+            if node.name == "__getattr__":
+                dynamic = True
+        elif isinstance(node, (ast.Assign, ast.AnnAssign, ast.AugAssign)):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            for target in targets:
+                for name in ast.walk(target):
+                    if isinstance(name, ast.Name):
+                        defines.add(name.id)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            for alias in node.names:
+                if alias.name == "*":
+                    dynamic = True
+                defines.add(alias.asname or alias.name.split(".")[0])
+        elif isinstance(node, (ast.If, ast.Try, ast.With)):
+            # Conservative: names bound in conditional blocks count as defined.
+            for child in ast.walk(node):
+                if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                    defines.add(child.name)
+                elif isinstance(child, ast.Name) and isinstance(child.ctx, ast.Store):
+                    defines.add(child.id)
+                elif isinstance(child, (ast.Import, ast.ImportFrom)):
+                    for alias in child.names:
+                        defines.add(alias.asname or alias.name.split(".")[0])
+
+    return {"imports": imports, "defines": sorted(defines), "dynamic": dynamic, "tools": tools}
+
+
+# ----------------------------------------------------------------------
+# Skill checks
+# ----------------------------------------------------------------------
+
+def check_frontmatter(content):
+    """Problems with the YAML frontmatter of SKILL.md."""
+    if not content.startswith("---"):
+        return ["SKILL.md: no YAML frontmatter (the file must start with ---)"]
+    match = re.match(r"^---\r?\n(.*?)\r?\n---\s*(?:\r?\n|$)", content, re.S)
+    if not match:
+        return ["SKILL.md: frontmatter is not closed with ---"]
+    try:
+        frontmatter = yaml.safe_load(match.group(1))
+    except yaml.YAMLError as e:
+        return [f"SKILL.md: invalid YAML in frontmatter: {e}"]
+    if not isinstance(frontmatter, dict):
+        return ["SKILL.md: frontmatter must be a YAML mapping"]
+
+    problems = []
+    unexpected = sorted(set(frontmatter) - ALLOWED_FRONTMATTER_KEYS)
+    if unexpected:
+        problems.append(
+            f"SKILL.md: unexpected frontmatter key(s) {', '.join(unexpected)} "
+            f"(allowed: {', '.join(sorted(ALLOWED_FRONTMATTER_KEYS))})"
+        )
+    name = frontmatter.get("name")
+    if not isinstance(name, str) or not name.strip():
+        problems.append("SKILL.md: missing 'name' in frontmatter")
+    elif not re.fullmatch(r"[a-z0-9]+(-[a-z0-9]+)*", name) or len(name) > MAX_NAME_LENGTH:
+        problems.append(
+            f"SKILL.md: name {name!r} must be hyphen-case (lowercase letters, digits, single "
+            f"hyphens) and at most {MAX_NAME_LENGTH} characters"
+        )
+    description = frontmatter.get("description")
+    if not isinstance(description, str) or not description.strip():
+        problems.append("SKILL.md: missing 'description' in frontmatter")
+    else:
+        if "<" in description or ">" in description:
+            problems.append("SKILL.md: description cannot contain angle brackets (< or >)")
+        if len(description) > MAX_DESCRIPTION_LENGTH:
+            problems.append(
+                f"SKILL.md: description is {len(description)} characters "
+                f"(at most {MAX_DESCRIPTION_LENGTH})"
+            )
+    return problems
+
+
+def _declared_dependencies(skill_path, files):
+    """Normalized names of the dependencies declared anywhere in the skill."""
+    declared = set()
+    for rel, path in files:
+        name = Path(rel).name
+        requirements = []
+        if name == "pyproject.toml" and tomllib is not None:
+            try:
+                project = tomllib.loads(path.read_text()).get("project", {})
+            except (OSError, tomllib.TOMLDecodeError):
+                continue
+            requirements = list(project.get("dependencies", []))
+            for extra in project.get("optional-dependencies", {}).values():
+                requirements.extend(extra)
+        elif re.fullmatch(r"requirements.*\.txt", name):
+            requirements = [
+                line for line in path.read_text().splitlines()
+                if line.strip() and not line.lstrip().startswith(("#", "-"))
+            ]
+        for requirement in requirements:
+            project_name = re.split(r"[\s<>=!~;\[@]", requirement.strip(), maxsplit=1)[0]
+            if project_name:
+                declared.add(_normalize(project_name))
+    return declared
+
+
+class _Environment:
+    """Installed distributions, looked up lazily: most imports never need it."""
+
+    def __init__(self, declared):
+        self._declared = declared
+        self._closure = None
+        self._packages = None
+
+    def _dependency_closure(self):
+        if self._closure is None:
+            closure, stack = set(), list(self._declared)
+            while stack:
+                name = stack.pop()
+                if name in closure:
+                    continue
+                closure.add(name)
+                try:
+                    requires = importlib.metadata.requires(name) or []
+                except importlib.metadata.PackageNotFoundError:
+                    continue
+                for requirement in requires:
+                    if "extra ==" in requirement:
+                        continue
+                    stack.append(_normalize(re.split(r"[\s<>=!~;\[(@]", requirement, maxsplit=1)[0]))
+            self._closure = closure
+        return self._closure
+
+    def provided(self, top):
+        """Whether an installed, declared (or transitively required) dist provides ``top``."""
+        if self._packages is None:
+            self._packages = importlib.metadata.packages_distributions()
+        closure = self._dependency_closure()
+        return any(_normalize(dist) in closure for dist in self._packages.get(top, ()))
+
+
+def _resolve_local(module, roots, modules, packages):
+    """Local file path a dotted module resolves to, or "" for a package directory."""
+    parts = module.split(".")
+    for root in roots:
+        base = "/".join(filter(None, [root] + parts))
+        if base + ".py" in modules:
+            return base + ".py"
+        if base + "/__init__.py" in modules:
+            return base + "/__init__.py"
+        if base in packages:
+            return ""
+    return None
+
+
+def check_imports(skill_path, files, analyses):
+    """Problems and warnings with the imports of the skill's Python files."""
+    py_files = {rel for rel, _ in files if rel.endswith(".py")}
+    packages = {str(Path(rel).parent) for rel in py_files}
+    for package in list(packages):
+        parent = Path(package)
+        while str(parent) not in (".", ""):
+            packages.add(str(parent))
+            parent = parent.parent
+    skill_root = skill_path.name
+    declared = _declared_dependencies(skill_path, files)
+    declared_imports = {IMPORT_ALIASES.get(name, name) for name in declared}
+    environment = _Environment(declared)
+
+    problems, warnings = [], []
+    for rel in sorted(py_files):
+        analysis = analyses[rel]
+        if "syntax_error" in analysis:
+            lineno, msg = analysis["syntax_error"]
+            problems.append(f"{rel}:{lineno}: syntax error: {msg}")
+            continue
+        # Scripts run from their own directory or any parent inside the skill.
+        directory = Path(rel).parent
+        roots = [directory.as_posix()]
+        while roots[-1] != skill_root:
+            directory = directory.parent
+            roots.append(directory.as_posix())
+
+        for module, names, level, lineno, optional in analysis["imports"]:
+            if optional:
+                continue
+            where = f"{rel}:{lineno}"
+            if level:
+                base = Path(rel).parent
+                for _ in range(level - 1):
+                    base = base.parent
+                path = _resolve_local(module, [str(base)], py_files, packages) if module else ""
+                if path is None:
+                    problems.append(f"{where}: relative import of {module!r} cannot be resolved")
+                    continue
+            else:
+                top = module.split(".")[0]
+                path = _resolve_local(module, roots, py_files, packages)
+                if path is None:
+                    if top in sys.stdlib_module_names or top == "__future__":
+                        continue
+                    if _normalize(top) in declared_imports or top in declared_imports:
+                        continue
+                    if environment.provided(top):
+                        continue
+                    if importlib.util.find_spec(top) is not None:
+                        warnings.append(f"{where}: {top!r} is installed but not a declared dependency")
+                    else:
+                        problems.append(
+                            f"{where}: cannot import {module!r}: not a module of the skill, "
+                            f"the standard library or a declared dependency"
+                        )
+                    continue
+            if not path or not names:
+                continue
+            target = analyses.get(path)
+            if not target or "syntax_error" in target or target["dynamic"]:
+                continue
+            defined = set(target["defines"])
+            for name in names:
+                if name == "*" or name in defined:
+                    continue
+                submodule = str(Path(path).parent / name) if path.endswith("__init__.py") else None
+                if submodule and (submodule + ".py" in py_files or submodule in packages):
+                    continue
+                problems.append(f"{where}: cannot import name {name!r} from {module or '.'!r}")
+    return problems, warnings
+
+
+def check_tools(analyses):
+    """Problems and warnings with the MCP tools defined by the skill."""
+    problems, warnings, seen = [], [], {}
+    for rel in sorted(analyses):
+        for name, lineno, tool_problems, tool_warnings in analyses[rel].get("tools", ()):
+            where = f"{rel}:{lineno}"
+            problems.extend(f"{where}: {p}" for p in tool_problems)
+            warnings.extend(f"{where}: {w}" for w in tool_warnings)
+            if name in seen:
+                problems.append(f"{where}: tool {name!r} is already defined in {seen[name]}")
+            else:
+                seen[name] = where
+    return problems, warnings
+
+
+# ----------------------------------------------------------------------
+# Cache
+# ----------------------------------------------------------------------
+
+def _load_cache():
+    try:
+        cache = json.loads(CACHE_PATH.read_text())
+    except (OSError, ValueError):
+        return {"version": VALIDATOR_VERSION, "skills": {}, "files": {}}
+    if cache.get("version") != VALIDATOR_VERSION:
+        return {"version": VALIDATOR_VERSION, "skills": {}, "files": {}}
+    return cache
+
+
+def _save_cache(cache):
+    files = cache["files"]
+    for key in list(files)[:max(0, len(files) - MAX_CACHED_FILES)]:
+        del files[key]
+    skills = cache["skills"]
+    for key in list(skills)[:max(0, len(skills) - MAX_CACHED_FILES)]:
+        del skills[key]
+    try:
+        CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        tmp = CACHE_PATH.with_name(f"{CACHE_PATH.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(cache))
+        os.replace(tmp, CACHE_PATH)
+    except OSError:
+        pass  # A read-only home only makes the next run slower.
+
+
+def _hash_file(path):
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def _list_files(skill_path):
+    # Validate exactly what would be packaged, honouring the same ignore files.
+    from package_skill import collect_files
+
+    return collect_files(skill_path)
+
+
+def validate_skill(skill_path, files=None, use_cache=True):
+    """
+    Validate a skill folder.
+
+    Args:
+        skill_path: Path to the skill folder
+        files: (archive name, path) tuples of the files to check, as listed by
+            package_skill.collect_files (default: listed here)
+        use_cache: Reuse results cached for unchanged files
+
+    Returns:
+        (valid, message) tuple; the message lists problems, or warnings of a
+        valid skill
+    """
+    skill_path = Path(skill_path).resolve()
+    skill_md = skill_path / "SKILL.md"
+    if not skill_md.is_file():
+        return False, "SKILL.md not found"
+    if files is None:
+        files = _list_files(skill_path)
+
+    workers = min(32, (os.cpu_count() or 1) + 4)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        hashes = dict(zip((rel for rel, _ in files), pool.map(_hash_file, (p for _, p in files))))
+
+    cache = _load_cache() if use_cache else {"version": VALIDATOR_VERSION, "skills": {}, "files": {}}
+    key = hashlib.sha256(
+        json.dumps([VALIDATOR_VERSION, sys.version_info[:2], sorted(hashes.items())]).encode()
+    ).hexdigest()
+    if key in cache["skills"]:
+        cache["skills"][key] = cache["skills"].pop(key)
+        if use_cache:
+            _save_cache(cache)
+        valid, message = cache["skills"][key]
+        return valid, message
+
+    def analyze(item):
+        rel, path = item
+        cached = cache["files"].get(hashes[rel])
+        if cached is not None:
+            return rel, cached
+        return rel, analyze_python(path.read_text(encoding="utf-8", errors="replace"))
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        python_files = [(rel, path) for rel, path in files if rel.endswith(".py")]
+        analyses = dict(pool.map(analyze, python_files))
+    for rel, analysis in analyses.items():
+        cache["files"].pop(hashes[rel], None)
+        cache["files"][hashes[rel]] = analysis
+
+    problems = check_frontmatter(skill_md.read_text(encoding="utf-8"))
+    import_problems, warnings = check_imports(skill_path, files, analyses)
+    tool_problems, tool_warnings = check_tools(analyses)
+    problems += import_problems + tool_problems
+    warnings += tool_warnings
+
+    if problems:
+        valid = False
+        message = f"{len(problems)} problem(s):\n" + "\n".join(f"   - {p}" for p in problems)
+    else:
+        valid = True
+        message = "Skill is valid!"
+        if warnings:
+            message += f" ({len(warnings)} warning(s))\n" + "\n".join(f"   - {w}" for w in warnings)
+    cache["skills"][key] = [valid, message]
+    if use_cache:
+        _save_cache(cache)
+    return valid, message
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate skill folders")
+    parser.add_argument("skill_paths", nargs="+", help="Paths to skill folders")
+    parser.add_argument("--no-cache", action="store_true", help="Ignore and do not update cached results")
+    args = parser.parse_args()
+
+    all_valid = True
+    for skill_path in args.skill_paths:
+        valid, message = validate_skill(skill_path, use_cache=not args.no_cache)
+        prefix = f"{skill_path}: " if len(args.skill_paths) > 1 else ""
+        print(f"{'✅' if valid else '❌'} {prefix}{message}")
+        all_valid = all_valid and valid
+    sys.exit(0 if all_valid else 1)
+
+
+if __name__ == "__main__":
+    main()
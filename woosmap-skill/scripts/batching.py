@@ -0,0 +1,91 @@
+"""
+Helpers for batch-capable tools.
+
+``run_batch`` fans a list of items out to an async worker with bounded
+concurrency. As each item completes it reports MCP progress and, when a
+``describe`` callback is given, sends the partial result to the client as a
+log notification, so long batches give feedback before they finish.
+
+If the client cancels the tool call, every item not yet finished is
+cancelled, including those still waiting for a concurrency slot, so no
+further upstream requests are spent on an abandoned job.
+"""
+import asyncio
+import logging
+import os
+from typing import Any, Awaitable, Callable, Optional, Sequence, TypeVar
+
+from mcp.server.fastmcp import Context
+
+from exceptions import WoosmapError
+
+logger = logging.getLogger(__name__)
+
+BATCH_CONCURRENCY = int(os.getenv("WOOSMAP_BATCH_CONCURRENCY", "8"))
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+async def _notify(ctx: Optional[Context], done: int, total: int, message: Optional[str]) -> None:
+    if ctx is None:
+        return
+    try:
+        await ctx.report_progress(done, total, message)
+        if message:
+            await ctx.info(message)
+    except Exception as e:
+        # Progress is best effort; a closed stream must not fail the batch.
+        logger.debug(f"Progress notification failed: {e}")
+
+
+async def run_batch(
+    items: Sequence[T],
+    worker: Callable[[T], Awaitable[R]],
+    ctx: Optional[Context] = None,
+    describe: Optional[Callable[[int, T, Any], Optional[str]]] = None,
+    concurrency: int = BATCH_CONCURRENCY,
+) -> list[R | WoosmapError]:
+    """
+    Run ``worker`` over ``items`` concurrently, reporting progress.
+
+    Args:
+        items: Inputs of the batch.
+        worker: Coroutine function processing one item.
+        ctx: MCP context used for progress and partial-result notifications.
+        describe: Optional ``(index, item, result_or_error) -> str`` callback
+            producing the partial result message for a completed item.
+        concurrency: Maximum number of items processed at the same time.
+
+    Returns:
+        Results in input order. Items that failed with a WoosmapError hold the
+        error instead of a result; other exceptions propagate.
+    """
+    total = len(items)
+    results: list[Any] = [None] * total
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run_one(index: int) -> int:
+        async with semaphore:
+            try:
+                results[index] = await worker(items[index])
+            except WoosmapError as e:
+                results[index] = e
+        return index
+
+    tasks = [asyncio.ensure_future(run_one(i)) for i in range(total)]
+    done = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            index = await next_done
+            done += 1
+            message = describe(index, items[index], results[index]) if describe else None
+            await _notify(ctx, done, total, message)
+    finally:
+        pending = [t for t in tasks if not t.done()]
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+            logger.info(f"Batch stopped with {len(pending)}/{total} items not run")
+    return results
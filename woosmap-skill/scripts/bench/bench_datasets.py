@@ -0,0 +1,89 @@
+"""
+Dataset store benchmark.
+
+Generates a synthetic point dataset (clustered over France, 10% spread over
+the world), then reports the one-time ingest cost, the time to map the store
+in a fresh process state, and nearest/within query latency, against a plain
+full scan over the same points:
+
+    python -m bench.bench_datasets --points 1000000 --queries 200
+"""
+import argparse
+import csv
+import random
+import tempfile
+import time
+from pathlib import Path
+
+import datasets
+from geo import haversine_m
+
+
+def _write_points(path: Path, n: int, seed: int = 1) -> None:
+    rng = random.Random(seed)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "name", "lat", "lng"])
+        for i in range(n):
+            if i % 10 == 0:
+                lat, lng = rng.uniform(-85, 85), rng.uniform(-180, 180)
+            else:
+                lat, lng = rng.uniform(43, 50), rng.uniform(-1, 7)
+            writer.writerow([f"P{i}", f"Point {i}", f"{lat:.6f}", f"{lng:.6f}"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the dataset store")
+    parser.add_argument("--points", type=int, default=200_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=25)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = Path(tmp) / "points.csv"
+        _write_points(source, args.points)
+        datasets.DATASET_DIR = Path(tmp) / "store"
+        datasets.register("bench", source)
+
+        start = time.perf_counter()
+        dataset = datasets.get_dataset("bench")
+        ingest = time.perf_counter() - start
+        size = sum(f.stat().st_size for f in dataset.path.iterdir())
+
+        datasets.register("bench", source)  # drop the loaded instance
+        start = time.perf_counter()
+        dataset = datasets.get_dataset("bench")
+        mapped = time.perf_counter() - start
+
+        rng = random.Random(2)
+        queries = [(rng.uniform(43.5, 49.5), rng.uniform(-0.5, 6.5)) for _ in range(args.queries)]
+
+        start = time.perf_counter()
+        for q in queries:
+            dataset.nearest(q, args.k)
+        nearest = (time.perf_counter() - start) / len(queries)
+
+        start = time.perf_counter()
+        for q in queries:
+            dataset.within(q, 5000)
+        within = (time.perf_counter() - start) / len(queries)
+
+        points = list(zip(dataset.lats, dataset.lngs))
+        scan_queries = queries[:5]
+        start = time.perf_counter()
+        for q in scan_queries:
+            sorted(haversine_m(q, p) for p in points)[:args.k]
+        scan = (time.perf_counter() - start) / len(scan_queries)
+
+    print(f"points          {args.points}")
+    print(f"cell size       {dataset.cell_deg:g} deg")
+    print(f"store size      {size / 1e6:.1f} MB")
+    print(f"ingest          {ingest * 1e3:.0f} ms (once per source version)")
+    print(f"map             {mapped * 1e3:.2f} ms")
+    print(f"nearest k={args.k:<5d} {nearest * 1e3:.3f} ms/query")
+    print(f"within 5 km     {within * 1e3:.3f} ms/query")
+    print(f"full scan       {scan * 1e3:.1f} ms/query")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Dict vs. model decoding benchmark.
+
+Decodes the fixture responses (and a synthesized distance matrix) several
+ways and reports time per decode, memory retained by the result and peak
+memory while decoding:
+
+- ``dict``: a full JSON parse into dicts (orjson when installed), what the
+  tools used to keep, and ``dict (json)`` with the standard library parser;
+- ``model``: ``models.decode``, straight from bytes with msgspec;
+- ``model (from_dict)``: the fallback used when msgspec is not installed.
+
+    python -m bench.bench_models --repeat 200
+"""
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable
+
+import models
+from bench.mock_upstream import MockUpstream
+from bench.run_bench import _GRID
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _loads(body: bytes) -> Any:
+    return orjson.loads(body) if orjson is not None else json.loads(body)
+
+
+def _cases(upstream: MockUpstream) -> list[tuple[str, type, bytes]]:
+    matrix_params = {"origins": "|".join(_GRID[:25]), "destinations": "|".join(_GRID[25:65])}
+    return [
+        ("route (details=full, 3 routes)", models.RouteResponse,
+         upstream.body("distance/route/json", {"alternatives": "true", "details": "full"})),
+        ("route", models.RouteResponse, upstream.body("distance/route/json", {})),
+        ("tolls", models.TollsResponse, upstream.body("distance/tolls/json", {})),
+        ("matrix 25x40", models.MatrixResponse,
+         upstream.body("distance/distancematrix/json", matrix_params)),
+        ("transit", models.TransitResponse, upstream.body("transit/route", {})),
+        ("geocode", models.GeocodeResponse, upstream.body("localities/geocode", {})),
+    ]
+
+
+def _time_per_call(fn: Callable[[], Any], repeat: int) -> float:
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def _memory(fn: Callable[[], Any]) -> tuple[int, int]:
+    """(bytes retained by the result, peak bytes while decoding)."""
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        result = fn()
+        after, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return after - before, peak - before
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare dict and model decoding")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    if models.msgspec is None:
+        print("msgspec is not installed: 'model' uses the from_dict fallback", file=sys.stderr)
+
+    print(
+        f"{'payload':32s} {'bytes':>8s} {'decoder':20s} "
+        f"{'µs/decode':>10s} {'retained KB':>12s} {'peak KB':>9s}"
+    )
+    for name, model, body in _cases(MockUpstream()):
+        decoders = [
+            ("dict", lambda: _loads(body)),
+            ("dict (json)", lambda: json.loads(body)),
+            ("model", lambda: models.decode(model, body)),
+            ("model (from_dict)", lambda: model.from_dict(_loads(body))),
+        ]
+        for label, fn in decoders:
+            seconds = _time_per_call(fn, args.repeat)
+            retained, peak = _memory(fn)
+            print(
+                f"{name:32s} {len(body):>8d} {label:20s} {seconds * 1e6:>10.1f} "
+                f"{retained / 1024:>12.1f} {peak / 1024:>9.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
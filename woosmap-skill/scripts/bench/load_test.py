@@ -0,0 +1,370 @@
+"""
+Load test for the HTTP/SSE server.
+
+Starts the mock Woosmap API (``bench/mock_upstream.py``) and ``server.py``
+pointed at it, then opens increasing numbers of concurrent MCP sessions over
+SSE. Each session replays a mix of tool calls modelled on real conversations
+(autocomplete bursts while typing, nearby searches, routes, matrices).
+
+For every level it reports session setup latency, call throughput and
+latency, event-loop lag sampled from ``/metrics``, server memory per open
+session, and the level at which throughput stops growing:
+
+    python -m bench.load_test --sessions 10 50 100 200 --duration 20
+
+Use ``--url`` to target an already running server instead (memory is then
+not measured), and ``--transport streamable-http`` for servers exposing the
+streamable HTTP transport.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from contextlib import AsyncExitStack
+from pathlib import Path
+from typing import Optional
+
+import httpx
+
+from bench.run_bench import LYON, PARIS, _GRID, _git_revision, _is_error, _percentile
+
+RESULTS_DIR = Path(__file__).parent / "results"
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent
+
+_PREFIXES = ["P", "Pa", "Par", "Pari", "Paris"]
+_BIAS = {"latitude": 48.8566, "longitude": 2.3522, "components": ["FR"], "language": "en"}
+
+# (weight, steps). A step is (tool, arguments); a mix runs its steps in order
+# with a short think time between them.
+MIXES: list[tuple[int, list[tuple[str, dict]]]] = [
+    (
+        5,
+        [
+            ("autocomplete_localities", {"input": prefix, **_BIAS})
+            for prefix in _PREFIXES
+        ],
+    ),
+    (
+        2,
+        [
+            ("autocomplete_then_details", {"input": "Paris", **_BIAS}),
+            ("get_places_nearby", {
+                "latitude": 48.8566, "longitude": 2.3522, "radius": 1000,
+                "place_type": ["point_of_interest"],
+            }),
+        ],
+    ),
+    (2, [("get_route_distance", {"origin": PARIS, "destination": LYON})]),
+    (
+        1,
+        [("get_distance_matrix", {"origins": _GRID[:10], "destinations": _GRID[10:30], "language": "en"})],
+    ),
+    (1, [("get_transit_route", {"origin": PARIS, "destination": "48.8738,2.2950", "language": "en"})]),
+]
+
+THINK_TIME = 0.05
+
+
+# -------------------------------------------------
+# Processes
+# -------------------------------------------------
+def _rss_kb(pid: int) -> int:
+    """Resident memory of a process and its children, from /proc (Linux only)."""
+    total = 0
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    total += int(line.split()[1])
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            children = [int(c) for c in f.read().split()]
+    except (OSError, ValueError):
+        return total
+    return total + sum(_rss_kb(child) for child in children)
+
+
+def _spawn(args: list[str], env: dict) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, *args],
+        cwd=SCRIPTS_DIR,
+        env={**os.environ, **env},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+async def _wait_ready(url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(url)).status_code < 500:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+
+
+# -------------------------------------------------
+# Sampling
+# -------------------------------------------------
+def _gauge(text: str, name: str) -> list[float]:
+    values = []
+    for line in text.splitlines():
+        if line.startswith(name) and line[len(name)] in " {":
+            values.append(float(line.rsplit(" ", 1)[1]))
+    return values
+
+
+class Sampler:
+    """Periodically samples loop lag (all workers) and server RSS."""
+
+    def __init__(self, base_url: str, pid: Optional[int], interval: float = 0.5):
+        self.base_url = base_url
+        self.pid = pid
+        self.interval = interval
+        self.lag: list[float] = []
+        self.rss_kb: list[int] = []
+
+    async def run(self) -> None:
+        async with httpx.AsyncClient(timeout=5.0) as client:
+            while True:
+                try:
+                    text = (await client.get(f"{self.base_url}/metrics")).text
+                    self.lag.extend(_gauge(text, "woosmap_event_loop_lag_seconds"))
+                except httpx.HTTPError:
+                    pass
+                if self.pid is not None:
+                    self.rss_kb.append(_rss_kb(self.pid))
+                await asyncio.sleep(self.interval)
+
+
+# -------------------------------------------------
+# Sessions
+# -------------------------------------------------
+async def _open_session(stack: AsyncExitStack, url: str, transport: str):
+    from mcp import ClientSession
+
+    if transport == "sse":
+        from mcp.client.sse import sse_client
+
+        read, write = await stack.enter_async_context(sse_client(url, timeout=30))
+    else:
+        from mcp.client.streamable_http import streamablehttp_client
+
+        read, write, _ = await stack.enter_async_context(streamablehttp_client(url))
+    session = await stack.enter_async_context(ClientSession(read, write))
+    await session.initialize()
+    return session
+
+
+async def _session_worker(
+    url: str,
+    transport: str,
+    ready: asyncio.Barrier,
+    stop: asyncio.Event,
+    stats: dict,
+    rng: random.Random,
+) -> None:
+    weights = [w for w, _ in MIXES]
+    async with AsyncExitStack() as stack:
+        start = time.perf_counter()
+        try:
+            session = await _open_session(stack, url, transport)
+        except Exception:
+            stats["setup_failures"] += 1
+            await ready.wait()
+            return
+        stats["setup"].append(time.perf_counter() - start)
+        # All sessions open before calls start, so memory per session is comparable.
+        await ready.wait()
+        while not stop.is_set():
+            _, steps = rng.choices(MIXES, weights)[0]
+            for tool, args in steps:
+                if stop.is_set():
+                    break
+                call_start = time.perf_counter()
+                try:
+                    result = await session.call_tool(tool, args)
+                    stats["errors"] += _is_error(result)
+                except Exception:
+                    stats["errors"] += 1
+                stats["latency"].append(time.perf_counter() - call_start)
+                await asyncio.sleep(THINK_TIME)
+
+
+async def run_level(
+    url: str,
+    transport: str,
+    sessions: int,
+    duration: float,
+    base_url: str,
+    pid: Optional[int],
+) -> dict:
+    stats = {"setup": [], "setup_failures": 0, "latency": [], "errors": 0}
+    ready = asyncio.Barrier(sessions + 1)
+    stop = asyncio.Event()
+    rng = random.Random(sessions)
+    idle_rss = _rss_kb(pid) if pid is not None else None
+
+    workers = [
+        asyncio.create_task(_session_worker(url, transport, ready, stop, stats, rng))
+        for _ in range(sessions)
+    ]
+    await ready.wait()
+    open_rss = _rss_kb(pid) if pid is not None else None
+
+    sampler = Sampler(base_url, pid)
+    sampling = asyncio.create_task(sampler.run())
+    started = time.perf_counter()
+    await asyncio.sleep(duration)
+    stop.set()
+    calls_in_window = len(stats["latency"])
+    elapsed = time.perf_counter() - started
+    await asyncio.gather(*workers, return_exceptions=True)
+    sampling.cancel()
+    await asyncio.gather(sampling, return_exceptions=True)
+
+    latency = stats["latency"] or [0.0]
+    setup = stats["setup"] or [0.0]
+    opened = len(stats["setup"])
+    entry = {
+        "sessions": sessions,
+        "sessions_opened": opened,
+        "setup_p50_ms": round(_percentile(setup, 50) * 1000, 1),
+        "setup_p95_ms": round(_percentile(setup, 95) * 1000, 1),
+        "calls": calls_in_window,
+        "errors": stats["errors"],
+        "throughput_rps": round(calls_in_window / elapsed, 2),
+        "call_p50_ms": round(_percentile(latency, 50) * 1000, 1),
+        "call_p95_ms": round(_percentile(latency, 95) * 1000, 1),
+        "call_p99_ms": round(_percentile(latency, 99) * 1000, 1),
+        "loop_lag_mean_ms": round(statistics.fmean(sampler.lag) * 1000, 2) if sampler.lag else None,
+        "loop_lag_max_ms": round(max(sampler.lag) * 1000, 2) if sampler.lag else None,
+    }
+    if pid is not None:
+        entry["rss_idle_mb"] = round(idle_rss / 1024, 1)
+        entry["rss_peak_mb"] = round(max(sampler.rss_kb or [open_rss]) / 1024, 1)
+        entry["rss_per_session_kb"] = round((open_rss - idle_rss) / opened) if opened else None
+    return entry
+
+
+def saturation_point(levels: list[dict], min_gain: float = 0.1) -> Optional[int]:
+    """First session count whose throughput gain over the previous level is below ``min_gain``."""
+    for previous, current in zip(levels, levels[1:]):
+        if not previous["throughput_rps"]:
+            continue
+        load_ratio = current["sessions"] / previous["sessions"]
+        gain = current["throughput_rps"] / previous["throughput_rps"]
+        # Throughput should scale with load until something saturates.
+        if gain - 1 < min_gain * (load_ratio - 1):
+            return previous["sessions"]
+    return None
+
+
+# -------------------------------------------------
+# Entry point
+# -------------------------------------------------
+async def run(args) -> dict:
+    processes: list[subprocess.Popen] = []
+    pid = None
+    base_url = args.url
+    try:
+        if base_url is None:
+            upstream_url = f"http://127.0.0.1:{args.upstream_port}"
+            processes.append(_spawn(
+                ["-m", "bench.mock_upstream", "--port", str(args.upstream_port),
+                 "--latency", str(args.latency), "--jitter", str(args.jitter)],
+                {},
+            ))
+            await _wait_ready(f"{upstream_url}/health")
+            server = _spawn(["server.py"], {
+                "PORT": str(args.port),
+                "HOST": "127.0.0.1",
+                "WOOSMAP_API_KEY": os.getenv("WOOSMAP_API_KEY", "bench"),
+                "WOOSMAP_API_BASE": upstream_url,
+                "WOOSMAP_WORKERS": str(args.workers),
+                "WOOSMAP_RATE_LIMIT": "0",
+                **({} if args.cache else {"WOOSMAP_CACHE": "0"}),
+            })
+            processes.append(server)
+            pid = server.pid
+            base_url = f"http://127.0.0.1:{args.port}"
+            await _wait_ready(f"{base_url}/health")
+
+        endpoint = f"{base_url}/sse" if args.transport == "sse" else f"{base_url}/mcp"
+        levels = []
+        for sessions in args.sessions:
+            entry = await run_level(endpoint, args.transport, sessions, args.duration, base_url, pid)
+            levels.append(entry)
+            print(
+                f"sessions={sessions:<5d} setup p95={entry['setup_p95_ms']:.0f}ms  "
+                f"{entry['throughput_rps']:>8.1f} calls/s  p95={entry['call_p95_ms']:.0f}ms  "
+                f"lag max={entry['loop_lag_max_ms']}ms  "
+                f"rss/session={entry.get('rss_per_session_kb')}KB  errors={entry['errors']}",
+                file=sys.stderr,
+            )
+            await asyncio.sleep(args.cooldown)
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    return {
+        "meta": {
+            "revision": _git_revision(),
+            "timestamp": time.time(),
+            "config": {
+                "transport": args.transport,
+                "duration": args.duration,
+                "workers": args.workers,
+                "latency": args.latency,
+                "jitter": args.jitter,
+                "cache": args.cache,
+                "url": args.url,
+            },
+        },
+        "levels": levels,
+        "saturation_sessions": saturation_point(levels),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the MCP HTTP server")
+    parser.add_argument("--sessions", nargs="+", type=int, default=[10, 50, 100, 200])
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds of load per level")
+    parser.add_argument("--cooldown", type=float, default=2.0, help="Pause between levels (s)")
+    parser.add_argument("--transport", choices=["sse", "streamable-http"], default="sse")
+    parser.add_argument("--url", help="Target a running server instead of starting one")
+    parser.add_argument("--port", type=int, default=8800, help="Port of the spawned server")
+    parser.add_argument("--upstream-port", type=int, default=8900)
+    parser.add_argument("--workers", type=int, default=1, help="WOOSMAP_WORKERS of the server")
+    parser.add_argument("--latency", type=float, default=0.05, help="Mock upstream latency (s)")
+    parser.add_argument("--jitter", type=float, default=0.02)
+    parser.add_argument("--cache", action="store_true", help="Keep the response cache on")
+    parser.add_argument("--output", help="Result file (default: bench/results/load-<rev>-<time>.json)")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+
+    output = Path(args.output) if args.output else RESULTS_DIR / (
+        f"load-{report['meta']['revision'] or 'local'}-{int(time.time())}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"Results written to {output}", file=sys.stderr)
+    if report["saturation_sessions"] is not None:
+        print(f"Throughput saturates at about {report['saturation_sessions']} sessions", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""
+Local stand-in for the Woosmap API.
+
+Serves the recorded responses in ``bench/fixtures`` for every endpoint used
+by the tools, with configurable latency and error/429 injection. Distance
+matrices are synthesized to the requested size, route alternatives and
+``details=full`` steps follow the request parameters, and transit schedules
+start after the requested departure time.
+
+Use it in-process through ``MockUpstream.transport()`` (an httpx
+MockTransport installed as ``core.http_transport``), or as a real server for
+load tests:
+
+    python -m bench.mock_upstream --port 8900 --latency 0.05
+"""
+import argparse
+import asyncio
+import copy
+import json
+import math
+import random
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Optional
+
+import httpx
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+
+# Endpoint path -> fixture file.
+FIXTURES = {
+    "localities/nearby": "localities_nearby.json",
+    "localities/autocomplete": "localities_autocomplete.json",
+    "localities/details": "localities_details.json",
+    "localities/geocode": "localities_geocode.json",
+    "distance/route/json": "distance_route.json",
+    "distance/tolls/json": "distance_tolls.json",
+    "transit/route": "transit_route.json",
+}
+
+
+def _haversine_m(a: tuple[float, float], b: tuple[float, float]) -> float:
+    lat1, lng1, lat2, lng2 = map(math.radians, (*a, *b))
+    h = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    )
+    return 2 * 6371000 * math.asin(math.sqrt(h))
+
+
+def _parse_point(value: str) -> tuple[float, float]:
+    try:
+        lat, lng = value.split(",")[:2]
+        return float(lat), float(lng)
+    except ValueError:
+        return 0.0, 0.0
+
+
+class MockUpstream:
+    """Fixture-backed fake of the Woosmap API."""
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        """
+        Args:
+            latency: Base response latency in seconds.
+            jitter: Extra random latency, uniform in [0, jitter] seconds.
+            error_rate: Fraction of requests answered with a 503.
+            rate_limit_rate: Fraction of requests answered with a 429.
+            seed: Seed of the random generator, for reproducible runs.
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.random = random.Random(seed)
+        self.fixtures = {
+            endpoint: json.loads((FIXTURES_DIR / name).read_text())
+            for endpoint, name in FIXTURES.items()
+        }
+        self._encoded: dict[str, bytes] = {}
+        self.requests: dict[str, int] = {}
+
+    # -------------------------------------------------
+    # Responses
+    # -------------------------------------------------
+    def _matrix(self, params: dict[str, str]) -> dict[str, Any]:
+        origins = [_parse_point(p) for p in params.get("origins", "").split("|") if p]
+        destinations = [
+            _parse_point(p) for p in params.get("destinations", "").split("|") if p
+        ]
+        rows = []
+        for o in origins:
+            elements = []
+            for d in destinations:
+                meters = int(_haversine_m(o, d) * 1.3)
+                elements.append(
+                    {
+                        "status": "OK",
+                        "distance": {"value": meters, "text": f"{meters / 1000:.1f} km"},
+                        "duration": {"value": int(meters / 13.9), "text": ""},
+                    }
+                )
+            rows.append({"elements": elements})
+        return {"status": "OK", "rows": rows}
+
+    def _routes(self, endpoint: str, params: dict[str, str]) -> dict[str, Any]:
+        data = self.fixtures[endpoint]
+        alternatives = params.get("alternatives") == "true"
+        full = params.get("details") == "full"
+        if alternatives and full:
+            return data
+        data = copy.deepcopy(data)
+        if not alternatives:
+            data["routes"] = data["routes"][:1]
+        if not full:
+            for route in data["routes"]:
+                for leg in route.get("legs", []):
+                    leg.pop("steps", None)
+        return data
+
+    def _transit(self, params: dict[str, str]) -> Optional[bytes]:
+        """Shift the fixture schedule onto a 20 minute headway after departure_time."""
+        departure = params.get("departure_time", "now")
+        try:
+            requested = int(departure) if departure.isdigit() else int(
+                datetime.fromisoformat(departure.replace("Z", "+00:00")).timestamp()
+            )
+        except ValueError:
+            return None
+        data = copy.deepcopy(self.fixtures["transit/route"])
+        legs = [leg for route in data["routes"] for leg in route["legs"]]
+        first = min(leg["departure_time"]["value"] for leg in legs)
+        headway = 1200
+        shift = -(-(requested - first) // headway) * headway
+        for leg in legs:
+            for key in ("departure_time", "arrival_time"):
+                leg[key]["value"] += shift
+        return json.dumps(data).encode()
+
+    def _nearby(self, params: dict[str, str]) -> dict[str, Any]:
+        """Filter the fixture places by type and serve the requested page."""
+        data = self.fixtures["localities/nearby"]
+        types = [t for t in params.get("types", "").split("|") if t]
+        results = [
+            place for place in data["results"]
+            if not types or any(
+                kind == t or kind.startswith(t + ".") for t in types for kind in place.get("types", [])
+            )
+        ]
+        limit = int(params.get("limit", 10))
+        page = int(params.get("page", 1))
+        pages = -(-len(results) // limit)
+        return {
+            "results": results[(page - 1) * limit:page * limit],
+            "pagination": {
+                "previous_page": page - 1 if page > 1 else None,
+                "next_page": page + 1 if page < pages else None,
+            },
+        }
+
+    def body(self, endpoint: str, params: dict[str, str]) -> Optional[bytes]:
+        """Return the encoded response body for a request, None if unknown."""
+        if endpoint == "distance/distancematrix/json":
+            return json.dumps(self._matrix(params)).encode()
+        if endpoint == "transit/route" and params.get("departure_time", "now") != "now":
+            transit = self._transit(params)
+            if transit is not None:
+                return transit
+        if endpoint == "localities/nearby" and endpoint in self.fixtures:
+            return json.dumps(self._nearby(params)).encode()
+        if endpoint in ("distance/route/json", "distance/tolls/json"):
+            key = f"{endpoint}|{params.get('alternatives')}|{params.get('details')}"
+            if key not in self._encoded:
+                self._encoded[key] = json.dumps(self._routes(endpoint, params)).encode()
+            return self._encoded[key]
+        if endpoint not in self.fixtures:
+            return None
+        if endpoint not in self._encoded:
+            self._encoded[endpoint] = json.dumps(self.fixtures[endpoint]).encode()
+        return self._encoded[endpoint]
+
+    async def respond(self, path: str, params: dict[str, str]) -> tuple[int, bytes]:
+        """Produce (status, body) for a request, applying latency and faults."""
+        endpoint = path.strip("/")
+        self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+        delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            await asyncio.sleep(delay)
+        roll = self.random.random()
+        if roll < self.rate_limit_rate:
+            return 429, b'{"detail":"Rate limit exceeded"}'
+        if roll < self.rate_limit_rate + self.error_rate:
+            return 503, b'{"detail":"Service unavailable"}'
+        body = self.body(endpoint, params)
+        if body is None:
+            return 404, b'{"detail":"Not found"}'
+        return 200, body
+
+    # -------------------------------------------------
+    # Adapters
+    # -------------------------------------------------
+    def transport(self) -> httpx.MockTransport:
+        """httpx transport serving this mock, for ``core.http_transport``."""
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            status, body = await self.respond(request.url.path, dict(request.url.params))
+            return httpx.Response(
+                status, content=body, headers={"content-type": "application/json"}
+            )
+
+        return httpx.MockTransport(handler)
+
+    def asgi_app(self):
+        """ASGI app serving this mock over real HTTP."""
+
+        async def app(scope, receive, send):
+            if scope["type"] != "http":
+                return
+            query = httpx.QueryParams(scope.get("query_string", b"").decode())
+            status, body = await self.respond(scope["path"], dict(query))
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": status,
+                    "headers": [
+                        (b"content-type", b"application/json"),
+                        (b"content-length", str(len(body)).encode()),
+                    ],
+                }
+            )
+            await send({"type": "http.response.body", "body": body})
+
+        return app
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve the mock Woosmap API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    upstream = MockUpstream(args.latency, args.jitter, args.error_rate, args.rate_limit_rate)
+    uvicorn.run(upstream.asgi_app(), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
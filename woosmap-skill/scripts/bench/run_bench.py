@@ -0,0 +1,301 @@
+"""
+Benchmark harness for the MCP tools.
+
+Drives every registered tool through an in-memory MCP client session against
+the local Woosmap stand-in (``bench/mock_upstream.py``), at several
+concurrency levels, and reports throughput, p50/p95/p99 latency, allocations
+per call and response sizes. Results are written as JSON so runs can be
+compared across commits:
+
+    python -m bench.run_bench --concurrency 1 8 32 --calls 200
+    python -m bench.run_bench --compare bench/results/<older>.json
+
+Run from the ``scripts/`` directory. The response cache and the rate limiter
+are disabled unless ``--cache`` / ``--rate-limit`` are given, so each call
+reaches the (mock) upstream.
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Optional
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+PARIS = "48.8566,2.3522"
+LYON = "45.7640,4.8357"
+_GRID = [f"{48.80 + i * 0.01:.4f},{2.30 + j * 0.01:.4f}" for i in range(20) for j in range(20)]
+
+# Arguments used to drive each tool.
+SCENARIOS: dict[str, dict[str, Any]] = {
+    "health_check": {},
+    "get_places_nearby": {
+        "latitude": 48.8566, "longitude": 2.3522, "radius": 1000,
+        "place_type": ["point_of_interest"],
+    },
+    "get_place_details": {"public_id": "abc==", "language": "en"},
+    "get_places_details_bulk": {
+        "public_ids": [f"place{i % 16}==" for i in range(20)], "language": "en",
+    },
+    "autocomplete_localities": {
+        "input": "Par", "latitude": 48.8566, "longitude": 2.3522,
+        "components": ["FR"], "language": "en",
+    },
+    "autocomplete_then_details": {
+        "input": "Par", "latitude": 48.8566, "longitude": 2.3522,
+        "components": ["FR"], "language": "en",
+    },
+    "geocode_locality": {"address": "10 rue de Rivoli, Paris", "language": "en"},
+    "geocode_localities_batch": {
+        "addresses": [f"{i} rue de Rivoli, Paris" for i in range(1, 21)],
+        "language": "en",
+    },
+    "reverse_geocode_locality": {"latitude": 48.8566, "longitude": 2.3522, "language": "en"},
+    "reverse_geocode_trace": {
+        "points": [f"{48.8566 + i * 2e-5:.6f},{2.3522 + i * 1e-5:.6f}" for i in range(1000)],
+        "language": "en",
+    },
+    "get_route_distance": {"origin": PARIS, "destination": LYON, "details": "full"},
+    "get_distance_matrix": {"origins": _GRID[:20], "destinations": _GRID[20:60], "language": "en"},
+    "get_route_tolls": {"origin": PARIS, "destination": LYON, "currency": "EUR"},
+    "compare_routes": {"origin": PARIS, "destination": LYON, "currency": "EUR"},
+    "get_transit_route": {"origin": PARIS, "destination": "48.8738,2.2950", "language": "en"},
+    "sweep_transit_departures": {
+        "origins": [PARIS, "48.8462,2.3372", "48.8867,2.3431"],
+        "destination": "48.8738,2.2950",
+        "window_start": "2026-01-01T07:00:00+01:00",
+        "window_end": "2026-01-01T09:00:00+01:00",
+        "interval_minutes": 15,
+        "language": "en",
+    },
+    "find_nearest_stores": {"address": "10 rue de Rivoli, Paris", "dataset": "bench_stores", "language": "en"},
+    "list_datasets": {},
+}
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _response_size(result) -> int:
+    return sum(len(getattr(c, "text", "").encode()) for c in result.content)
+
+
+def _is_error(result) -> bool:
+    return bool(result.isError) or any(
+        getattr(c, "text", "").startswith("### Error") for c in result.content
+    )
+
+
+async def _run_level(session, tool: str, args: dict, calls: int, concurrency: int) -> dict:
+    latencies: list[float] = []
+    sizes: list[int] = []
+    errors = 0
+    queue = iter(range(calls))
+
+    async def worker():
+        nonlocal errors
+        for _ in queue:
+            start = time.perf_counter()
+            result = await session.call_tool(tool, args)
+            latencies.append(time.perf_counter() - start)
+            sizes.append(_response_size(result))
+            errors += _is_error(result)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+    return {
+        "tool": tool,
+        "concurrency": concurrency,
+        "calls": calls,
+        "errors": errors,
+        "throughput_rps": round(calls / wall, 2),
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(_percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(_percentile(latencies, 99) * 1000, 3),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3),
+        "response_bytes": round(statistics.fmean(sizes)),
+    }
+
+
+async def _measure_allocations(session, tool: str, args: dict, calls: int) -> dict:
+    """Peak traced memory and allocated blocks per call, at concurrency 1."""
+    tracemalloc.start()
+    try:
+        peaks = []
+        blocks = []
+        for _ in range(calls):
+            before = tracemalloc.take_snapshot()
+            tracemalloc.reset_peak()
+            current, _ = tracemalloc.get_traced_memory()
+            await session.call_tool(tool, args)
+            _, peak = tracemalloc.get_traced_memory()
+            after = tracemalloc.take_snapshot()
+            peaks.append(peak - current)
+            blocks.append(
+                sum(max(0, s.count_diff) for s in after.compare_to(before, "filename"))
+            )
+    finally:
+        tracemalloc.stop()
+    return {
+        "alloc_peak_kb": round(max(peaks) / 1024, 1),
+        "alloc_blocks_per_call": round(statistics.fmean(blocks)),
+    }
+
+
+async def run(args) -> dict:
+    from mcp.shared.memory import create_connected_server_and_client_session
+
+    import core
+    import datasets
+    from bench.mock_upstream import FIXTURES_DIR, MockUpstream
+
+    # Imported for its side effect: registering the tools on core.mcp.
+    importlib.import_module("main")
+
+    datasets.register("bench_stores", FIXTURES_DIR / "stores.csv")
+
+    upstream = MockUpstream(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        seed=1,
+    )
+    core.http_transport = upstream.transport()
+
+    tools = args.tools or list(SCENARIOS)
+    results = []
+    async with create_connected_server_and_client_session(core.mcp._mcp_server) as session:
+        registered = {t.name for t in (await session.list_tools()).tools}
+        for missing in sorted(registered - set(SCENARIOS)):
+            print(f"warning: no benchmark scenario for tool {missing}", file=sys.stderr)
+        for tool in tools:
+            if tool not in registered:
+                print(f"warning: tool {tool} is not registered, skipped", file=sys.stderr)
+                continue
+            # Warm up imports, pools and fixture encoding.
+            await session.call_tool(tool, SCENARIOS[tool])
+            for level in args.concurrency:
+                entry = await _run_level(session, tool, SCENARIOS[tool], args.calls, level)
+                results.append(entry)
+                print(
+                    f"{tool:28s} c={level:<4d} {entry['throughput_rps']:>9.1f} req/s  "
+                    f"p50={entry['p50_ms']:.1f}ms p95={entry['p95_ms']:.1f}ms "
+                    f"p99={entry['p99_ms']:.1f}ms  {entry['response_bytes']} B",
+                    file=sys.stderr,
+                )
+            if args.alloc_calls:
+                allocs = await _measure_allocations(
+                    session, tool, SCENARIOS[tool], args.alloc_calls
+                )
+                for entry in results:
+                    if entry["tool"] == tool:
+                        entry.update(allocs)
+
+    return {
+        "meta": {
+            "revision": _git_revision(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "config": {
+                "calls": args.calls,
+                "concurrency": args.concurrency,
+                "latency": args.latency,
+                "jitter": args.jitter,
+                "error_rate": args.error_rate,
+                "rate_limit_rate": args.rate_limit_rate,
+                "cache": args.cache,
+                "rate_limit": args.rate_limit,
+            },
+        },
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict) -> str:
+    """Render a comparison table of two result files."""
+    base = {(r["tool"], r["concurrency"]): r for r in baseline["results"]}
+    lines = [
+        f"{'tool':28s} {'conc':>4s} {'rps':>10s} {'Δrps':>8s} {'p95 ms':>9s} {'Δp95':>8s}"
+    ]
+    for r in current["results"]:
+        old = base.get((r["tool"], r["concurrency"]))
+        if old is None:
+            continue
+        d_rps = (r["throughput_rps"] / old["throughput_rps"] - 1) * 100 if old["throughput_rps"] else 0
+        d_p95 = (r["p95_ms"] / old["p95_ms"] - 1) * 100 if old["p95_ms"] else 0
+        lines.append(
+            f"{r['tool']:28s} {r['concurrency']:>4d} {r['throughput_rps']:>10.1f} "
+            f"{d_rps:>+7.1f}% {r['p95_ms']:>9.1f} {d_p95:>+7.1f}%"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Woosmap MCP tools offline")
+    parser.add_argument("--tools", nargs="*", help="Tools to run (default: all scenarios)")
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 8, 32])
+    parser.add_argument("--calls", type=int, default=100, help="Calls per tool and level")
+    parser.add_argument("--alloc-calls", type=int, default=5,
+                        help="Calls traced with tracemalloc per tool (0 to skip)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Mock upstream latency (s)")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--cache", action="store_true", help="Keep the response cache on")
+    parser.add_argument("--rate-limit", action="store_true", help="Keep the rate limiter on")
+    parser.add_argument("--output", help="Result file (default: bench/results/<rev>-<time>.json)")
+    parser.add_argument("--compare", help="Baseline result file to compare against")
+    args = parser.parse_args()
+
+    # Must be set before core is imported.
+    if not args.cache:
+        os.environ["WOOSMAP_CACHE"] = "0"
+    if not args.rate_limit:
+        os.environ["WOOSMAP_RATE_LIMIT"] = "0"
+    os.environ.setdefault("WOOSMAP_MAX_RETRIES", "0")
+
+    import logging
+
+    logging.disable(logging.ERROR)
+
+    report = asyncio.run(run(args))
+
+    output = Path(args.output) if args.output else RESULTS_DIR / (
+        f"{report['meta']['revision'] or 'local'}-{int(time.time())}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"Results written to {output}", file=sys.stderr)
+
+    if args.compare:
+        print(compare(report, json.loads(Path(args.compare).read_text())))
+
+
+if __name__ == "__main__":
+    main()
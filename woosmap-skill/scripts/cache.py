@@ -0,0 +1,333 @@
+"""
+Response cache for Woosmap API calls.
+
+Two tiers are used:
+- an in-process LRU holding parsed responses, and
+- an optional SQLite file under the shared state directory, read and written
+  by every worker process so a response fetched by one worker is reused by
+  the others instead of being paid for again.
+
+An optional read-only snapshot (see snapshot.py) is consulted last, so a
+fresh install starts with the hot entries of an existing deployment. The
+disk tier counts hits per entry to decide what goes into a snapshot.
+
+Identical requests that are already in flight are coalesced onto a single
+upstream call.
+
+SQLite calls of the disk tier can wait up to five seconds on another
+process's lock, so they run on a dedicated thread rather than on the event
+loop: reads are awaited, writes and hit counts are queued behind them.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Optional
+
+from metrics import metrics
+from models import to_builtins
+from snapshot import SnapshotTier
+
+logger = logging.getLogger(__name__)
+
+# Cache lifetime (seconds) per endpoint prefix, first match wins.
+CACHE_TTLS: tuple[tuple[str, int], ...] = (
+    ("localities/details", 24 * 3600),
+    ("localities/geocode", 24 * 3600),
+    ("localities/autocomplete", 3600),
+    ("localities/nearby", 3600),
+    ("distance/", 15 * 60),
+    ("transit/", 5 * 60),
+)
+
+# Lifetime (seconds) of an entry once exported to a snapshot, counted from its
+# fetch, per endpoint prefix: "prefix=seconds" pairs separated by commas.
+# Endpoints not listed keep their cache lifetime.
+SNAPSHOT_TTLS: tuple[tuple[str, int], ...] = tuple(
+    (prefix.strip(), int(seconds))
+    for prefix, _, seconds in (
+        item.partition("=") for item in os.getenv("WOOSMAP_CACHE_SNAPSHOT_TTLS", "").split(",")
+    )
+    if prefix.strip() and seconds
+)
+
+# Hit counts are batched in memory and written to the disk tier this often.
+HIT_FLUSH_INTERVAL = 30.0
+
+# Parameters that make a response time-dependent when set to "now".
+_REALTIME_PARAMS = ("departure_time", "arrival_time")
+
+
+def cache_key(endpoint: str, params: dict[str, Any]) -> str:
+    """Build a stable cache key for a request, ignoring the API key."""
+    payload = json.dumps(
+        {k: v for k, v in params.items() if k != "key"},
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha1(f"{endpoint}?{payload}".encode()).hexdigest()
+
+
+def ttl_for(endpoint: str, params: dict[str, Any]) -> int:
+    """Return the cache lifetime for a request, 0 meaning "do not cache"."""
+    if any(str(params.get(p, "")).lower() == "now" for p in _REALTIME_PARAMS):
+        return 0
+    for prefix, ttl in CACHE_TTLS:
+        if endpoint.startswith(prefix):
+            return ttl
+    return 0
+
+
+def snapshot_ttl_for(endpoint: str, ttl: int) -> int:
+    """Return the lifetime of a response once exported to a snapshot."""
+    for prefix, snapshot_ttl in SNAPSHOT_TTLS:
+        if endpoint.startswith(prefix):
+            return snapshot_ttl
+    return ttl
+
+
+class MemoryTier:
+    """Per-process LRU of parsed responses with per-entry expiry."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: str) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires < time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, expires: float) -> None:
+        self._entries[key] = (expires, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class DiskTier:
+    """SQLite-backed tier shared by all worker processes on the host."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, expires REAL NOT NULL, value BLOB NOT NULL, "
+                "ttl INTEGER, hits INTEGER NOT NULL DEFAULT 0, snapshot_ttl INTEGER)"
+            )
+            # Tiers created before snapshots existed lack the statistics columns.
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(cache)")}
+            if "ttl" not in columns:
+                conn.execute("ALTER TABLE cache ADD COLUMN ttl INTEGER")
+            if "hits" not in columns:
+                conn.execute("ALTER TABLE cache ADD COLUMN hits INTEGER NOT NULL DEFAULT 0")
+            if "snapshot_ttl" not in columns:
+                conn.execute("ALTER TABLE cache ADD COLUMN snapshot_ttl INTEGER")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[tuple[float, Any]]:
+        row = self._connect().execute(
+            "SELECT expires, value FROM cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or row[0] < time.time():
+            return None
+        return row[0], json.loads(row[1])
+
+    def set(
+        self,
+        key: str,
+        value: Any,
+        expires: float,
+        ttl: Optional[int] = None,
+        snapshot_ttl: Optional[int] = None,
+    ) -> None:
+        self._connect().execute(
+            "INSERT INTO cache (key, expires, value, ttl, snapshot_ttl) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET expires = excluded.expires, "
+            "value = excluded.value, ttl = excluded.ttl, snapshot_ttl = excluded.snapshot_ttl",
+            (
+                key,
+                expires,
+                json.dumps(value, separators=(",", ":"), default=to_builtins).encode(),
+                ttl,
+                snapshot_ttl,
+            ),
+        )
+
+    def add_hits(self, hits: dict[str, int]) -> None:
+        self._connect().executemany(
+            "UPDATE cache SET hits = hits + ? WHERE key = ?",
+            [(count, key) for key, count in hits.items()],
+        )
+
+    def purge_expired(self) -> int:
+        cur = self._connect().execute(
+            "DELETE FROM cache WHERE expires < ?", (time.time(),)
+        )
+        return cur.rowcount
+
+
+class ResponseCache:
+    """Memory + shared disk cache with in-flight request coalescing."""
+
+    def __init__(
+        self,
+        max_entries: int = 2048,
+        state_dir: Optional[str] = None,
+        snapshot: Optional[SnapshotTier] = None,
+    ):
+        self.memory = MemoryTier(max_entries)
+        self.disk: Optional[DiskTier] = None
+        self._disk_thread: Optional[ThreadPoolExecutor] = None
+        if state_dir:
+            path = Path(state_dir)
+            path.mkdir(parents=True, exist_ok=True)
+            self.disk = DiskTier(path / "cache.sqlite3")
+            # One thread: its SQLite connection is reused and writes stay ordered.
+            self._disk_thread = ThreadPoolExecutor(1, thread_name_prefix="woosmap-cache")
+        self.snapshot = snapshot
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._hits: Counter[str] = Counter()
+        self._hits_flushed = time.monotonic()
+
+    def _record_hit(self, key: str) -> None:
+        """Count a hit for snapshot exports; written to the disk tier in batches."""
+        if self.disk is None:
+            return
+        self._hits[key] += 1
+        if time.monotonic() - self._hits_flushed >= HIT_FLUSH_INTERVAL:
+            self.flush_hits(background=True)
+
+    def flush_hits(self, background: bool = False) -> None:
+        """Write the pending hit counts, on the disk thread if ``background``."""
+        if self.disk is None or not self._hits:
+            return
+        hits, self._hits = self._hits, Counter()
+        self._hits_flushed = time.monotonic()
+        if background:
+            self._disk_thread.submit(self._add_hits, hits)
+        else:
+            self._add_hits(hits)
+
+    def _add_hits(self, hits: Counter[str]) -> None:
+        try:
+            self.disk.add_hits(hits)
+        except sqlite3.Error as e:
+            logger.warning(f"Disk cache hit count update failed: {e}")
+
+    def _disk_get(self, key: str) -> Optional[tuple[float, Any]]:
+        try:
+            return self.disk.get(key)
+        except sqlite3.Error as e:
+            logger.warning(f"Disk cache read failed: {e}")
+            return None
+
+    def _disk_set(
+        self, key: str, value: Any, expires: float, ttl: int, snapshot_ttl: Optional[int]
+    ) -> None:
+        try:
+            self.disk.set(key, value, expires, ttl, snapshot_ttl)
+        except sqlite3.Error as e:
+            logger.warning(f"Disk cache write failed: {e}")
+
+    async def get(self, key: str) -> Any:
+        value = self.memory.get(key)
+        if value is not None:
+            self._record_hit(key)
+            return value
+        if self.disk is not None:
+            entry = await asyncio.get_running_loop().run_in_executor(
+                self._disk_thread, self._disk_get, key
+            )
+            if entry is not None:
+                expires, value = entry
+                self.memory.set(key, value, expires)
+                self._record_hit(key)
+                return value
+        if self.snapshot is not None:
+            entry = self.snapshot.get(key)
+            if entry is not None:
+                expires, value = entry
+                metrics.inc("woosmap_cache_snapshot_hits_total")
+                self.memory.set(key, value, min(expires, self.snapshot.expires))
+                return value
+        return None
+
+    def set(self, key: str, value: Any, ttl: int, snapshot_ttl: Optional[int] = None) -> None:
+        """Store a value; the disk tier is written in the background."""
+        expires = time.time() + ttl
+        self.memory.set(key, value, expires)
+        if self.disk is not None:
+            self._disk_thread.submit(self._disk_set, key, value, expires, ttl, snapshot_ttl)
+
+    async def get_or_fetch(
+        self,
+        key: str,
+        ttl: int,
+        fetch: Callable[[], Awaitable[Any]],
+        snapshot_ttl: Optional[int] = None,
+    ) -> Any:
+        """Return a cached value, or run ``fetch`` once for all concurrent callers."""
+        value = await self.get(key)
+        if value is None and self.disk is not None and key not in self._inflight:
+            # Another caller may have fetched it while the disk tier was read.
+            value = self.memory.get(key)
+        if value is not None:
+            metrics.inc("woosmap_cache_requests_total", result="hit")
+            return value
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            metrics.inc("woosmap_cache_requests_total", result="coalesced")
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+                # The caller that owned the fetch went away; fetch ourselves.
+            if key in self._inflight:
+                return await self.get_or_fetch(key, ttl, fetch, snapshot_ttl)
+
+        metrics.inc("woosmap_cache_requests_total", result="miss")
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await fetch()
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                # Waiters re-raise it; mark retrieved so the loop does not warn.
+                future.exception()
+            raise
+        else:
+            self.set(key, value, ttl, snapshot_ttl)
+            future.set_result(value)
+            return value
+        finally:
+            del self._inflight[key]
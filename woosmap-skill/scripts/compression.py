@@ -0,0 +1,162 @@
+"""
+Response compression for the HTTP transport.
+
+Tool results travel to web clients inside the ``/sse`` event stream, which
+Starlette's GZipMiddleware leaves alone. ``CompressionMiddleware`` compresses
+it too: each chunk is compressed and flushed on its own, so events still
+arrive as soon as they are sent, while the compression context carries over
+from one event to the next (repeated keys and addresses compress very well
+across a session).
+
+The encoding is negotiated from ``Accept-Encoding``: Brotli when the
+``brotli`` package is installed and the client accepts ``br``, else gzip.
+Complete responses smaller than ``WOOSMAP_COMPRESS_MIN_BYTES`` are sent as
+they are. Bytes before and after compression are counted in
+``woosmap_http_bytes_total``.
+"""
+import os
+import zlib
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from metrics import metrics
+
+try:
+    import brotli
+except ImportError:  # optional, gzip is used instead
+    brotli = None
+
+COMPRESS_ENABLED = os.getenv("WOOSMAP_COMPRESS", "1") != "0"
+COMPRESS_MIN_BYTES = int(os.getenv("WOOSMAP_COMPRESS_MIN_BYTES", "1024"))
+COMPRESS_SSE = os.getenv("WOOSMAP_COMPRESS_SSE", "1") != "0"
+GZIP_LEVEL = int(os.getenv("WOOSMAP_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("WOOSMAP_BROTLI_QUALITY", "5"))
+
+
+class _Gzip:
+    encoding = "gzip"
+
+    def __init__(self):
+        self._z = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        return self._z.compress(data) + self._z.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class _Brotli:
+    encoding = "br"
+
+    def __init__(self):
+        self._c = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        return self._c.process(data) + (self._c.finish() if final else self._c.flush())
+
+
+def negotiate(accept_encoding: str) -> Optional[type]:
+    """Compressor class for an ``Accept-Encoding`` header, or None."""
+    accepted = {}
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[name.strip()] = q
+    wildcard = accepted.get("*", 0.0)
+    if brotli is not None and accepted.get("br", wildcard) > 0:
+        return _Brotli
+    if accepted.get("gzip", wildcard) > 0:
+        return _Gzip
+    return None
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing responses, event streams included."""
+
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESS_MIN_BYTES, sse: bool = COMPRESS_SSE):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.sse = sse
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        compressor_class = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        await self.app(scope, receive, _Responder(send, compressor_class, self.minimum_size, self.sse))
+
+
+class _Responder:
+    """``send`` wrapper compressing one response."""
+
+    def __init__(self, send: Send, compressor_class: Optional[type], minimum_size: int, sse: bool):
+        self.send = send
+        self.compressor_class = compressor_class
+        self.minimum_size = minimum_size
+        self.sse = sse
+        self.start: Optional[Message] = None
+        self.compressor = None
+        self.encoding = "identity"
+        self.passthrough = compressor_class is None
+
+    async def __call__(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            headers = Headers(raw=message["headers"])
+            media_type = headers.get("content-type", "").partition(";")[0].strip().lower()
+            if (
+                "content-encoding" in headers
+                or message["status"] in (204, 206, 304)
+                or (media_type == "text/event-stream" and not self.sse)
+            ):
+                self.passthrough = True
+            if self.passthrough or media_type != "text/event-stream":
+                # Held until the first body tells whether it is worth compressing.
+                self.start = message
+                return
+            # Event streams start right away and are always compressed.
+            self._begin(message)
+            await self.send(message)
+            return
+
+        if message["type"] != "http.response.body":
+            await self._flush_start()
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        metrics.inc("woosmap_http_bytes_total", len(body), stage="uncompressed")
+        if self.start is not None and not self.passthrough:
+            if more_body or len(body) >= self.minimum_size:
+                self._begin(self.start)
+        if self.compressor is not None:
+            body = self.compressor.compress(body, final=not more_body)
+            message = {**message, "body": body}
+        if self.start is not None:
+            if self.compressor is not None and not more_body:
+                MutableHeaders(raw=self.start["headers"])["Content-Length"] = str(len(body))
+            await self._flush_start()
+        metrics.inc("woosmap_http_bytes_total", len(body), stage="sent", encoding=self.encoding)
+        await self.send(message)
+
+    def _begin(self, start: Message) -> None:
+        self.compressor = self.compressor_class()
+        self.encoding = self.compressor.encoding
+        headers = MutableHeaders(raw=start["headers"])
+        headers["Content-Encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+        if "content-length" in headers:
+            del headers["Content-Length"]
+
+    async def _flush_start(self) -> None:
+        if self.start is None:
+            return
+        start, self.start = self.start, None
+        await self.send(start)
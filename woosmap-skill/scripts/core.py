@@ -1,12 +1,33 @@
 import sys
 import os
+import asyncio
+import functools
+import json
 import logging
+import random
+import time
+import uuid
+import weakref
 import debugpy
-from typing import Any, Dict
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
 
 import httpx
 from mcp.server.fastmcp import FastMCP
 
+from deadline import deadline, remaining, tool_budget
+from metrics import Timer, add_phase, metrics, start_loop_monitor
+from profiling import tool_timings
+from render import fit_payload
+from watchdog import watchdog
+from quota import DEFAULT_TENANT, TENANT_HEADER, QuotaTracker, current_session, current_tenant
+from ratelimit import RateLimiter
+from stream_json import Fields, read_body, read_json
+from models import decode
+from cache import ResponseCache, cache_key, snapshot_ttl_for, ttl_for
+from snapshot import SnapshotError, SnapshotTier
 from exceptions import (
     WoosmapError,
     WoosmapAPIError,
@@ -17,6 +38,7 @@ from exceptions import (
     WoosmapNetworkError,
     WoosmapTimeoutError,
     WoosmapServerError,
+    WoosmapResponseTooLargeError,
 )
 
 # -------------------------------------------------
@@ -36,12 +58,20 @@ if os.getenv("MCP_DEBUG") == "1":
 # -------------------------------------------------
 # MCP server
 # -------------------------------------------------
-mcp = FastMCP("woosmapmcp")
+@asynccontextmanager
+async def _lifespan(server: FastMCP):
+    start_loop_monitor()
+    watchdog.start()
+    yield {}
+    response_cache.flush_hits()
+
+
+mcp = FastMCP("woosmapmcp", lifespan=_lifespan)
 
 # -------------------------------------------------
 # Constants
 # -------------------------------------------------
-WOOSMAP_API_BASE = "https://api.woosmap.com"
+WOOSMAP_API_BASE = os.getenv("WOOSMAP_API_BASE", "https://api.woosmap.com")
 USER_AGENT = "woosmapmcp-app/1.0"
 REF_ORIGIN = "https://www.woosmap.com"
 API_KEY = os.getenv("WOOSMAP_API_KEY", "")
@@ -52,20 +82,119 @@ API_KEY = os.getenv("WOOSMAP_API_KEY", "")
 #         "Please set it to your Woosmap API key."
 #     )
 
+# Shared state (disk cache tier, rate-limit bucket). Set this to a directory
+# on local disk so that all worker processes draw from the same budget.
+STATE_DIR = os.getenv("WOOSMAP_STATE_DIR") or None
+CACHE_MAX_ENTRIES = int(os.getenv("WOOSMAP_CACHE_MAX_ENTRIES", "2048"))
+CACHE_ENABLED = os.getenv("WOOSMAP_CACHE", "1") != "0"
+RATE_LIMIT = float(os.getenv("WOOSMAP_RATE_LIMIT", "20"))
+RATE_BURST = int(os.getenv("WOOSMAP_RATE_BURST", "20"))
+# Per-request timeouts, further capped by the remaining tool-call budget.
+REQUEST_TIMEOUT = float(os.getenv("WOOSMAP_REQUEST_TIMEOUT", "30"))
+CONNECT_TIMEOUT = float(os.getenv("WOOSMAP_CONNECT_TIMEOUT", "10"))
+# Retries of transient failures (429, 5xx, timeouts, network errors).
+MAX_RETRIES = int(os.getenv("WOOSMAP_MAX_RETRIES", "2"))
+RETRY_BACKOFF = float(os.getenv("WOOSMAP_RETRY_BACKOFF", "0.5"))
+# Upstream bodies larger than this are rejected (0 disables the check).
+MAX_RESPONSE_BYTES = int(os.getenv("WOOSMAP_MAX_RESPONSE_BYTES", str(16 * 1024 * 1024)))
+# Connection pool of the shared upstream client.
+HTTP_MAX_CONNECTIONS = int(os.getenv("WOOSMAP_HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("WOOSMAP_HTTP_MAX_KEEPALIVE", "20"))
+# Read-only cache snapshot shipped with the skill (see snapshot.py); "" disables it.
+DEFAULT_CACHE_SNAPSHOT = Path(__file__).resolve().parent / "cache.snapshot"
+CACHE_SNAPSHOT = os.getenv("WOOSMAP_CACHE_SNAPSHOT", str(DEFAULT_CACHE_SNAPSHOT))
+CACHE_SNAPSHOT_MAX_AGE = float(os.getenv("WOOSMAP_CACHE_SNAPSHOT_MAX_AGE", str(30 * 24 * 3600)))
+
+
+def _load_snapshot() -> Optional[SnapshotTier]:
+    """Map the cache snapshot, if there is a usable one."""
+    if not CACHE_ENABLED or not CACHE_SNAPSHOT:
+        return None
+    path = Path(CACHE_SNAPSHOT)
+    if not path.is_file():
+        if path != DEFAULT_CACHE_SNAPSHOT:
+            logger.warning(f"Cache snapshot not found: {path}")
+        return None
+    try:
+        snapshot = SnapshotTier(path, CACHE_SNAPSHOT_MAX_AGE)
+    except (OSError, SnapshotError) as e:
+        logger.warning(f"Cache snapshot ignored: {e}")
+        return None
+    if snapshot.expires < time.time():
+        logger.warning(f"Cache snapshot ignored: {path} is older than {CACHE_SNAPSHOT_MAX_AGE:.0f}s")
+        return None
+    logger.info(f"Cache snapshot: {len(snapshot)} entries from {path}")
+    return snapshot
+
+
+response_cache = ResponseCache(CACHE_MAX_ENTRIES, STATE_DIR, _load_snapshot())
+rate_limiter = RateLimiter(RATE_LIMIT, RATE_BURST, STATE_DIR)
+quota_tracker = QuotaTracker(state_dir=STATE_DIR)
+
+# Transport override for upstream calls; the benchmarks install a mock here.
+http_transport: Optional[httpx.AsyncBaseTransport] = None
+
+# One pooled client per event loop. Creating a client per request builds a new
+# SSL context (tens of milliseconds of blocking CPU) and a new connection for
+# every upstream call, which stalls all sessions sharing the loop.
+_http_clients: dict[int, tuple[asyncio.AbstractEventLoop, Any, httpx.AsyncClient]] = {}
+
+
+def _http_client() -> httpx.AsyncClient:
+    """Return the shared upstream client of the running event loop."""
+    loop = asyncio.get_running_loop()
+    entry = _http_clients.get(id(loop))
+    if entry is not None:
+        owner, transport, client = entry
+        if owner is loop and transport is http_transport and not client.is_closed:
+            return client
+    client = httpx.AsyncClient(
+        transport=http_transport,
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+        ),
+    )
+    _http_clients[id(loop)] = (loop, http_transport, client)
+    return client
+
+
+async def close_http_client() -> None:
+    """Close the shared upstream client of the running event loop."""
+    entry = _http_clients.pop(id(asyncio.get_running_loop()), None)
+    if entry is not None:
+        await entry[2].aclose()
+
 
 # -------------------------------------------------
 # HTTP helper
 # -------------------------------------------------
-async def make_woosmap_request(endpoint: str, params: dict[str, Any]) -> dict[str, Any]:
+async def make_woosmap_request(
+    endpoint: str,
+    params: dict[str, Any],
+    fields: Fields | None = None,
+    model: Optional[type] = None,
+) -> Any:
     """
     Make an HTTP request to the Woosmap API.
 
+    Cacheable responses are served from the response cache when possible,
+    and identical concurrent requests share a single upstream call. The body
+    is streamed and, when a projection is given, parsed incrementally.
+    Transient failures are retried, and timeouts come from what is left of
+    the current tool call's deadline.
+
     Args:
         endpoint: API endpoint path (e.g., "localities/nearby")
         params: Query parameters to send with the request
+        fields: Optional projection of the top-level fields to keep, mapping
+            each key to None (whole value) or a maximum number of array items
+            (e.g. {"results": 8})
+        model: Optional response model from ``models`` to decode the body
+            into instead of a dict (e.g. RouteResponse)
 
     Returns:
-        Parsed JSON response from the API
+        Parsed JSON response from the API, or an instance of ``model``
 
     Raises:
         WoosmapAuthError: Invalid or missing API key (401/403)
@@ -73,63 +202,126 @@ async def make_woosmap_request(endpoint: str, params: dict[str, Any]) -> dict[st
         WoosmapNotFoundError: Resource not found (404)
         WoosmapRateLimitError: Rate limit exceeded (429)
         WoosmapServerError: Server-side error (5xx)
-        WoosmapTimeoutError: Request timed out
+        WoosmapTimeoutError: Request timed out or the deadline ran out
         WoosmapNetworkError: Network connectivity issues
+        WoosmapResponseTooLargeError: Body larger than WOOSMAP_MAX_RESPONSE_BYTES
+        WoosmapQuotaExceededError: A usage budget of the caller is spent
+            (soft budgets still allow cached responses, see quota.py)
         WoosmapAPIError: Other API errors
     """
+    quota_tracker.check(current_tool.get())
+    ttl = ttl_for(endpoint, params) if CACHE_ENABLED else 0
+    if not ttl:
+        return await _fetch_with_retries(endpoint, params, fields, model)
+    key_params = dict(params)
+    if fields:
+        key_params["__fields"] = fields
+    if model is not None:
+        key_params["__model"] = model.__name__
+    data = await response_cache.get_or_fetch(
+        cache_key(endpoint, key_params),
+        ttl,
+        lambda: _fetch_with_retries(endpoint, params, fields, model),
+        snapshot_ttl_for(endpoint, ttl),
+    )
+    if model is not None and isinstance(data, dict):
+        # Entries read back from the disk tier are plain JSON.
+        data = model.from_dict(data)
+    return data
+
+
+_RETRYABLE_ERRORS = (
+    WoosmapRateLimitError,
+    WoosmapServerError,
+    WoosmapTimeoutError,
+    WoosmapNetworkError,
+)
+
+
+async def _fetch_with_retries(
+    endpoint: str,
+    params: dict[str, Any],
+    fields: Fields | None = None,
+    model: Optional[type] = None,
+) -> Any:
+    """Retry transient failures with exponential backoff, within the deadline."""
+    attempt = 0
+    while True:
+        try:
+            return await _fetch(endpoint, params, fields, model)
+        except _RETRYABLE_ERRORS as e:
+            delay = RETRY_BACKOFF * (2 ** attempt) * (0.5 + random.random())
+            budget = remaining()
+            if attempt >= MAX_RETRIES or (budget is not None and budget <= delay):
+                raise
+            attempt += 1
+            metrics.inc(
+                "woosmap_upstream_retries_total",
+                endpoint=endpoint,
+                error=type(e).__name__,
+            )
+            logger.warning(
+                f"Retrying {endpoint} in {delay:.2f}s "
+                f"(attempt {attempt}/{MAX_RETRIES}): {e.message}"
+            )
+            await asyncio.sleep(delay)
+
+
+def _request_timeout(endpoint: str) -> float:
+    """Return the time allowed for one request given the current deadline."""
+    budget = remaining()
+    if budget is None:
+        return REQUEST_TIMEOUT
+    if budget <= 0:
+        raise WoosmapTimeoutError(
+            "Tool call deadline exceeded before the request was sent",
+            details={"endpoint": endpoint},
+        )
+    return min(REQUEST_TIMEOUT, budget)
+
+
+async def _fetch(
+    endpoint: str,
+    params: dict[str, Any],
+    fields: Fields | None = None,
+    model: Optional[type] = None,
+) -> Any:
+    """Send a single rate-limited request to the Woosmap API."""
     headers = {
         "User-Agent": USER_AGENT,
         "Origin": REF_ORIGIN,
     }
     params["key"] = API_KEY
 
-    try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            resp = await client.get(
-                f"{WOOSMAP_API_BASE}/{endpoint}",
-                headers=headers,
-                params=params,
-            )
+    quota_tracker.charge(endpoint, params, current_tool.get())
+    throttled = time.perf_counter()
+    await rate_limiter.acquire()
+    add_phase("throttle", time.perf_counter() - throttled)
+    timeout = _request_timeout(endpoint)
 
-            # Handle HTTP status codes
-            if resp.status_code == 400:
-                raise WoosmapBadRequestError(
-                    f"Bad request: {resp.text}",
-                    details={"status_code": 400, "endpoint": endpoint},
-                )
-            elif resp.status_code == 401:
-                raise WoosmapAuthError(
-                    "Invalid API key",
-                    details={"status_code": 401, "endpoint": endpoint},
-                )
-            elif resp.status_code == 403:
-                raise WoosmapAuthError(
-                    "API key not authorized for this endpoint",
-                    details={"status_code": 403, "endpoint": endpoint},
-                )
-            elif resp.status_code == 404:
-                raise WoosmapNotFoundError(
-                    f"Resource not found: {endpoint}",
-                    details={"status_code": 404, "endpoint": endpoint},
-                )
-            elif resp.status_code == 429:
-                raise WoosmapRateLimitError(
-                    "Rate limit exceeded. Please try again later.",
-                    details={"status_code": 429, "endpoint": endpoint},
-                )
-            elif 500 <= resp.status_code < 600:
-                raise WoosmapServerError(
-                    f"Server error: {resp.status_code}",
-                    details={"status_code": resp.status_code, "endpoint": endpoint},
-                )
+    async def send(client: httpx.AsyncClient) -> dict[str, Any]:
+        request = client.build_request(
+            "GET",
+            f"{WOOSMAP_API_BASE}/{endpoint}",
+            headers=headers,
+            params=params,
+            timeout=httpx.Timeout(timeout, connect=min(CONNECT_TIMEOUT, timeout)),
+        )
+        with Timer("woosmap_upstream_seconds", "network", endpoint=endpoint):
+            resp = await client.send(request, stream=True)
+        try:
+            return await _read_response(resp, endpoint, fields, model)
+        finally:
+            await resp.aclose()
 
-            resp.raise_for_status()
-            return resp.json()
+    try:
+        # httpx timeouts apply per operation; this bounds the whole exchange.
+        return await asyncio.wait_for(send(_http_client()), timeout)
 
-    except httpx.TimeoutException as e:
+    except (httpx.TimeoutException, asyncio.TimeoutError) as e:
         logger.error(f"Request to {endpoint} timed out: {e}")
         raise WoosmapTimeoutError(
-            "Request timed out after 30 seconds",
+            f"Request timed out after {timeout:.1f} seconds",
             details={"endpoint": endpoint},
         ) from e
 
@@ -159,7 +351,179 @@ async def make_woosmap_request(endpoint: str, params: dict[str, Any]) -> dict[st
         ) from e
 
 
-@mcp.tool()
+async def _read_response(
+    resp: httpx.Response,
+    endpoint: str,
+    fields: Fields | None,
+    model: Optional[type] = None,
+) -> Any:
+    """Map the HTTP status to our exceptions and parse the streamed body."""
+    metrics.inc(
+        "woosmap_upstream_requests_total",
+        endpoint=endpoint,
+        status=resp.status_code,
+    )
+
+    # Handle HTTP status codes
+    if resp.status_code == 400:
+        await resp.aread()
+        raise WoosmapBadRequestError(
+            f"Bad request: {resp.text}",
+            details={"status_code": 400, "endpoint": endpoint},
+        )
+    elif resp.status_code == 401:
+        raise WoosmapAuthError(
+            "Invalid API key",
+            details={"status_code": 401, "endpoint": endpoint},
+        )
+    elif resp.status_code == 403:
+        raise WoosmapAuthError(
+            "API key not authorized for this endpoint",
+            details={"status_code": 403, "endpoint": endpoint},
+        )
+    elif resp.status_code == 404:
+        raise WoosmapNotFoundError(
+            f"Resource not found: {endpoint}",
+            details={"status_code": 404, "endpoint": endpoint},
+        )
+    elif resp.status_code == 429:
+        raise WoosmapRateLimitError(
+            "Rate limit exceeded. Please try again later.",
+            details={"status_code": 429, "endpoint": endpoint},
+        )
+    elif 500 <= resp.status_code < 600:
+        raise WoosmapServerError(
+            f"Server error: {resp.status_code}",
+            details={"status_code": resp.status_code, "endpoint": endpoint},
+        )
+
+    resp.raise_for_status()
+
+    declared = int(resp.headers.get("content-length") or 0)
+    if MAX_RESPONSE_BYTES and declared > MAX_RESPONSE_BYTES:
+        raise WoosmapResponseTooLargeError(
+            f"Response body exceeds {MAX_RESPONSE_BYTES} bytes",
+            details={"endpoint": endpoint, "content_length": declared},
+        )
+
+    # The body is streamed while it is parsed, so this includes reading it.
+    with Timer("woosmap_parse_seconds", "parse", endpoint=endpoint):
+        if model is None:
+            data, size = await read_json(resp.aiter_bytes(), fields, MAX_RESPONSE_BYTES)
+        else:
+            body = await read_body(resp.aiter_bytes(), MAX_RESPONSE_BYTES)
+            size = len(body)
+            data = decode(model, body)
+    metrics.observe("woosmap_upstream_response_bytes", size, endpoint=endpoint)
+    return data
+
+
+# -------------------------------------------------
+# Tool registration
+# -------------------------------------------------
+# Extra time given to a tool past its deadline, so that the timeout raised by
+# the upstream request itself is reported with the tool's own error context.
+DEADLINE_GRACE = 0.25
+
+# Name of the tool being served, for metrics and logging.
+current_tool: ContextVar[Optional[str]] = ContextVar("woosmap_tool", default=None)
+
+
+def _requested_deadline_ms() -> Optional[float]:
+    """Read the client's ``_meta.deadline_ms`` for the current request, if any."""
+    try:
+        meta = mcp.get_context().request_context.meta
+    except (LookupError, ValueError):
+        return None
+    value = getattr(meta, "deadline_ms", None) if meta is not None else None
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+# Quota ids of the open MCP sessions. Object ids can be reused once a session
+# is gone, so each session gets its own uuid, forgotten with the session.
+_session_ids: "weakref.WeakKeyDictionary[Any, str]" = weakref.WeakKeyDictionary()
+
+
+def _session_id(session: Any) -> str:
+    session_id = _session_ids.get(session)
+    if session_id is None:
+        session_id = _session_ids[session] = uuid.uuid4().hex
+        # The session's exit stack is closed when it ends; sessions without
+        # one are forgotten when collected.
+        exit_stack = getattr(session, "_exit_stack", None)
+        if exit_stack is not None:
+            exit_stack.callback(quota_tracker.forget_session, session_id)
+        else:
+            weakref.finalize(session, quota_tracker.forget_session, session_id)
+    return session_id
+
+
+def _caller() -> tuple[Optional[str], str]:
+    """(session id, tenant) of the current request, for quota accounting."""
+    try:
+        request_context = mcp.get_context().request_context
+    except (LookupError, ValueError):
+        return None, DEFAULT_TENANT
+    headers = getattr(request_context.request, "headers", None)
+    tenant = headers.get(TENANT_HEADER) if headers is not None else None
+    return _session_id(request_context.session), tenant or DEFAULT_TENANT
+
+
+def tool(*args: Any, **kwargs: Any) -> Callable:
+    """
+    Register a tool on the MCP server, like ``mcp.tool()``.
+
+    Each call runs under a deadline taken from the client's
+    ``_meta.deadline_ms`` or from configuration (see deadline.py). Upstream
+    requests share that budget, and the call is cancelled once it runs out.
+    """
+
+    def decorator(fn: Callable) -> Callable:
+        name = kwargs.get("name") or fn.__name__
+
+        @functools.wraps(fn)
+        async def wrapper(*fn_args: Any, **fn_kwargs: Any) -> Any:
+            budget = tool_budget(name, _requested_deadline_ms())
+            session, tenant = _caller()
+            token = current_tool.set(name)
+            session_token = current_session.set(session)
+            tenant_token = current_tenant.set(tenant)
+            try:
+                with deadline(budget), tool_timings(name):
+                    result = await asyncio.wait_for(
+                        fn(*fn_args, **fn_kwargs), budget + DEADLINE_GRACE
+                    )
+                    return fit_payload(result, name)
+            except asyncio.TimeoutError:
+                logger.error(f"Tool {name} exceeded its {budget:.1f}s deadline")
+                metrics.inc("woosmap_tool_deadline_exceeded_total", tool=name)
+                error = WoosmapTimeoutError(
+                    f"Tool call exceeded its {budget:.1f} second deadline",
+                    details={"tool": name},
+                )
+                return {
+                    "content": [
+                        {
+                            "type": "text",
+                            "text": f"### Error\n\n**{error.__class__.__name__}**: {error.message}\n\n"
+                            f"**Details:** {json.dumps(error.details, indent=2)}",
+                        }
+                    ]
+                }
+            finally:
+                current_tenant.reset(tenant_token)
+                current_session.reset(session_token)
+                current_tool.reset(token)
+
+        return mcp.tool(*args, **kwargs)(wrapper)
+
+    return decorator
+
+
+@tool()
 async def health_check() -> Dict[str, Any]:
     """
     Check the health of the service.
@@ -0,0 +1,489 @@
+"""
+Registry of local point datasets (stores, branches, customers...).
+
+Datasets are declared with ``WOOSMAP_DATASETS`` as comma-separated
+``name=path`` pairs pointing at CSV or GeoJSON files:
+
+    WOOSMAP_DATASETS="stores=/data/stores.csv,depots=/data/depots.geojson"
+
+The first use of a dataset ingests the source file into a columnar binary
+store under ``WOOSMAP_DATASET_DIR`` (by default ``<WOOSMAP_STATE_DIR>/datasets``):
+latitude and longitude columns, grid cell keys, and UTF-8 blobs with offset
+arrays for ids and names. Points are written sorted by grid cell, so every
+cell is a contiguous slice and the sorted cell keys are the spatial index.
+
+Later loads, in this process or any other worker, only memory-map those
+files: nothing is parsed, columns are zero-copy views of the mapped pages,
+and the pages are shared through the OS page cache. The store is rebuilt
+when the source file changes. To ingest ahead of time (e.g. at deploy):
+
+    python datasets.py stores=/data/stores.csv
+"""
+import csv
+import hashlib
+import heapq
+import json
+import logging
+import math
+import mmap
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+from exceptions import WoosmapBadRequestError, WoosmapNotFoundError
+from geo import EARTH_RADIUS_M, LatLngTuple, haversine_m
+
+try:
+    import numpy as np
+except ImportError:  # optional, falls back to pure Python scans
+    np = None
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+
+DATASET_DIR = Path(
+    os.getenv("WOOSMAP_DATASET_DIR")
+    or os.path.join(os.getenv("WOOSMAP_STATE_DIR") or tempfile.gettempdir(), "datasets")
+)
+# float32 coordinates halve the store size (precision stays under a meter).
+COORD_TYPE = "f" if os.getenv("WOOSMAP_DATASET_FLOAT32", "0") == "1" else "d"
+# Target number of points per occupied grid cell.
+POINTS_PER_CELL = int(os.getenv("WOOSMAP_DATASET_POINTS_PER_CELL", "32"))
+
+# Accepted column names, in order of preference.
+ID_COLUMNS = ("id", "store_id", "public_id", "ref", "code")
+NAME_COLUMNS = ("name", "title", "label")
+LAT_COLUMNS = ("lat", "latitude", "y")
+LNG_COLUMNS = ("lng", "lon", "long", "longitude", "x")
+
+_METERS_PER_DEGREE = math.pi * EARTH_RADIUS_M / 180
+_HALF_CIRCUMFERENCE_M = math.pi * EARTH_RADIUS_M
+
+Row = tuple[str, str, float, float]
+
+
+# -------------------------------------------------
+# Source parsing
+# -------------------------------------------------
+def _pick(columns: list[str], candidates: tuple[str, ...]) -> Optional[str]:
+    lowered = {c.lower().strip(): c for c in columns}
+    return next((lowered[c] for c in candidates if c in lowered), None)
+
+
+def _read_csv(name: str, path: Path) -> Iterator[Row]:
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.DictReader(f)
+        columns = reader.fieldnames or []
+        lat_col, lng_col = _pick(columns, LAT_COLUMNS), _pick(columns, LNG_COLUMNS)
+        if lat_col is None or lng_col is None:
+            raise WoosmapBadRequestError(
+                f"Dataset {name!r}: no latitude/longitude columns in {path}",
+                {"columns": columns},
+            )
+        id_col, name_col = _pick(columns, ID_COLUMNS), _pick(columns, NAME_COLUMNS)
+        for n, row in enumerate(reader, 1):
+            try:
+                lat, lng = float(row[lat_col]), float(row[lng_col])
+            except (TypeError, ValueError):
+                logger.warning(f"Dataset {name}: skipping row {n} without coordinates")
+                continue
+            id_ = row[id_col] if id_col else str(n)
+            yield id_, row[name_col] if name_col else id_, lat, lng
+
+
+def _read_geojson(name: str, path: Path) -> Iterator[Row]:
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    features = data.get("features", []) if data.get("type") == "FeatureCollection" else [data]
+    for n, feature in enumerate(features, 1):
+        geometry = feature.get("geometry") or {}
+        if geometry.get("type") != "Point":
+            continue
+        lng, lat = geometry["coordinates"][:2]
+        props = feature.get("properties") or {}
+        id_ = feature.get("id") or next((props[c] for c in ID_COLUMNS if c in props), n)
+        label = next((props[c] for c in NAME_COLUMNS if c in props), id_)
+        yield str(id_), str(label), float(lat), float(lng)
+
+
+def read_points(name: str, path: Path) -> Iterator[Row]:
+    """Stream (id, name, lat, lng) rows of a CSV or GeoJSON file."""
+    if path.suffix.lower() in (".geojson", ".json"):
+        return _read_geojson(name, path)
+    return _read_csv(name, path)
+
+
+# -------------------------------------------------
+# Columnar store
+# -------------------------------------------------
+def _cell_size(lats: array, lngs: array) -> float:
+    """
+    Largest grid cell size, in degrees, whose cells hold at most
+    POINTS_PER_CELL points around the median point (so clustered data gets
+    small cells even when a few points lie far away).
+    """
+    half = len(lats) / 2
+    cell = 1.0
+    while cell > 0.001:
+        if np is not None:
+            rows = np.floor((np.frombuffer(lats, dtype=np.float64) + 90) / cell)
+            cols = np.floor((np.frombuffer(lngs, dtype=np.float64) + 180) / cell)
+            counts = np.unique(rows * 1e6 + cols, return_counts=True)[1].tolist()
+        else:
+            counts = list(Counter(
+                (int((a + 90) / cell), int((b + 180) / cell)) for a, b in zip(lats, lngs)
+            ).values())
+        # Population of the cell of the median point.
+        seen = 0
+        for count in sorted(counts):
+            seen += count
+            if seen >= half:
+                break
+        if not counts or count <= POINTS_PER_CELL:
+            break
+        cell /= 2
+    return cell
+
+
+def _write_strings(directory: Path, column: str, values: list[str]) -> None:
+    offsets = array("Q", [0])
+    with open(directory / f"{column}.txt", "wb") as blob:
+        for value in values:
+            data = value.encode()
+            blob.write(data)
+            offsets.append(offsets[-1] + len(data))
+    with open(directory / f"{column}.off", "wb") as f:
+        offsets.tofile(f)
+
+
+def ingest(name: str, source: Path, target: Path) -> None:
+    """Convert a CSV/GeoJSON file into the columnar store at ``target``."""
+    ids: list[str] = []
+    names: list[str] = []
+    lats, lngs = array("d"), array("d")
+    try:
+        for id_, label, lat, lng in read_points(name, source):
+            if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+                logger.warning(f"Dataset {name}: skipping {id_} with invalid coordinates")
+                continue
+            ids.append(id_)
+            names.append(label)
+            lats.append(lat)
+            lngs.append(lng)
+    except OSError as e:
+        raise WoosmapNotFoundError(f"Dataset {name!r} cannot be read: {e}") from e
+    except (ValueError, KeyError, IndexError) as e:
+        raise WoosmapBadRequestError(f"Dataset {name!r} is malformed: {e}") from e
+
+    cell_deg = _cell_size(lats, lngs)
+    n_cols = math.ceil(360 / cell_deg)
+    cells = array("q", (
+        int((lat + 90) / cell_deg) * n_cols + min(int((lng + 180) / cell_deg), n_cols - 1)
+        for lat, lng in zip(lats, lngs)
+    ))
+    if np is not None:
+        order = np.argsort(np.frombuffer(cells, dtype=np.int64), kind="stable").tolist()
+    else:
+        order = sorted(range(len(cells)), key=cells.__getitem__)
+
+    tmp = Path(tempfile.mkdtemp(prefix=f".{target.name}-", dir=target.parent))
+    try:
+        for column, values, typecode in (
+            ("lat", lats, COORD_TYPE),
+            ("lng", lngs, COORD_TYPE),
+            ("cell", cells, "q"),
+        ):
+            with open(tmp / f"{column}.bin", "wb") as f:
+                array(typecode, (values[i] for i in order)).tofile(f)
+        _write_strings(tmp, "id", [ids[i] for i in order])
+        _write_strings(tmp, "name", [names[i] for i in order])
+        # Positions sorted by id: the id index, searched with bisect.
+        with open(tmp / "id_order.bin", "wb") as f:
+            by_id = sorted(range(len(order)), key=lambda j: ids[order[j]])
+            array("I", by_id).tofile(f)
+        (tmp / "meta.json").write_text(json.dumps({
+            "version": FORMAT_VERSION,
+            "name": name,
+            "source": str(source),
+            "count": len(order),
+            "coord_type": COORD_TYPE,
+            "cell_deg": cell_deg,
+        }))
+        try:
+            os.rename(tmp, target)
+        except OSError:
+            # Another worker finished the same store first.
+            if not (target / "meta.json").exists():
+                raise
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    logger.info(f"Ingested dataset {name} ({len(order)} points) into {target}")
+
+
+def _map(path: Path, typecode: str) -> memoryview:
+    """Map a file read-only and view it as an array of ``typecode``."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return memoryview(b"").cast(typecode)
+        return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)).cast(typecode)
+
+
+class StringColumn:
+    """Strings stored as one UTF-8 blob plus offsets, decoded on access."""
+
+    __slots__ = ("_offsets", "_blob")
+
+    def __init__(self, offsets: memoryview, blob: memoryview):
+        self._offsets = offsets
+        self._blob = blob
+
+    def __len__(self) -> int:
+        return max(0, len(self._offsets) - 1)
+
+    def __getitem__(self, i: int) -> str:
+        if i < 0:
+            i += len(self)
+        return str(self._blob[self._offsets[i]:self._offsets[i + 1]], "utf-8")
+
+
+class _SortedIds:
+    """The ids in sorted order, for bisect."""
+
+    __slots__ = ("ids", "order")
+
+    def __init__(self, ids: StringColumn, order: memoryview):
+        self.ids = ids
+        self.order = order
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def __getitem__(self, j: int) -> str:
+        return self.ids[self.order[j]]
+
+
+class Dataset:
+    """
+    A memory-mapped point dataset.
+
+    ``lats``, ``lngs`` and ``cells`` are zero-copy views of the store files;
+    ``ids`` and ``names`` decode single entries on access.
+    """
+
+    __slots__ = (
+        "name", "path", "cell_deg", "n_cols", "lats", "lngs", "cells",
+        "ids", "names", "_by_id", "_np_lats", "_np_lngs",
+    )
+
+    def __init__(self, name: str, path: Path):
+        meta = json.loads((path / "meta.json").read_text())
+        self.name = name
+        self.path = path
+        self.cell_deg: float = meta["cell_deg"]
+        self.n_cols = math.ceil(360 / self.cell_deg)
+        coord_type = meta["coord_type"]
+        self.lats = _map(path / "lat.bin", coord_type)
+        self.lngs = _map(path / "lng.bin", coord_type)
+        self.cells = _map(path / "cell.bin", "q")
+        self.ids = StringColumn(_map(path / "id.off", "Q"), _map(path / "id.txt", "B"))
+        self.names = StringColumn(_map(path / "name.off", "Q"), _map(path / "name.txt", "B"))
+        self._by_id = _SortedIds(self.ids, _map(path / "id_order.bin", "I"))
+        if np is not None:
+            dtype = np.float32 if coord_type == "f" else np.float64
+            self._np_lats = np.frombuffer(self.lats, dtype=dtype)
+            self._np_lngs = np.frombuffer(self.lngs, dtype=dtype)
+
+    def __len__(self) -> int:
+        return len(self.lats)
+
+    def point(self, i: int) -> LatLngTuple:
+        return self.lats[i], self.lngs[i]
+
+    def index_of(self, id_: str) -> Optional[int]:
+        """Position of the point with id ``id_``, None if absent."""
+        j = bisect_left(self._by_id, id_)
+        if j < len(self._by_id) and self._by_id[j] == id_:
+            return self._by_id.order[j]
+        return None
+
+    # -------------------------------------------------
+    # Spatial queries
+    # -------------------------------------------------
+    def _slices(self, point: LatLngTuple, radius_m: float) -> list[tuple[int, int]]:
+        """Contiguous point ranges of the grid cells covering ``radius_m`` around ``point``."""
+        lat, lng = point
+        dlat = radius_m / _METERS_PER_DEGREE
+        cell, n_cols = self.cell_deg, self.n_cols
+        row0 = max(0, math.floor((lat - dlat + 90) / cell))
+        row1 = int((min(90.0, lat + dlat) + 90) / cell)
+        if abs(lat) + dlat >= 90:
+            col_ranges = [(0, n_cols - 1)]
+        else:
+            dlng = dlat / math.cos(math.radians(abs(lat) + dlat))
+            if dlng >= 180:
+                col_ranges = [(0, n_cols - 1)]
+            else:
+                col0 = math.floor((lng - dlng + 180) / cell)
+                col1 = math.floor((lng + dlng + 180) / cell)
+                col_ranges = [(max(0, col0), min(n_cols - 1, col1))]
+                if col0 < 0:
+                    col_ranges.append((col0 + n_cols, n_cols - 1))
+                if col1 >= n_cols:
+                    col_ranges.append((0, col1 - n_cols))
+        slices = []
+        for row in range(row0, row1 + 1):
+            for c0, c1 in col_ranges:
+                start = bisect_left(self.cells, row * n_cols + c0)
+                end = bisect_right(self.cells, row * n_cols + c1, lo=start)
+                if start < end:
+                    slices.append((start, end))
+        return slices
+
+    def _distances(self, point: LatLngTuple, slices: list[tuple[int, int]]) -> tuple[Any, Any]:
+        """(indices, meters) of the points in ``slices``."""
+        if np is None:
+            index = [i for start, end in slices for i in range(start, end)]
+            return index, [haversine_m(point, (self.lats[i], self.lngs[i])) for i in index]
+        index = np.concatenate([np.arange(s, e) for s, e in slices]) if slices else np.arange(0)
+        lats = np.radians(self._np_lats[index].astype(np.float64))
+        lngs = np.radians(self._np_lngs[index].astype(np.float64))
+        lat1, lng1 = math.radians(point[0]), math.radians(point[1])
+        h = (
+            np.sin((lats - lat1) / 2) ** 2
+            + math.cos(lat1) * np.cos(lats) * np.sin((lngs - lng1) / 2) ** 2
+        )
+        return index, 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(h, 1.0)))
+
+    def _k_smallest(self, index: Any, distances: Any, k: int) -> list[tuple[int, float]]:
+        if np is None:
+            return heapq.nsmallest(k, zip(index, distances), key=lambda item: item[1])
+        if k < len(distances):
+            part = np.argpartition(distances, k)[:k]
+        else:
+            part = np.arange(len(distances))
+        part = part[np.argsort(distances[part], kind="stable")]
+        return list(zip(index[part].tolist(), distances[part].tolist()))
+
+    def nearest(self, point: LatLngTuple, k: int) -> list[tuple[int, float]]:
+        """
+        The ``k`` points closest to ``point`` as the crow flies, as (index, meters).
+
+        Searches the grid cells around ``point``, doubling the radius until
+        ``k`` points lie within it, so only nearby cells are scanned.
+        """
+        k = min(k, len(self))
+        if k <= 0:
+            return []
+        radius = self.cell_deg * _METERS_PER_DEGREE
+        while True:
+            everything = radius >= _HALF_CIRCUMFERENCE_M
+            slices = [(0, len(self))] if everything else self._slices(point, radius)
+            if everything or sum(e - s for s, e in slices) >= k:
+                best = self._k_smallest(*self._distances(point, slices), k)
+                # Points outside the searched box are farther than the radius.
+                if everything or (len(best) == k and best[-1][1] <= radius):
+                    return best
+            radius *= 2
+
+    def within(self, point: LatLngTuple, radius_m: float) -> list[tuple[int, float]]:
+        """Points within ``radius_m`` of ``point``, nearest first, as (index, meters)."""
+        index, distances = self._distances(point, self._slices(point, radius_m))
+        if np is not None:
+            index, distances = index.tolist(), distances.tolist()
+        return sorted(
+            ((i, d) for i, d in zip(index, distances) if d <= radius_m),
+            key=lambda item: item[1],
+        )
+
+
+# -------------------------------------------------
+# Registry
+# -------------------------------------------------
+_paths: dict[str, Path] = {}
+_loaded: dict[str, Dataset] = {}
+_lock = threading.Lock()
+
+
+def register(name: str, path: str | Path) -> None:
+    """Declare a dataset; it is ingested or mapped on first use."""
+    _paths[name] = Path(path).resolve()
+    _loaded.pop(name, None)
+
+
+def registered() -> dict[str, Path]:
+    return dict(_paths)
+
+
+def _store_path(name: str, source: Path, stat: os.stat_result) -> Path:
+    """Store directory for this version of ``source``: ``<name>-<source>-<version>``."""
+    source_key = hashlib.sha1(str(source).encode()).hexdigest()[:8]
+    version = hashlib.sha1(
+        f"{stat.st_mtime_ns}|{stat.st_size}|{FORMAT_VERSION}|{COORD_TYPE}|{POINTS_PER_CELL}".encode()
+    ).hexdigest()[:12]
+    return DATASET_DIR / f"{name}-{source_key}-{version}"
+
+
+def _remove_stale(store: Path) -> None:
+    """Delete stores of older versions of the same source (mapped pages stay valid)."""
+    prefix = store.name.rsplit("-", 1)[0] + "-"
+    for old in DATASET_DIR.glob(prefix + "*"):
+        if old != store and old.is_dir() and not old.name.startswith("."):
+            shutil.rmtree(old, ignore_errors=True)
+
+
+def get_dataset(name: str) -> Dataset:
+    """
+    Return a registered dataset, ingesting its source if needed.
+
+    Ingesting reads the whole source file, so async callers should run this
+    in a thread (``asyncio.to_thread``).
+
+    Raises:
+        WoosmapNotFoundError: The dataset is not registered or its file is missing.
+        WoosmapBadRequestError: The file has no usable coordinates.
+    """
+    source = _paths.get(name)
+    if source is None:
+        raise WoosmapNotFoundError(
+            f"Unknown dataset {name!r}", {"available": sorted(_paths)}
+        )
+    try:
+        stat = source.stat()
+    except OSError as e:
+        raise WoosmapNotFoundError(f"Dataset {name!r} cannot be read: {e}") from e
+    store = _store_path(name, source, stat)
+    with _lock:
+        dataset = _loaded.get(name)
+        if dataset is not None and dataset.path == store:
+            return dataset
+        if not (store / "meta.json").exists():
+            DATASET_DIR.mkdir(parents=True, exist_ok=True)
+            ingest(name, source, store)
+            _remove_stale(store)
+        dataset = _loaded[name] = Dataset(name, store)
+    logger.info(f"Mapped dataset {name} ({len(dataset)} points) from {store}")
+    return dataset
+
+
+for _entry in filter(None, (e.strip() for e in os.getenv("WOOSMAP_DATASETS", "").split(","))):
+    _name, _, _path = _entry.partition("=")
+    if _path:
+        register(_name.strip(), _path.strip())
+    else:
+        logger.warning(f"Ignoring WOOSMAP_DATASETS entry without a path: {_entry}")
+
+
+if __name__ == "__main__":
+    for _arg in sys.argv[1:]:
+        _name, _, _path = _arg.partition("=")
+        register(_name, _path)
+        _dataset = get_dataset(_name)
+        print(f"{_name}: {len(_dataset)} points in {_dataset.path}")
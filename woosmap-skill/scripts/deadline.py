@@ -0,0 +1,52 @@
+"""
+Deadlines for tool calls.
+
+Each tool call runs under an overall time budget, set by the client through
+the request's ``_meta.deadline_ms`` or by configuration. The deadline is kept
+in a context variable, so every upstream request made while serving the call,
+including retries and requests in concurrent sub-tasks, draws its timeouts
+from what is left of the same budget instead of a fixed 30 seconds each.
+"""
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+# Overall budget of a tool call in seconds; per tool with
+# WOOSMAP_TOOL_BUDGET_<TOOL_NAME>, e.g. WOOSMAP_TOOL_BUDGET_GET_DISTANCE_MATRIX.
+DEFAULT_TOOL_BUDGET = float(os.getenv("WOOSMAP_TOOL_BUDGET", "60"))
+
+_deadline: ContextVar[Optional[float]] = ContextVar("woosmap_deadline", default=None)
+
+
+def tool_budget(tool_name: str, requested_ms: Optional[float] = None) -> float:
+    """Return the budget (seconds) of a call, preferring the client's request."""
+    configured = float(
+        os.getenv(f"WOOSMAP_TOOL_BUDGET_{tool_name.upper()}", DEFAULT_TOOL_BUDGET)
+    )
+    if requested_ms is not None and requested_ms > 0:
+        return min(configured, requested_ms / 1000.0)
+    return configured
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current deadline, or None without a deadline."""
+    expires = _deadline.get()
+    if expires is None:
+        return None
+    return expires - time.monotonic()
+
+
+@contextmanager
+def deadline(seconds: float) -> Iterator[None]:
+    """Run the enclosed block under a deadline (never extending an outer one)."""
+    expires = time.monotonic() + seconds
+    outer = _deadline.get()
+    if outer is not None:
+        expires = min(expires, outer)
+    token = _deadline.set(expires)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
@@ -1,12 +1,24 @@
 import json
+import os
 from typing import Any, Dict, List, Optional
 import logging
 
-from core import mcp, make_woosmap_request
-from exceptions import WoosmapError
+from mcp.server.fastmcp import Context
+
+from batching import run_batch
+from core import make_woosmap_request, tool
+from exceptions import WoosmapBadRequestError, WoosmapError
+from matrix import DistanceMatrix
+from models import MatrixResponse, Route, RouteResponse, TollRoute, TollsResponse
+from render import dumps, render
 
 logger = logging.getLogger(__name__)
 
+# Upstream limit on origins x destinations per Distance Matrix request.
+MATRIX_MAX_ELEMENTS = int(os.getenv("WOOSMAP_MATRIX_MAX_ELEMENTS", "200"))
+# Most origins x destinations of one tiled matrix, across all its requests.
+MATRIX_MAX_TOTAL_ELEMENTS = int(os.getenv("WOOSMAP_MATRIX_MAX_TOTAL_ELEMENTS", "10000"))
+
 
 def _error_response(error: WoosmapError, context: dict[str, Any]) -> dict[str, Any]:
     """Format a WoosmapError into a proper MCP response."""
@@ -21,7 +33,198 @@ def _error_response(error: WoosmapError, context: dict[str, Any]) -> dict[str, A
     }
 
 
-@mcp.tool()
+def _route_weight(routes: list[Route]) -> int:
+    """Estimate the rendering cost of a routes payload from its step count."""
+    return sum(1 + len(leg.steps) for r in routes for leg in r.legs)
+
+
+def matrix_tiles(
+    n_origins: int, n_destinations: int, max_elements: int = MATRIX_MAX_ELEMENTS
+) -> list[tuple[int, int, int, int]]:
+    """Split a matrix into (origin_start, origin_end, dest_start, dest_end) tiles."""
+    dest_step = max(1, min(n_destinations, max_elements))
+    origin_step = max(1, max_elements // dest_step)
+    return [
+        (o, min(o + origin_step, n_origins), d, min(d + dest_step, n_destinations))
+        for o in range(0, n_origins, origin_step)
+        for d in range(0, n_destinations, dest_step)
+    ]
+
+
+async def fetch_distance_matrix(
+    origins: List[str],
+    destinations: List[str],
+    params: Dict[str, Any],
+    ctx: Optional[Context] = None,
+) -> DistanceMatrix:
+    """
+    Fetch a distance matrix of any size, tiling it over several requests.
+
+    Tiles are fetched concurrently; progress and each finished tile are
+    reported through ``ctx``. Elements of a tile that failed carry the error
+    class name as their status and the overall status becomes "PARTIAL".
+    Each tile is converted to arrays as soon as it arrives and merged into
+    the result in place.
+
+    Raises:
+        WoosmapBadRequestError: The matrix has more than
+            WOOSMAP_MATRIX_MAX_TOTAL_ELEMENTS elements; nothing is fetched.
+        WoosmapError: Every request of the matrix failed (the first error).
+    """
+    elements = len(origins) * len(destinations)
+    if elements > MATRIX_MAX_TOTAL_ELEMENTS:
+        raise WoosmapBadRequestError(
+            f"{len(origins)} origins x {len(destinations)} destinations = {elements} elements "
+            f"exceed the limit of {MATRIX_MAX_TOTAL_ELEMENTS} per call"
+        )
+    tiles = matrix_tiles(len(origins), len(destinations))
+
+    async def fetch_tile(tile: tuple[int, int, int, int]) -> DistanceMatrix:
+        o0, o1, d0, d1 = tile
+        response = await make_woosmap_request(
+            "distance/distancematrix/json",
+            {
+                **params,
+                "origins": "|".join(origins[o0:o1]),
+                "destinations": "|".join(destinations[d0:d1]),
+            },
+            model=MatrixResponse,
+        )
+        return DistanceMatrix.from_response(response, o1 - o0, d1 - d0)
+
+    if len(tiles) == 1:
+        return await fetch_tile(tiles[0])
+
+    def describe(index: int, tile: tuple[int, int, int, int], result: Any) -> str:
+        o0, o1, d0, d1 = tile
+        outcome = result.message if isinstance(result, WoosmapError) else "done"
+        return (
+            f"Matrix tile {index + 1}/{len(tiles)} "
+            f"(origins {o0 + 1}-{o1}, destinations {d0 + 1}-{d1}): {outcome}"
+        )
+
+    results = await run_batch(tiles, fetch_tile, ctx, describe)
+    if all(isinstance(result, WoosmapError) for result in results):
+        raise results[0]
+
+    matrix = DistanceMatrix(len(origins), len(destinations))
+    for (o0, o1, d0, d1), result in zip(tiles, results):
+        if isinstance(result, WoosmapError):
+            matrix.status = "PARTIAL"
+            matrix.fill(o0, o1, d0, d1, result.__class__.__name__)
+            continue
+        if result.status != "OK":
+            matrix.status = "PARTIAL"
+        matrix.merge(o0, d0, result)
+    return matrix
+
+
+def _format_route(data: RouteResponse, origin: str, destination: str) -> str:
+    """Build the markdown summary of a route response."""
+    # Summarize the first route
+    r = data.routes[0]
+    summary_lines = [
+        f"**Status:** {data.status}",
+        f"**Origin:** {origin}",
+        f"**Destination:** {destination}",
+    ]
+
+    if r.bounds is not None:
+        summary_lines.append(
+            f"**Bounds:** NE({dumps(r.bounds.northeast)}), "
+            f"SW({dumps(r.bounds.southwest)})"
+        )
+
+    if r.overview_polyline is not None:
+        summary_lines.append(f"**Polyline:** {r.overview_polyline.points}")
+
+    # legs: total distance/duration
+    if r.legs:
+        summary_lines.append(f"**Total distance:** {r.distance} m")
+        summary_lines.append(f"**Total duration:** {r.duration} sec")
+
+    if len(data.routes) > 1:
+        summary_lines.append("**Alternatives:**")
+        for i, alt in enumerate(data.routes[1:], 2):
+            summary_lines.append(f"- Route {i}: {alt.distance} m, {alt.duration} sec")
+
+    return (
+        "### Route Summary\n\n"
+        + "\n".join(summary_lines)
+        + "\n\n**Parsed fields:**\n"
+        + dumps(data, indent=True)
+    )
+
+
+def _format_matrix(matrix: DistanceMatrix) -> str:
+    """Build the markdown summary of a distance matrix."""
+    # Build readable matrix summary
+    lines = [f"**Status:** {matrix.status}", ""]
+
+    lines.append("### Nearest destination per origin")
+    for i, (j, duration) in enumerate(matrix.row_min("duration")):
+        if j is None:
+            lines.append(f"- Origin {i + 1}: no route")
+        else:
+            _, distance, _ = matrix.element(i, j)
+            lines.append(
+                f"- Origin {i + 1}: destination {j + 1} ({distance} m, {duration} sec)"
+            )
+    lines.append("")
+
+    names = matrix.status_names
+    for i in range(matrix.n_origins):
+        lines.append(f"### Origin {i + 1}")
+        row = zip(matrix.row(i, "distance"), matrix.row(i, "duration"), matrix.row(i, "status"))
+        for j, (distance, duration, code) in enumerate(row, 1):
+            lines.append(
+                f"- To destination {j}: "
+                f"{distance if distance >= 0 else None} m, "
+                f"{duration if duration >= 0 else None} sec (status: {names[code]})"
+            )
+        lines.append("")
+
+    return (
+        "### Distance Matrix\n\n" + "\n".join(lines) + "\n\n---\n\n"
+        "**Raw matrix** (one list per origin, -1 where there is no value):\n"
+        + dumps(matrix.to_dict())
+    )
+
+
+def _format_tolls(
+    data: TollsResponse, origin: str, destination: str, currency: Optional[str]
+) -> str:
+    """Build the markdown summary of a tolls response."""
+    # Use first route
+    route = data.routes[0]
+
+    lines = [
+        f"**Status:** {data.status}",
+        f"**Origin:** {origin}",
+        f"**Destination:** {destination}",
+        "",
+        "### Toll Summary",
+    ]
+
+    total_cost = 0.0
+    currency_code = currency or "N/A"
+
+    for t in route.tolls:
+        cost = t.price.value if t.price is not None else 0
+        total_cost += cost
+        toll_currency = t.price.currency if t.price is not None else None
+        lines.append(f"- {t.name or 'Toll'} — {cost} {toll_currency or currency_code}")
+
+    lines.append("")
+    lines.append(f"**Total toll cost:** {total_cost} {currency_code}")
+
+    return (
+        "### Route Tolls\n\n" + "\n".join(lines) + "\n\n---\n\n"
+        "**Parsed fields:**\n" + dumps(data, indent=True)
+    )
+
+
+@tool()
 async def get_route_distance(
     origin: str,
     destination: str,
@@ -83,64 +286,24 @@ async def get_route_distance(
         params["details"] = details
 
     try:
-        data = await make_woosmap_request("distance/route/json", params)
-
-        status = data.get("status", "UNKNOWN")
-        routes = data.get("routes", [])
+        data = await make_woosmap_request(
+            "distance/route/json", params, model=RouteResponse
+        )
 
-        if not routes:
+        if not data.routes:
             return {
                 "content": [
                     {
                         "type": "text",
-                        "text": f"No route found for {origin} → {destination}. Status: {status}",
+                        "text": f"No route found for {origin} → {destination}. Status: {data.status}",
                     }
                 ]
             }
 
-        # Summarize the first route
-        r = routes[0]
-        summary_lines = [
-            f"**Status:** {status}",
-            f"**Origin:** {origin}",
-            f"**Destination:** {destination}",
-        ]
-
-        if "bounds" in r:
-            bounds = r["bounds"]
-            summary_lines.append(
-                f"**Bounds:** NE({bounds.get('northeast')}), "
-                f"SW({bounds.get('southwest')})"
-            )
-
-        if "overview_polyline" in r:
-            summary_lines.append(
-                f"**Polyline:** {r['overview_polyline'].get('points')}"
-            )
-
-        # legs: total distance/duration
-        legs = r.get("legs", [])
-        if legs:
-            total_distance = sum(
-                leg.get("distance", {}).get("value", 0) for leg in legs
-            )
-            total_duration = sum(
-                leg.get("duration", {}).get("value", 0) for leg in legs
-            )
-            summary_lines.append(f"**Total distance:** {total_distance} m")
-            summary_lines.append(f"**Total duration:** {total_duration} sec")
-
-        return {
-            "content": [
-                {
-                    "type": "text",
-                    "text": "### Route Summary\n\n"
-                    + "\n".join(summary_lines)
-                    + "\n\n**Full JSON:**\n"
-                    + json.dumps(data, indent=2),
-                }
-            ]
-        }
+        text = await render(
+            _format_route, data, origin, destination, weight=_route_weight(data.routes)
+        )
+        return {"content": [{"type": "text", "text": text}]}
 
     except WoosmapError as e:
         logger.error(f"Route distance request failed: {e.message}")
@@ -150,7 +313,7 @@ async def get_route_distance(
         })
 
 
-@mcp.tool()
+@tool()
 async def get_distance_matrix(
     origins: List[str],
     destinations: List[str],
@@ -159,10 +322,14 @@ async def get_distance_matrix(
     units: Optional[str] = None,
     departure_time: Optional[str] = None,
     avoid: Optional[str] = None,
+    ctx: Optional[Context] = None,
 ) -> Dict[str, Any]:
     """
     Compute a distance and duration matrix using Woosmap Distance Matrix API.
 
+    Matrices larger than the per-request limit are split into tiles fetched
+    concurrently, with progress reported as each tile completes.
+
     Args:
         origins: List of "lat,lng" origin points.
         destinations: List of "lat,lng" destination points.
@@ -173,10 +340,7 @@ async def get_distance_matrix(
         avoid: Routing constraints (e.g. "tolls", "highways").
     """
 
-    params: Dict[str, Any] = {
-        "origins": "|".join(origins),
-        "destinations": "|".join(destinations),
-    }
+    params: Dict[str, Any] = {}
 
     if mode:
         params["mode"] = mode
@@ -190,52 +354,20 @@ async def get_distance_matrix(
         params["avoid"] = avoid
 
     try:
-        data = await make_woosmap_request(
-            "distance/distancematrix/json",
-            params,
-        )
-
-        status = data.get("status", "UNKNOWN")
-        rows = data.get("rows", [])
+        matrix = await fetch_distance_matrix(origins, destinations, params, ctx)
 
-        if not rows:
+        if not matrix.ok_count():
             return {
                 "content": [
                     {
                         "type": "text",
-                        "text": f"No distance matrix results. Status: {status}",
+                        "text": f"No distance matrix results. Status: {matrix.status}",
                     }
                 ]
             }
 
-        # Build readable matrix summary
-        lines = [f"**Status:** {status}", ""]
-
-        for i, row in enumerate(rows):
-            elements = row.get("elements", [])
-            lines.append(f"### Origin {i + 1}")
-            for j, el in enumerate(elements):
-                distance = el.get("distance", {}).get("value")
-                duration = el.get("duration", {}).get("value")
-                el_status = el.get("status", "UNKNOWN")
-
-                lines.append(
-                    f"- To destination {j + 1}: "
-                    f"{distance} m, {duration} sec (status: {el_status})"
-                )
-            lines.append("")
-
-        return {
-            "content": [
-                {
-                    "type": "text",
-                    "text": (
-                        "### Distance Matrix\n\n" + "\n".join(lines) + "\n\n---\n\n"
-                        "**Raw response:**\n" + json.dumps(data, indent=2)
-                    ),
-                }
-            ]
-        }
+        text = await render(_format_matrix, matrix, weight=len(matrix))
+        return {"content": [{"type": "text", "text": text}]}
 
     except WoosmapError as e:
         logger.error(f"Distance matrix request failed: {e.message}")
@@ -245,7 +377,7 @@ async def get_distance_matrix(
         })
 
 
-@mcp.tool()
+@tool()
 async def get_route_tolls(
     origin: str,
     destination: str,
@@ -301,60 +433,159 @@ async def get_route_tolls(
         data = await make_woosmap_request(
             "distance/tolls/json",
             params,
+            model=TollsResponse,
         )
 
-        status = data.get("status", "UNKNOWN")
-        routes = data.get("routes", [])
-
-        if not routes:
+        if not data.routes:
             return {
                 "content": [
                     {
                         "type": "text",
-                        "text": f"No toll route found. Status: {status}",
+                        "text": f"No toll route found. Status: {data.status}",
                     }
                 ]
             }
 
-        # Use first route
-        route = routes[0]
-        tolls = route.get("tolls", [])
+        text = await render(
+            _format_tolls, data, origin, destination, currency,
+            weight=_route_weight(data.routes),
+        )
+        return {"content": [{"type": "text", "text": text}]}
 
-        lines = [
-            f"**Status:** {status}",
-            f"**Origin:** {origin}",
-            f"**Destination:** {destination}",
-            "",
-            "### Toll Summary",
-        ]
+    except WoosmapError as e:
+        logger.error(f"Tolls request failed: {e.message}")
+        return _error_response(e, {
+            "origin": origin,
+            "destination": destination,
+        })
 
-        total_cost = 0.0
-        currency_code = currency or "N/A"
 
-        for t in tolls:
-            cost = t.get("price", {}).get("value", 0)
-            total_cost += cost
-            lines.append(
-                f"- {t.get('name', 'Toll')} — {cost} {t.get('price', {}).get('currency', currency_code)}"
-            )
+# -------------------------------------------------
+# Route comparison
+# -------------------------------------------------
+def _toll_cost(route: TollRoute) -> tuple[float, Optional[str]]:
+    """(total cost, currency) of the tolls on a route."""
+    tolls = route.tolls
+    currency = next((t.price.currency for t in tolls if t.price and t.price.currency), None)
+    return sum(t.price.value for t in tolls if t.price is not None), currency
+
+
+def _hours_minutes(seconds: float) -> str:
+    minutes = round(seconds / 60)
+    return f"{minutes // 60} h {minutes % 60:02d} min" if minutes >= 60 else f"{minutes} min"
+
+
+def _format_comparison(
+    routes: list[TollRoute],
+    origin: str,
+    destination: str,
+    currency: Optional[str],
+) -> str:
+    """Build the comparison table of route alternatives and their tolls."""
+    lines = [
+        f"**Origin:** {origin}",
+        f"**Destination:** {destination}",
+        "",
+        "| Route | Duration | Distance | Tolls |",
+        "|---|---|---|---|",
+    ]
+    costs = []
+    for i, route in enumerate(routes, 1):
+        cost, toll_currency = _toll_cost(route)
+        costs.append(cost)
+        toll_text = f"{cost:.2f} {toll_currency or currency or ''}".rstrip()
+        lines.append(
+            f"| {i} | {_hours_minutes(route.duration)} ({route.duration} sec) "
+            f"| {route.distance / 1000:.1f} km | {toll_text} |"
+        )
 
+    def best(values: list[Optional[float]]) -> Optional[int]:
+        known = [(v, i) for i, v in enumerate(values) if v is not None]
+        return min(known)[1] + 1 if known else None
+
+    lines.append("")
+    lines.append(f"**Fastest:** route {best([r.duration for r in routes])}")
+    lines.append(f"**Shortest:** route {best([r.distance for r in routes])}")
+    cheapest = best(costs)
+    if cheapest is not None:
+        lines.append(f"**Cheapest tolls:** route {cheapest}")
+    notices = [f"- Route {i}: {r.notice}" for i, r in enumerate(routes, 1) if r.notice]
+    if notices:
         lines.append("")
-        lines.append(f"**Total toll cost:** {total_cost} {currency_code}")
-
-        return {
-            "content": [
-                {
-                    "type": "text",
-                    "text": (
-                        "### Route Tolls\n\n" + "\n".join(lines) + "\n\n---\n\n"
-                        "**Raw response:**\n" + json.dumps(data, indent=2)
-                    ),
-                }
-            ]
-        }
+        lines.append("**Notices:**")
+        lines.extend(notices)
+    return "### Route Comparison\n\n" + "\n".join(lines)
+
+
+@tool()
+async def compare_routes(
+    origin: str,
+    destination: str,
+    waypoints: Optional[List[str]] = None,
+    mode: Optional[str] = None,
+    avoid: Optional[str] = None,
+    departure_time: Optional[str] = None,
+    currency: Optional[str] = None,
+    vehicle_type: Optional[str] = None,
+    language: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Compare alternative routes by travel time, distance and toll cost in one call,
+    using the Woosmap Distance Tolls API.
+
+    Every alternative comes with its own duration, distance and tolls from a
+    single request. Use this instead of calling get_route_distance and
+    get_route_tolls for each candidate.
+
+    Args:
+        origin: "lat,lng" of the start point.
+        destination: "lat,lng" of the end point.
+        waypoints: Optional list of "lat,lng" points.
+        mode: Travel mode ("driving","walking","cycling").
+        avoid: Routing avoids ("tolls","highways", etc.).
+        departure_time: Timestamp or "now" for traffic.
+        currency: ISO currency code for toll costs (e.g. "EUR", "USD").
+        vehicle_type: Vehicle type for tolls (e.g. "car", "truck").
+        language: Output language (ISO code).
+    """
+    params: Dict[str, Any] = {
+        "origin": origin,
+        "destination": destination,
+        "alternatives": "true",
+    }
+    if waypoints:
+        params["waypoints"] = "|".join(waypoints)
+    if mode:
+        params["mode"] = mode
+    if avoid:
+        params["avoid"] = avoid
+    if departure_time:
+        params["departure_time"] = departure_time
+    if currency:
+        params["currency"] = currency
+    if vehicle_type:
+        params["vehicle_type"] = vehicle_type
+    if language:
+        params["language"] = language
+
+    try:
+        data = await make_woosmap_request("distance/tolls/json", params, model=TollsResponse)
+
+        if not data.routes:
+            return {
+                "content": [
+                    {
+                        "type": "text",
+                        "text": f"No route found for {origin} → {destination}. Status: {data.status}",
+                    }
+                ]
+            }
+
+        text = await render(_format_comparison, data.routes, origin, destination, currency)
+        return {"content": [{"type": "text", "text": text}]}
 
     except WoosmapError as e:
-        logger.error(f"Tolls request failed: {e.message}")
+        logger.error(f"Route comparison failed: {e.message}")
         return _error_response(e, {
             "origin": origin,
             "destination": destination,
@@ -66,3 +66,15 @@ class WoosmapServerError(WoosmapError):
     """Server-side error (5xx responses)."""
 
     pass
+
+
+class WoosmapResponseTooLargeError(WoosmapAPIError):
+    """Response body exceeds the configured maximum size."""
+
+    pass
+
+
+class WoosmapQuotaExceededError(WoosmapError):
+    """Local usage budget spent (session, tenant or tool); not retried."""
+
+    pass
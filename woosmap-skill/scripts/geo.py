@@ -0,0 +1,43 @@
+"""
+Small geometry helpers: great-circle distances and a metric grid.
+"""
+import math
+
+LatLngTuple = tuple[float, float]
+
+EARTH_RADIUS_M = 6371008.8
+METERS_PER_DEGREE = 2 * math.pi * EARTH_RADIUS_M / 360
+
+
+def haversine_m(a: LatLngTuple, b: LatLngTuple) -> float:
+    """Great-circle distance between two (lat, lng) points in meters."""
+    lat1, lng1, lat2, lng2 = map(math.radians, (*a, *b))
+    h = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(h))
+
+
+def parse_latlng(value: str) -> LatLngTuple:
+    """Parse a ``"lat,lng"`` string."""
+    lat, lng = value.split(",")[:2]
+    return float(lat), float(lng)
+
+
+def grid_cell(point: LatLngTuple, size_m: float) -> tuple[int, int]:
+    """
+    Cell of a grid of roughly ``size_m`` square cells containing ``point``.
+
+    Rows are ``size_m`` of latitude high; each row is divided into columns of
+    ``size_m`` measured at the row's middle latitude, so cells stay close to
+    square away from the equator.
+    """
+    lat_step = size_m / METERS_PER_DEGREE
+    row = math.floor(point[0] / lat_step)
+    return row, math.floor(point[1] / _lng_step(row, size_m))
+
+
+def _lng_step(row: int, size_m: float) -> float:
+    lat = (row + 0.5) * size_m / METERS_PER_DEGREE
+    return min(360.0, size_m / (METERS_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6)))
@@ -0,0 +1,409 @@
+"""
+Offline bulk jobs: geocode a file of addresses or compute a large distance
+matrix, through the same request stack as the MCP tools (response cache,
+retries, rate limiter, request coalescing).
+
+    python jobs.py geocode addresses.csv geocoded.csv --column address --language en
+    python jobs.py matrix origins.csv destinations.csv matrix.parquet --mode driving
+
+The input is streamed and results are written incrementally, in input order,
+to CSV or (with pyarrow installed, for a ``.parquet`` output) a directory of
+Parquet part files. Progress is checkpointed in ``<output>.job/``: rerunning
+the same command after a crash resumes after the last written chunk. Unless
+``WOOSMAP_STATE_DIR`` is set, that directory also holds the disk tier of the
+response cache, so requests answered before the crash are not paid for again.
+"""
+import argparse
+import asyncio
+import collections
+import csv
+import hashlib
+import importlib.util
+import io
+import json
+import logging
+import os
+import sys
+import time
+from itertools import islice
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Iterable, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_VERSION = 1
+
+
+# -------------------------------------------------
+# Checkpoints and output sinks
+# -------------------------------------------------
+class Checkpoint:
+    """Job progress saved atomically as JSON."""
+
+    def __init__(self, path: Path, fingerprint: str):
+        self.path = path
+        self.fingerprint = fingerprint
+
+    def load(self) -> Optional[dict[str, Any]]:
+        try:
+            state = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            return None
+        if state.get("fingerprint") != self.fingerprint:
+            raise SystemExit(
+                f"{self.path} belongs to a different job (inputs or options changed); "
+                "rerun with --restart to start over"
+            )
+        return state
+
+    def save(self, state: dict[str, Any]) -> None:
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({**state, "fingerprint": self.fingerprint}))
+        os.replace(tmp, self.path)
+
+
+class CsvSink:
+    """CSV output; a checkpoint records the byte offset of the last commit."""
+
+    commit_rows = 0
+
+    def __init__(self, path: Path, fieldnames: list[str], state: Optional[dict[str, Any]]):
+        self.fieldnames = fieldnames
+        if state is None:
+            self.file = open(path, "wb")
+            self._write([fieldnames])
+        else:
+            if not path.exists():
+                raise SystemExit(f"{path} is missing; rerun with --restart to start over")
+            # Drop rows written after the last checkpoint.
+            self.file = open(path, "r+b")
+            self.file.truncate(state["offset"])
+            self.file.seek(state["offset"])
+        self.pending = 0
+
+    def _write(self, rows: Iterable[list[Any]]) -> None:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        self.file.write(buffer.getvalue().encode())
+
+    def write(self, rows: list[dict[str, Any]]) -> None:
+        self._write([row.get(f) for f in self.fieldnames] for row in rows)
+        self.pending += len(rows)
+
+    def commit(self) -> dict[str, Any]:
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.pending = 0
+        return {"offset": self.file.tell()}
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class ParquetSink:
+    """Parquet output as numbered part files, one per commit."""
+
+    commit_rows = 50_000
+
+    def __init__(self, path: Path, fieldnames: list[str], state: Optional[dict[str, Any]]):
+        if importlib.util.find_spec("pyarrow") is None:
+            raise SystemExit("Parquet output needs pyarrow: pip install pyarrow")
+        self.path = path
+        self.fieldnames = fieldnames
+        self.parts = state["parts"] if state is not None else 0
+        path.mkdir(parents=True, exist_ok=True)
+        for part in path.glob("part-*.parquet"):
+            if state is None or int(part.stem.split("-")[1]) >= self.parts:
+                part.unlink()
+        self.rows: list[dict[str, Any]] = []
+
+    @property
+    def pending(self) -> int:
+        return len(self.rows)
+
+    def write(self, rows: list[dict[str, Any]]) -> None:
+        self.rows.extend(rows)
+
+    def commit(self) -> dict[str, Any]:
+        if self.rows:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pylist(self.rows).select(self.fieldnames)
+            tmp = self.path / f".part-{self.parts:05d}.tmp"
+            pq.write_table(table, tmp)
+            os.replace(tmp, self.path / f"part-{self.parts:05d}.parquet")
+            self.parts += 1
+            self.rows = []
+        return {"parts": self.parts}
+
+    def close(self) -> None:
+        pass
+
+
+def open_sink(path: Path, fieldnames: list[str], state: Optional[dict[str, Any]]):
+    sink = ParquetSink if path.suffix.lower() == ".parquet" else CsvSink
+    return sink(path, fieldnames, state)
+
+
+def _fingerprint(args: argparse.Namespace, inputs: list[Path]) -> str:
+    """Identify a job by its inputs (path, size, mtime) and options."""
+    options = {k: v for k, v in sorted(vars(args).items()) if k not in ("restart", "log_level")}
+    parts = [str(CHECKPOINT_VERSION), json.dumps(options, default=str)]
+    for path in inputs:
+        stat = path.stat()
+        parts.append(f"{path.resolve()}|{stat.st_size}|{stat.st_mtime_ns}")
+    return hashlib.sha1("\n".join(parts).encode()).hexdigest()
+
+
+# -------------------------------------------------
+# Runner
+# -------------------------------------------------
+async def run_units(
+    units: Iterator[Any],
+    process: Callable[[Any], Awaitable[list[dict[str, Any]]]],
+    sink,
+    checkpoint: Checkpoint,
+    state: dict[str, Any],
+    window: int,
+) -> dict[str, Any]:
+    """
+    Process ``units`` concurrently (up to ``window`` at a time) and write their
+    rows in order, checkpointing after each sink commit.
+    """
+    started = time.monotonic()
+    rows_at_start = state["rows"]
+    inflight: collections.deque[asyncio.Task] = collections.deque()
+
+    def save() -> None:
+        checkpoint.save({**state, "sink": sink.commit()})
+        rate = (state["rows"] - rows_at_start) / max(time.monotonic() - started, 1e-9)
+        print(
+            f"{state['units']} chunks, {state['rows']} rows written "
+            f"({state['failed']} failed), {rate:.0f} rows/s",
+            file=sys.stderr,
+        )
+
+    try:
+        for unit in units:
+            inflight.append(asyncio.ensure_future(process(unit)))
+            if len(inflight) < window:
+                continue
+            await _write_next(inflight, sink, state, save)
+        while inflight:
+            await _write_next(inflight, sink, state, save)
+        if sink.pending or not state["units"]:
+            save()
+    finally:
+        for task in inflight:
+            task.cancel()
+        sink.close()
+    return state
+
+
+async def _write_next(inflight, sink, state, save) -> None:
+    rows = await inflight.popleft()
+    sink.write(rows)
+    state["units"] += 1
+    state["rows"] += len(rows)
+    state["failed"] += sum(1 for r in rows if r.get("status") not in ("OK", "ZERO_RESULTS"))
+    if sink.pending >= sink.commit_rows:
+        save()
+
+
+def _chunks(rows: Iterator[Any], size: int) -> Iterator[list[Any]]:
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+
+# -------------------------------------------------
+# Jobs
+# -------------------------------------------------
+async def geocode_job(args, checkpoint: Checkpoint, state: Optional[dict[str, Any]]) -> dict[str, Any]:
+    from core import make_woosmap_request
+    from exceptions import WoosmapAuthError, WoosmapError
+    from models import GeocodeResponse
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def geocode(row: dict[str, str]) -> dict[str, Any]:
+        address = (row.get(args.column) or "").strip()
+        out: dict[str, Any] = {**row, "lat": None, "lng": None,
+                               "formatted_address": None, "public_id": None}
+        if not address:
+            return {**out, "status": "EMPTY"}
+        params: dict[str, Any] = {"address": address}
+        if args.language:
+            params["language"] = args.language
+        if args.components:
+            params["components"] = args.components
+        try:
+            async with semaphore:
+                data = await make_woosmap_request(
+                    "localities/geocode", params, fields={"results": 1}, model=GeocodeResponse
+                )
+        except WoosmapAuthError:
+            raise
+        except WoosmapError as e:
+            return {**out, "status": e.__class__.__name__}
+        top = data.results[0] if data.results else None
+        if top is None or top.location is None:
+            return {**out, "status": "ZERO_RESULTS"}
+        return {
+            **out,
+            "lat": top.location.lat,
+            "lng": top.location.lng,
+            "formatted_address": top.formatted_address,
+            "public_id": top.public_id,
+            "status": "OK",
+        }
+
+    async def process(chunk: list[dict[str, str]]) -> list[dict[str, Any]]:
+        return list(await asyncio.gather(*(geocode(row) for row in chunk)))
+
+    with open(args.input, newline="", encoding="utf-8-sig") as f:
+        reader = csv.DictReader(f)
+        columns = list(reader.fieldnames or [])
+        if args.column not in columns:
+            raise SystemExit(f"Column {args.column!r} not found in {args.input} ({columns})")
+        extra = ["lat", "lng", "formatted_address", "public_id", "status"]
+        fieldnames = columns + [c for c in extra if c not in columns]
+        sink = open_sink(args.output, fieldnames, state and state["sink"])
+        progress = state or {"units": 0, "rows": 0, "failed": 0}
+        rows = islice(reader, progress["rows"], None)
+        return await run_units(
+            _chunks(rows, args.chunk_size), process, sink, checkpoint, progress,
+            window=max(2, args.concurrency // args.chunk_size + 2),
+        )
+
+
+async def matrix_job(args, checkpoint: Checkpoint, state: Optional[dict[str, Any]]) -> dict[str, Any]:
+    from core import make_woosmap_request
+    from datasets import read_points
+    from distance import matrix_tiles
+    from exceptions import WoosmapAuthError, WoosmapError
+    from matrix import DistanceMatrix
+    from models import MatrixResponse
+
+    origins = list(read_points("origins", args.origins))
+    destinations = list(read_points("destinations", args.destinations))
+    params: dict[str, Any] = {"mode": args.mode}
+    if args.units:
+        params["units"] = args.units
+    if args.avoid:
+        params["avoid"] = args.avoid
+    if args.departure_time:
+        params["departure_time"] = args.departure_time
+
+    def points(rows, start, end) -> str:
+        return "|".join(f"{lat},{lng}" for _, _, lat, lng in rows[start:end])
+
+    async def process(tile: tuple[int, int, int, int]) -> list[dict[str, Any]]:
+        o0, o1, d0, d1 = tile
+        try:
+            response = await make_woosmap_request(
+                "distance/distancematrix/json",
+                {**params, "origins": points(origins, o0, o1),
+                 "destinations": points(destinations, d0, d1)},
+                model=MatrixResponse,
+            )
+            matrix = DistanceMatrix.from_response(response, o1 - o0, d1 - d0)
+        except WoosmapAuthError:
+            raise
+        except WoosmapError as e:
+            matrix = DistanceMatrix(o1 - o0, d1 - d0, element_status=e.__class__.__name__)
+        rows = []
+        for i in range(o1 - o0):
+            for j in range(d1 - d0):
+                status, distance, duration = matrix.element(i, j)
+                rows.append({
+                    "origin_id": origins[o0 + i][0],
+                    "destination_id": destinations[d0 + j][0],
+                    "status": status,
+                    "distance_m": distance,
+                    "duration_s": duration,
+                })
+        return rows
+
+    fieldnames = ["origin_id", "destination_id", "status", "distance_m", "duration_s"]
+    sink = open_sink(args.output, fieldnames, state and state["sink"])
+    progress = state or {"units": 0, "rows": 0, "failed": 0}
+    tiles = matrix_tiles(len(origins), len(destinations))
+    return await run_units(
+        iter(tiles[progress["units"]:]), process, sink, checkpoint, progress,
+        window=args.concurrency,
+    )
+
+
+# -------------------------------------------------
+# CLI
+# -------------------------------------------------
+def _parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Run bulk Woosmap jobs from files")
+    sub = parser.add_subparsers(dest="job", required=True)
+
+    geocode = sub.add_parser("geocode", help="Geocode the addresses of a CSV file")
+    geocode.add_argument("input", type=Path)
+    geocode.add_argument("output", type=Path, help=".csv, or .parquet (needs pyarrow)")
+    geocode.add_argument("--column", default="address", help="Column holding the address")
+    geocode.add_argument("--language")
+    geocode.add_argument("--components", help='Component filters, e.g. "country:FR"')
+    geocode.add_argument("--chunk-size", type=int, default=200, help="Rows per checkpoint step")
+
+    matrix = sub.add_parser("matrix", help="Distance matrix between two point files")
+    matrix.add_argument("origins", type=Path, help="CSV/GeoJSON with lat/lng (and id)")
+    matrix.add_argument("destinations", type=Path, help="CSV/GeoJSON with lat/lng (and id)")
+    matrix.add_argument("output", type=Path, help=".csv, or .parquet (needs pyarrow)")
+    matrix.add_argument("--mode", default="driving")
+    matrix.add_argument("--units")
+    matrix.add_argument("--avoid")
+    matrix.add_argument("--departure-time")
+
+    for p in (geocode, matrix):
+        p.add_argument("--concurrency", type=int, default=32,
+                       help="Upstream requests in flight (the rate limiter still applies)")
+        p.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint")
+        p.add_argument("--log-level", default="WARNING",
+                       help="Per-request logs cost more CPU than the job itself at DEBUG")
+    return parser
+
+
+async def _run(args, checkpoint: Checkpoint, state: Optional[dict[str, Any]]) -> dict[str, Any]:
+    from core import close_http_client
+
+    logging.getLogger().setLevel(args.log_level.upper())
+    job = geocode_job if args.job == "geocode" else matrix_job
+    try:
+        return await job(args, checkpoint, state)
+    finally:
+        await close_http_client()
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    args = _parser().parse_args(argv)
+    inputs = [args.input] if args.job == "geocode" else [args.origins, args.destinations]
+
+    job_dir = args.output.with_name(args.output.name + ".job")
+    job_dir.mkdir(parents=True, exist_ok=True)
+    # core reads its configuration at import: point the disk cache tier at the
+    # job directory first, so a resumed run finds the responses already paid for.
+    os.environ.setdefault("WOOSMAP_STATE_DIR", str(job_dir))
+
+    checkpoint = Checkpoint(job_dir / "checkpoint.json", _fingerprint(args, inputs))
+    state = None if args.restart else checkpoint.load()
+    if state is not None:
+        if state.get("done"):
+            print(f"{args.output} is already complete ({state['rows']} rows)", file=sys.stderr)
+            return
+        print(f"Resuming after {state['rows']} rows", file=sys.stderr)
+
+    state = asyncio.run(_run(args, checkpoint, state))
+    checkpoint.save({**state, "done": True})
+    print(
+        f"Done: {state['rows']} rows written to {args.output} ({state['failed']} failed)",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,41 @@
+import asyncio
+import heapq
 import json
 import logging
-from typing import Any, Dict, List, Optional
+import math
+import os
+from typing import Any, Callable, Dict, List, Optional
 
-from core import mcp, make_woosmap_request
-from exceptions import WoosmapError
+from mcp.server.fastmcp import Context
+
+from batching import BATCH_CONCURRENCY, run_batch
+from core import make_woosmap_request, tool
+from exceptions import WoosmapBadRequestError, WoosmapError
+from geo import LatLngTuple, grid_cell, haversine_m, parse_latlng
+from models import GeocodeResponse, LatLng, Locality
 
 logger = logging.getLogger(__name__)
 
+# Nearby search: results per upstream page (the API maximum), most results
+# per call, and most upstream requests one call may send.
+NEARBY_PAGE_SIZE = 30
+NEARBY_MAX_RESULTS = int(os.getenv("WOOSMAP_NEARBY_MAX_RESULTS", "150"))
+NEARBY_MAX_REQUESTS = int(os.getenv("WOOSMAP_NEARBY_MAX_REQUESTS", "20"))
+
+# Most distinct public_ids one get_places_details_bulk call may look up.
+DETAILS_BULK_MAX = int(os.getenv("WOOSMAP_DETAILS_BULK_MAX", "50"))
+
+# Most addresses one geocode_localities_batch call may geocode.
+GEOCODE_BATCH_MAX = int(os.getenv("WOOSMAP_GEOCODE_BATCH_MAX", "100"))
+
+# reverse_geocode_trace: most points per trace, default grid cell size, most
+# cells looked up per trace (the grid is coarsened to stay under it), and the
+# coarsest cell size allowed.
+TRACE_MAX_POINTS = int(os.getenv("WOOSMAP_TRACE_MAX_POINTS", "10000"))
+TRACE_CELL_M = float(os.getenv("WOOSMAP_TRACE_CELL_M", "50"))
+TRACE_MAX_CELLS = int(os.getenv("WOOSMAP_TRACE_MAX_CELLS", "200"))
+TRACE_MAX_CELL_M = float(os.getenv("WOOSMAP_TRACE_MAX_CELL_M", "800"))
+
 
 def _error_response(error: WoosmapError, context: dict[str, Any]) -> dict[str, Any]:
     """Format a WoosmapError into a proper MCP response."""
@@ -21,85 +50,155 @@ def _error_response(error: WoosmapError, context: dict[str, Any]) -> dict[str, A
     }
 
 
-@mcp.tool()
+async def _nearby_query(
+    params: Dict[str, Any], limit: int, semaphore: asyncio.Semaphore
+) -> tuple[list[dict[str, Any]], int]:
+    """
+    Up to ``limit`` results of one nearby query, following its pagination.
+
+    The first page tells whether there are more; the remaining pages are
+    then fetched concurrently.
+
+    Returns:
+        (results, pages fetched)
+    """
+    page_size = min(limit, NEARBY_PAGE_SIZE)
+
+    async def page(number: int) -> dict[str, Any]:
+        async with semaphore:
+            return await make_woosmap_request(
+                "localities/nearby",
+                {**params, "limit": page_size, "page": number},
+                fields={"results": page_size, "pagination": None},
+            )
+
+    first = await page(1)
+    results = list(first.get("results", []))
+    pages = 1
+    wanted = math.ceil(limit / page_size)
+    if wanted > 1 and (first.get("pagination") or {}).get("next_page"):
+        for data in await asyncio.gather(*(page(n) for n in range(2, wanted + 1))):
+            pages += 1
+            results.extend(data.get("results", []))
+            if not (data.get("pagination") or {}).get("next_page"):
+                break
+    return results, pages
+
+
+def _distance(place: dict[str, Any], origin: LatLngTuple) -> float:
+    """Distance reported by the API, else the straight-line distance."""
+    distance = place.get("distance")
+    if distance is not None:
+        return distance
+    location = (place.get("geometry") or {}).get("location") or {}
+    if location.get("lat") is None or location.get("lng") is None:
+        return math.inf
+    return haversine_m(origin, (location["lat"], location["lng"]))
+
+
+@tool()
 async def get_places_nearby(
-    latitude: float, longitude: float, radius: int, place_type: list[str]
+    latitude: float,
+    longitude: float,
+    radius: int,
+    place_type: list[str],
+    limit: int = 8,
+    split_types: bool = False,
 ) -> dict[str, Any] | None:
     """Get nearby places of a specific type using Woosmap localities/nearby API.
 
+    Results are ranked by distance. More than one page of results is fetched
+    concurrently when ``limit`` asks for it.
+
     Args:
         latitude: Latitude of the location.
         longitude: Longitude of the location.
         radius: Search radius in meters. default is 1000 meters.
         place_type: list of type of place to search for (e.g., point_of_interest, transit.station, transit.station.airport, transit.station.rail, beach, business, business.car_repair, business.car_rental, business.cinema, business.conference_centre, business.exhibition_centre, business.theatre, business.nightclub, business.finance, business.finance.bank, business.fuel, business.parking, business.mall, business.food_and_drinks, business.food_and_drinks.bar, business.food_and_drinks.biergarten, business.food_and_drinks.cafe, business.food_and_drinks.fast_food, business.food_and_drinks.pub, business.food_and_drinks.restaurant, business.food_and_drinks.food_court, business.shop, business.shop.mall, business.shop.bakery, business.shop.butcher, business.shop.library, business.shop.grocery, business.shop.sports, business.shop.toys, business.shop.clothes, business.shop.furniture, business.shop.electronics, business.shop.doityourself, business.shop.craft, education, education.school, education.kindergarten, education.university, education.college, education.library, hospitality, hospitality.hotel, hospitality.hostel, hospitality.guest_house, hospitality.bed_and_breakfast, hospitality.motel, medical, medical.hospital, medical.pharmacy, medical.clinic, tourism, tourism.attraction, tourism.attraction.amusement_park, tourism.attraction.zoo, tourism.attraction.aquarium, tourism.monument, tourism.monument.castle, tourism.museum, government, park, park.national, place_of_worship, police, post_office, sports, sports.golf, sports.winter). default is point_of_interest.
+        limit: Number of places to return (default 8, at most 150).
+        split_types: Query each place type separately and merge the results, so
+            that no type crowds out the others (default false: one query for all types).
     """
-    params = {
-        "location": f"{latitude},{longitude}",
-        "radius": str(radius),
-        "types": "|".join(place_type),
-    }
+    origin = (latitude, longitude)
+    types = list(dict.fromkeys(place_type)) or ["point_of_interest"]
+    queries = [[t] for t in types] if split_types and len(types) > 1 else [types]
+    context = {"location": f"{latitude},{longitude}", "radius": radius, "types": place_type}
     try:
-        data = await make_woosmap_request(
-            "localities/nearby", params
-        )  # fetching Woosmap Nearby Search API
-        places = data.get("results", [])[:8]
-
-        # # Build marker list
-        # markers = []
-        # for p in places:
-        #     loc = p["geometry"]["location"]
-        #     markers.append(
-        #         {
-        #             "lat": loc["lat"],
-        #             "lng": loc["lng"],
-        #             "url": "https://webapp.woosmap.com/img/geolocated_marker.png?retina=true",
-        #         }
-        #     )
-
-        # params_img: QueryParams = [
-        #     ("lat", f"{latitude}"),
-        #     ("lng", f"{longitude}"),
-        #     ("zoom", 14),
-        #     ("width", 300),
-        #     ("height", 300),
-        #     ("retina", "yes"),
-        # ]
-        # for m in markers:
-        #     params_img.append(("markers", json.dumps(m, separators=(",", ":"))))
-
-        # places_image = await image_url_to_base64(
-        #     f"{WOOSMAP_API_BASE}/maps/static", params_img
-        # )
-
-        # Build places list
-        lines = []
-        for i, p in enumerate(places, 1):
-            lines.append(
-                f"{i}. **{p.get('name', 'Unknown')}**\n"
-                f"   {json.dumps(p, separators=(',', ':'))}\n"
-                f"   Distance: {p.get('distance', 'N/A')} m"
+        if not 1 <= limit <= NEARBY_MAX_RESULTS:
+            raise WoosmapBadRequestError(f"limit must be between 1 and {NEARBY_MAX_RESULTS}")
+        requests = len(queries) * math.ceil(limit / min(limit, NEARBY_PAGE_SIZE))
+        if requests > NEARBY_MAX_REQUESTS:
+            raise WoosmapBadRequestError(
+                f"{len(queries)} type queries of {limit} results need up to {requests} requests, "
+                f"more than {NEARBY_MAX_REQUESTS}; lower limit or split fewer types"
             )
-
-        return {
-            "content": [
-                {
-                    "type": "text",
-                    "text": "### Nearby \n\n" + "\n\n".join(lines),
-                },
-            ]
-        }
-
-        # return places
     except WoosmapError as e:
-        logger.error(f"Woosmap nearby search failed: {e.message}")
-        return _error_response(e, {
-            "location": f"{latitude},{longitude}",
-            "radius": radius,
-            "types": place_type,
-        })
+        return _error_response(e, context)
+
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+    outcomes = await asyncio.gather(
+        *(
+            _nearby_query(
+                {"location": f"{latitude},{longitude}", "radius": str(radius), "types": "|".join(q)},
+                limit,
+                semaphore,
+            )
+            for q in queries
+        ),
+        return_exceptions=True,
+    )
+    for outcome in outcomes:
+        if isinstance(outcome, BaseException) and not isinstance(outcome, WoosmapError):
+            raise outcome
+    failed = [(q, o) for q, o in zip(queries, outcomes) if isinstance(o, WoosmapError)]
+    if len(failed) == len(queries):
+        error = failed[0][1]
+        logger.error(f"Woosmap nearby search failed: {error.message}")
+        return _error_response(error, context)
+
+    # Merge: one entry per place (closest distance wins), then the top ``limit``.
+    unique: dict[str, tuple[float, dict[str, Any]]] = {}
+    pages = 0
+    for outcome in outcomes:
+        if isinstance(outcome, WoosmapError):
+            continue
+        results, fetched = outcome
+        pages += fetched
+        for place in results:
+            key = place.get("public_id") or json.dumps(place, sort_keys=True)
+            distance = _distance(place, origin)
+            if key not in unique or distance < unique[key][0]:
+                unique[key] = (distance, place)
+    places = [p for _, p in heapq.nsmallest(limit, unique.values(), key=lambda item: item[0])]
+
+    lines = []
+    for i, p in enumerate(places, 1):
+        lines.append(
+            f"{i}. **{p.get('name', 'Unknown')}**\n"
+            f"   {json.dumps(p, separators=(',', ':'))}\n"
+            f"   Distance: {p.get('distance', 'N/A')} m"
+        )
+    summary = (
+        f"**Results:** {len(places)} of {len(unique)} distinct places, ranked by distance "
+        f"({len(queries)} {'queries' if len(queries) > 1 else 'query'}, "
+        f"{pages} {'pages' if pages > 1 else 'page'})"
+    )
+    if failed:
+        summary += "\n**Failed types:** " + "; ".join(
+            f"{'|'.join(q)}: {e.message}" for q, e in failed
+        )
+
+    return {
+        "content": [
+            {
+                "type": "text",
+                "text": "### Nearby \n\n" + summary + "\n\n" + "\n\n".join(lines),
+            },
+        ]
+    }
 
 
-@mcp.tool()
+@tool()
 async def get_place_details(
     public_id: str,
     language: str,
@@ -118,7 +217,9 @@ async def get_place_details(
     }
 
     try:
-        data = await make_woosmap_request("localities/details", params)
+        data = await make_woosmap_request(
+            "localities/details", params, fields={"result": None}
+        )
 
         result = data.get("result", {})
         if not result:
@@ -168,7 +269,133 @@ async def get_place_details(
         return _error_response(e, {"public_id": public_id})
 
 
-@mcp.tool()
+_WEEKDAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+
+
+def _opening_hours(result: dict[str, Any]) -> Optional[str]:
+    """Usual opening hours, consecutive days with the same hours grouped ("Mon-Fri 08:00-20:00")."""
+    usual = (result.get("opening_hours") or {}).get("usual") or {}
+    if not usual:
+        return None
+    groups: list[list[Any]] = []  # [first day, last day, hours]
+    for day in range(1, 8):
+        slots = usual.get(str(day)) or []
+        hours = " ".join(f"{s.get('start')}-{s.get('end')}" for s in slots if s.get("start")) or "closed"
+        if groups and groups[-1][2] == hours and groups[-1][1] == day - 1:
+            groups[-1][1] = day
+        else:
+            groups.append([day, day, hours])
+    return ", ".join(
+        f"{_WEEKDAYS[first - 1]}{'-' + _WEEKDAYS[last - 1] if last > first else ''} {hours}"
+        for first, last, hours in groups
+    )
+
+
+def _location(result: dict[str, Any]) -> Optional[str]:
+    location = (result.get("geometry") or {}).get("location") or {}
+    if location.get("lat") is None or location.get("lng") is None:
+        return None
+    return f"{location['lat']},{location['lng']}"
+
+
+# Columns get_places_details_bulk can project a place onto.
+DETAIL_FIELDS: dict[str, Callable[[dict[str, Any]], Any]] = {
+    "name": lambda r: r.get("name"),
+    "types": lambda r: ", ".join(r.get("types") or []) or None,
+    "address": lambda r: r.get("formatted_address"),
+    "location": _location,
+    "phone": lambda r: (r.get("contact") or {}).get("phone"),
+    "website": lambda r: (r.get("contact") or {}).get("website"),
+    "opening_hours": _opening_hours,
+}
+DEFAULT_DETAIL_FIELDS = ["name", "types", "address", "location", "phone", "website"]
+
+
+def _cell(value: Any) -> str:
+    return str(value).replace("|", "\\|").replace("\n", " ") if value not in (None, "") else "–"
+
+
+@tool()
+async def get_places_details_bulk(
+    public_ids: list[str],
+    language: str,
+    fields: Optional[list[str]] = None,
+    ctx: Optional[Context] = None,
+) -> Dict[str, Any]:
+    """
+    Get details of many places at once using Woosmap Localities Details API,
+    as one compact table. Use this instead of calling get_place_details once
+    per place, e.g. to enrich the results of get_places_nearby or geocoding.
+
+    Duplicate ids are looked up once, cached places are not fetched again,
+    and the rest are fetched concurrently.
+
+    Args:
+        public_ids: Woosmap public_ids of the places (up to 50).
+        language: Request language (ISO code, e.g. "en").
+        fields: Columns to return, among name, types, address, location, phone,
+            website and opening_hours (default: all but opening_hours).
+    """
+    ids = list(dict.fromkeys(i.strip() for i in public_ids if i and i.strip()))
+    columns = fields or DEFAULT_DETAIL_FIELDS
+    try:
+        unknown = [f for f in columns if f not in DETAIL_FIELDS]
+        if unknown:
+            raise WoosmapBadRequestError(
+                f"Unknown field(s) {', '.join(unknown)}; use {', '.join(DETAIL_FIELDS)}"
+            )
+        if not ids:
+            raise WoosmapBadRequestError("No public_ids given")
+        if len(ids) > DETAILS_BULK_MAX:
+            raise WoosmapBadRequestError(
+                f"{len(ids)} distinct public_ids exceed the limit of {DETAILS_BULK_MAX} per call"
+            )
+    except WoosmapError as e:
+        return _error_response(e, {"public_ids": len(public_ids)})
+
+    async def details(public_id: str) -> dict[str, Any]:
+        # Same request as get_place_details, so both tools share cache entries.
+        params = {"public_id": public_id, "language": language}
+        data = await make_woosmap_request(
+            "localities/details", params, fields={"result": None}
+        )
+        return data.get("result") or {}
+
+    results = await run_batch(ids, details, ctx)
+
+    rows, failures = [], []
+    for public_id, result in zip(ids, results):
+        if isinstance(result, WoosmapError):
+            failures.append(f"- `{public_id}`: {result.__class__.__name__}: {result.message}")
+        elif not result:
+            failures.append(f"- `{public_id}`: no details found")
+        else:
+            cells = [_cell(DETAIL_FIELDS[f](result)) for f in columns]
+            rows.append(f"| `{public_id}` | " + " | ".join(cells) + " |")
+
+    if not rows and failures and isinstance(results[0], WoosmapError):
+        logger.error(f"Woosmap bulk place details failed: {results[0].message}")
+        return _error_response(results[0], {"public_ids": len(ids)})
+
+    duplicates = len(public_ids) - len(ids)
+    lines = [
+        f"**Places:** {len(rows)} of {len(ids)} found"
+        + (f" ({duplicates} duplicate or empty ids skipped)" if duplicates else ""),
+        "",
+        "| public_id | " + " | ".join(columns) + " |",
+        "|---" * (len(columns) + 1) + "|",
+        *rows,
+    ]
+    if failures:
+        lines += ["", "**Not found or failed:**", *failures]
+    return {
+        "content": [
+            {"type": "text", "text": "### Place Details\n\n" + "\n".join(lines)}
+        ]
+    }
+
+
+@tool()
 async def autocomplete_then_details(
     input: str,
     latitude: float,
@@ -219,6 +446,7 @@ async def autocomplete_then_details(
         autocomplete_data = await make_woosmap_request(
             "localities/autocomplete",
             autocomplete_params,
+            fields={"localities": 1},
         )
 
         predictions = autocomplete_data.get("localities", [])
@@ -251,6 +479,7 @@ async def autocomplete_then_details(
         details_data = await make_woosmap_request(
             "localities/details",
             {"public_id": public_id},
+            fields={"result": None},
         )
 
         result = details_data.get("result", {})
@@ -299,7 +528,7 @@ async def autocomplete_then_details(
         return _error_response(e, {"input": input})
 
 
-@mcp.tool()
+@tool()
 async def autocomplete_localities(
     input: str,
     latitude: float,
@@ -343,7 +572,9 @@ async def autocomplete_localities(
         params["language"] = language
 
     try:
-        data = await make_woosmap_request("localities/autocomplete", params)
+        data = await make_woosmap_request(
+            "localities/autocomplete", params, fields={"localities": 8}
+        )
         predictions = data.get("localities", [])[:8]
 
         lines = []
@@ -373,7 +604,7 @@ async def autocomplete_localities(
         return _error_response(e, {"input": input, "types": types})
 
 
-@mcp.tool()
+@tool()
 async def geocode_locality(
     address: str,
     language: str,
@@ -417,7 +648,9 @@ async def geocode_locality(
         params["bounds"] = bounds
 
     try:
-        data = await make_woosmap_request("localities/geocode", params)
+        data = await make_woosmap_request(
+            "localities/geocode", params, fields={"results": 5}
+        )
         results = data.get("results", [])[:5]
 
         if not results:
@@ -459,7 +692,234 @@ async def geocode_locality(
         })
 
 
-@mcp.tool()
+@tool()
+async def geocode_localities_batch(
+    addresses: list[str],
+    language: str,
+    components: Optional[str] = None,
+    ctx: Optional[Context] = None,
+) -> Dict[str, Any]:
+    """
+    Geocode a list of addresses using Woosmap Localities Geocode API, keeping
+    the top result for each. Progress and each address's result are reported
+    as they complete.
+
+    Args:
+        addresses: Addresses or place names to geocode (at most WOOSMAP_GEOCODE_BATCH_MAX, 100 by default).
+        language: Request language (ISO code, e.g. "en").
+        components: Optional component filters applied to every address (e.g. "country:IN").
+    """
+    try:
+        if not addresses:
+            raise WoosmapBadRequestError("No addresses given")
+        if len(addresses) > GEOCODE_BATCH_MAX:
+            raise WoosmapBadRequestError(
+                f"{len(addresses)} addresses exceed the limit of {GEOCODE_BATCH_MAX} per call"
+            )
+    except WoosmapError as e:
+        return _error_response(e, {"addresses": len(addresses)})
+
+    async def geocode(address: str) -> Optional[Locality]:
+        params: Dict[str, Any] = {"address": address}
+        if language:
+            params["language"] = language
+        if components:
+            params["components"] = components
+        data = await make_woosmap_request(
+            "localities/geocode", params, fields={"results": 1}, model=GeocodeResponse
+        )
+        return data.results[0] if data.results else None
+
+    def describe(index: int, address: str, result: Any) -> str:
+        if isinstance(result, WoosmapError):
+            return f"{index + 1}. {address}: {result.message}"
+        if result is None:
+            return f"{index + 1}. {address}: no result"
+        location = result.location or LatLng()
+        return (
+            f"{index + 1}. {address} → {result.formatted_address or 'Unknown'} "
+            f"({location.lat}, {location.lng})"
+        )
+
+    results = await run_batch(addresses, geocode, ctx, describe)
+
+    lines = []
+    for i, (address, r) in enumerate(zip(addresses, results), 1):
+        if isinstance(r, WoosmapError):
+            lines.append(f"{i}. **{address}**\n   Error: {r.__class__.__name__}: {r.message}")
+        elif r is None:
+            lines.append(f"{i}. **{address}**\n   No result")
+        else:
+            location = r.location or LatLng()
+            lines.append(
+                f"{i}. **{address}**\n"
+                f"   {r.formatted_address or 'Unknown'}\n"
+                f"   Lat/Lng: {location.lat}, {location.lng}\n"
+                f"   public_id: `{r.public_id or 'N/A'}`"
+            )
+
+    return {
+        "content": [
+            {
+                "type": "text",
+                "text": "### Batch Geocode Results\n\n" + "\n\n".join(lines),
+            }
+        ]
+    }
+
+
+@tool()
+async def reverse_geocode_trace(
+    points: list[str],
+    language: str,
+    cell_size: Optional[float] = None,
+    min_move: float = 20,
+    components: Optional[str] = None,
+    ctx: Optional[Context] = None,
+) -> Dict[str, Any]:
+    """
+    Reverse geocode a GPS trace, returning the address of each stretch of it.
+
+    Points are snapped to a grid and each grid cell is looked up once, at the
+    first trace point that falls in it, so dense traces cost a few requests
+    instead of one per point. Points closer than ``min_move`` meters to the
+    previous looked-up point reuse its address. The grid is coarsened, up to
+    WOOSMAP_TRACE_MAX_CELL_M (800 m by default), when a trace would need too
+    many lookups, and the output says so; longer traces are rejected.
+
+    Args:
+        points: Trace points in order, as "lat,lng" strings.
+        language: Request language (ISO code, e.g. "en").
+        cell_size: Grid cell size in meters (default 50, at most
+            WOOSMAP_TRACE_MAX_CELL_M); points share the address of the first
+            point of their cell.
+        min_move: Distance in meters a point must move from the previous
+            looked-up point to be looked up itself (default 20, 0 to disable).
+        components: Optional component filters (e.g. "country:IN").
+    """
+    context = {"points": len(points), "cell_size": cell_size, "min_move": min_move}
+    try:
+        if not points:
+            raise WoosmapBadRequestError("points must not be empty")
+        if len(points) > TRACE_MAX_POINTS:
+            raise WoosmapBadRequestError(
+                f"{len(points)} points given, at most {TRACE_MAX_POINTS} per trace"
+            )
+        coords = []
+        for i, point in enumerate(points, 1):
+            try:
+                lat, lng = parse_latlng(point)
+            except ValueError:
+                raise WoosmapBadRequestError(f"Point {i} is not a \"lat,lng\" pair: {point!r}")
+            if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+                raise WoosmapBadRequestError(f"Point {i} is out of range: {point!r}")
+            coords.append((lat, lng))
+        size = cell_size or TRACE_CELL_M
+        if not 0 < size <= TRACE_MAX_CELL_M:
+            raise WoosmapBadRequestError(f"cell_size must be between 0 and {TRACE_MAX_CELL_M:g} m")
+    except WoosmapError as e:
+        return _error_response(e, context)
+
+    # Points moving less than min_move from the last looked-up point follow it.
+    owner = []
+    anchors: list[int] = []
+    for i, point in enumerate(coords):
+        if anchors and haversine_m(coords[anchors[-1]], point) < min_move:
+            owner.append(anchors[-1])
+        else:
+            anchors.append(i)
+            owner.append(i)
+
+    # Snap the remaining points to the grid, doubling the cell size until the
+    # trace fits the lookup budget or the cells would get too coarse.
+    requested_size = size
+    while True:
+        cell_of = {i: grid_cell(coords[i], size) for i in anchors}
+        cells = list(dict.fromkeys(cell_of.values()))
+        if len(cells) <= TRACE_MAX_CELLS:
+            break
+        if size * 2 > TRACE_MAX_CELL_M:
+            return _error_response(
+                WoosmapBadRequestError(
+                    f"The trace needs {len(cells)} lookups with {size:g} m cells, over the "
+                    f"limit of {TRACE_MAX_CELLS}; split it into shorter traces"
+                ),
+                context,
+            )
+        size *= 2
+    # Each cell is looked up at its first point, which is on the trace.
+    first_point: dict[tuple[int, int], int] = {}
+    for i in anchors:
+        first_point.setdefault(cell_of[i], i)
+
+    async def lookup(cell: tuple[int, int]) -> Optional[Locality]:
+        lat, lng = coords[first_point[cell]]
+        # Rounded so reruns of a trace map to the same cached requests.
+        params: Dict[str, Any] = {"latlng": f"{lat:.6f},{lng:.6f}"}
+        if language:
+            params["language"] = language
+        if components:
+            params["components"] = components
+        data = await make_woosmap_request(
+            "localities/geocode", params, fields={"results": 1}, model=GeocodeResponse
+        )
+        return data.results[0] if data.results else None
+
+    results = await run_batch(cells, lookup, ctx)
+    resolved = dict(zip(cells, results))
+    failed = [r for r in results if isinstance(r, WoosmapError)]
+    if len(failed) == len(results):
+        logger.error(f"Woosmap trace reverse geocoding failed: {failed[0].message}")
+        return _error_response(failed[0], context)
+
+    def address(index: int) -> str:
+        result = resolved[cell_of[owner[index]]]
+        if isinstance(result, WoosmapError):
+            return f"Error: {result.message}"
+        if result is None:
+            return "No address"
+        return result.formatted_address or "Unknown"
+
+    # Consecutive points with the same address form one stretch.
+    stretches: list[tuple[int, int, str]] = []
+    for i in range(len(coords)):
+        label = address(i)
+        if stretches and stretches[-1][2] == label:
+            stretches[-1] = (stretches[-1][0], i, label)
+        else:
+            stretches.append((i, i, label))
+
+    lines = []
+    for n, (first, last, label) in enumerate(stretches, 1):
+        span = f"Point {first + 1}" if first == last else f"Points {first + 1}-{last + 1}"
+        lines.append(
+            f"{n}. **{label}**\n"
+            f"   {span}, from {coords[first][0]},{coords[first][1]} "
+            f"to {coords[last][0]},{coords[last][1]}"
+        )
+    summary = (
+        f"**Points:** {len(coords)} ({len(coords) - len(anchors)} within {min_move:g} m of the previous one)\n"
+        f"**Lookups:** {len(cells)} grid cells of {size:g} m"
+    )
+    if failed:
+        summary += f" ({len(failed)} failed)"
+    if size > requested_size:
+        summary += (
+            f"\n_Resolution reduced from {requested_size:g} m to {size:g} m cells to stay within "
+            f"{TRACE_MAX_CELLS} lookups: points share the address of the first point of their cell._"
+        )
+
+    return {
+        "content": [
+            {
+                "type": "text",
+                "text": "### Trace Addresses\n\n" + summary + "\n\n" + "\n\n".join(lines),
+            }
+        ]
+    }
+
+
+@tool()
 async def reverse_geocode_locality(
     latitude: float,
     longitude: float,
@@ -493,7 +953,9 @@ async def reverse_geocode_locality(
         params["bounds"] = bounds
 
     try:
-        data = await make_woosmap_request("localities/geocode", params)
+        data = await make_woosmap_request(
+            "localities/geocode", params, fields={"results": 5}
+        )
         results = data.get("results", [])[:5]
 
         if not results:
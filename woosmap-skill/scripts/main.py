@@ -4,6 +4,7 @@ from core import mcp
 import localities  # noqa
 import distance  # noqa
 import transit  # noqa
+import stores  # noqa
 
 
 def main():
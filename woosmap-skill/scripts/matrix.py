@@ -0,0 +1,253 @@
+"""
+Array-backed distance matrices.
+
+``DistanceMatrix`` keeps distances (meters), durations (seconds) and element
+statuses in flat row-major typed arrays instead of nested lists of dicts, so
+a 100x100 matrix is three small buffers rather than ten thousand objects.
+Missing values are stored as -1.
+
+Row/column minimums, nearest destinations and threshold queries run on the
+whole array at once: with NumPy installed they operate on zero-copy views of
+the buffers, otherwise on array slices with the builtins. Tiled sub-matrices
+are merged with slice assignments, one row at a time.
+"""
+import heapq
+from array import array
+from typing import Any, Optional
+
+from models import MatrixResponse
+
+try:
+    import numpy as np
+except ImportError:  # optional, falls back to array slices
+    np = None
+
+MISSING = -1
+_INT_MAX = 2**31 - 1
+
+Metric = str  # "duration" or "distance" ("status" also works with row())
+
+
+class DistanceMatrix:
+    """Distances, durations and statuses of origins x destinations."""
+
+    __slots__ = (
+        "n_origins",
+        "n_destinations",
+        "status",
+        "distances",
+        "durations",
+        "statuses",
+        "status_names",
+    )
+
+    def __init__(
+        self,
+        n_origins: int,
+        n_destinations: int,
+        status: str = "OK",
+        element_status: str = "UNKNOWN",
+    ):
+        """
+        Args:
+            n_origins: Number of rows.
+            n_destinations: Number of columns.
+            status: Overall status of the matrix ("OK", "PARTIAL", ...).
+            element_status: Initial status of every element.
+        """
+        size = n_origins * n_destinations
+        self.n_origins = n_origins
+        self.n_destinations = n_destinations
+        self.status = status
+        self.status_names: list[str] = ["OK"]
+        self.distances = array("i", [MISSING]) * size
+        self.durations = array("i", [MISSING]) * size
+        self.statuses = array("B", [self.status_code(element_status)]) * size
+
+    # -------------------------------------------------
+    # Construction
+    # -------------------------------------------------
+    @classmethod
+    def from_response(
+        cls,
+        response: MatrixResponse,
+        n_origins: Optional[int] = None,
+        n_destinations: Optional[int] = None,
+    ) -> "DistanceMatrix":
+        """Build a matrix from a decoded Distance Matrix response."""
+        rows = response.rows
+        if n_origins is None:
+            n_origins = len(rows)
+        if n_destinations is None:
+            n_destinations = max((len(r.elements) for r in rows), default=0)
+        matrix = cls(n_origins, n_destinations, response.status)
+        distances, durations, statuses = matrix.distances, matrix.durations, matrix.statuses
+        code = matrix.status_code
+        for i, row in enumerate(rows[:n_origins]):
+            base = i * n_destinations
+            for j, el in enumerate(row.elements[:n_destinations]):
+                k = base + j
+                statuses[k] = code(el.status)
+                if el.distance is not None and el.distance.value is not None:
+                    distances[k] = int(el.distance.value)
+                if el.duration is not None and el.duration.value is not None:
+                    durations[k] = int(el.duration.value)
+        return matrix
+
+    def status_code(self, name: str) -> int:
+        """Return the code of an element status, registering new names."""
+        try:
+            return self.status_names.index(name)
+        except ValueError:
+            self.status_names.append(name)
+            return len(self.status_names) - 1
+
+    def merge(self, o0: int, d0: int, tile: "DistanceMatrix") -> None:
+        """Copy a tiled sub-matrix in place, its first element at (o0, d0)."""
+        n, w = self.n_destinations, tile.n_destinations
+        # Translate the tile's status codes into this matrix's table.
+        table = bytes(self.status_code(name) for name in tile.status_names)
+        table += bytes(256 - len(table))
+        statuses = array("B", tile.statuses.tobytes().translate(table))
+        for i in range(tile.n_origins):
+            src = slice(i * w, (i + 1) * w)
+            dst = slice((o0 + i) * n + d0, (o0 + i) * n + d0 + w)
+            self.distances[dst] = tile.distances[src]
+            self.durations[dst] = tile.durations[src]
+            self.statuses[dst] = statuses[src]
+
+    def fill(self, o0: int, o1: int, d0: int, d1: int, element_status: str) -> None:
+        """Mark a block of elements as having no value, with ``element_status``."""
+        n, w = self.n_destinations, d1 - d0
+        missing = array("i", [MISSING]) * w
+        codes = array("B", [self.status_code(element_status)]) * w
+        for i in range(o0, o1):
+            dst = slice(i * n + d0, i * n + d1)
+            self.distances[dst] = missing
+            self.durations[dst] = missing
+            self.statuses[dst] = codes
+
+    # -------------------------------------------------
+    # Access
+    # -------------------------------------------------
+    def __len__(self) -> int:
+        return self.n_origins * self.n_destinations
+
+    def _values(self, metric: Metric) -> array:
+        if metric == "duration":
+            return self.durations
+        if metric == "distance":
+            return self.distances
+        if metric == "status":
+            return self.statuses
+        raise ValueError(f"Unknown metric: {metric}")
+
+    def _grid(self, metric: Metric):
+        return np.frombuffer(self._values(metric), dtype=np.intc).reshape(
+            self.n_origins, self.n_destinations
+        )
+
+    def row(self, i: int, metric: Metric = "duration") -> array:
+        """Values (or status codes, for "status") from origin ``i`` to every destination."""
+        n = self.n_destinations
+        return self._values(metric)[i * n:(i + 1) * n]
+
+    def element(self, i: int, j: int) -> tuple[str, Optional[int], Optional[int]]:
+        """(status, distance, duration) of one element, None for missing values."""
+        k = i * self.n_destinations + j
+        distance, duration = self.distances[k], self.durations[k]
+        return (
+            self.status_names[self.statuses[k]],
+            distance if distance >= 0 else None,
+            duration if duration >= 0 else None,
+        )
+
+    def ok_count(self) -> int:
+        """Number of elements with status OK."""
+        return self.statuses.count(0)
+
+    # -------------------------------------------------
+    # Vectorized queries
+    # -------------------------------------------------
+    def row_min(self, metric: Metric = "duration") -> list[tuple[Optional[int], Optional[int]]]:
+        """Per origin, (argmin, min) over destinations; (None, None) without values."""
+        if not len(self):
+            return [(None, None)] * self.n_origins
+        if np is not None:
+            return self._min_numpy(metric, axis=1)
+        out = []
+        for i in range(self.n_origins):
+            row = [v if v >= 0 else _INT_MAX for v in self.row(i, metric)]
+            best = min(row)
+            out.append((row.index(best), best) if best != _INT_MAX else (None, None))
+        return out
+
+    def column_min(self, metric: Metric = "duration") -> list[tuple[Optional[int], Optional[int]]]:
+        """Per destination, (argmin, min) over origins; (None, None) without values."""
+        if not len(self):
+            return [(None, None)] * self.n_destinations
+        if np is not None:
+            return self._min_numpy(metric, axis=0)
+        values = self._values(metric)
+        n = self.n_destinations
+        out = []
+        for j in range(n):
+            column = [v if v >= 0 else _INT_MAX for v in values[j::n]]
+            best = min(column)
+            out.append((column.index(best), best) if best != _INT_MAX else (None, None))
+        return out
+
+    def _min_numpy(self, metric: Metric, axis: int) -> list[tuple[Optional[int], Optional[int]]]:
+        grid = self._grid(metric)
+        masked = np.where(grid >= 0, grid, _INT_MAX)
+        index = masked.argmin(axis=axis)
+        best = masked.min(axis=axis)
+        return [
+            (i, v) if v != _INT_MAX else (None, None)
+            for i, v in zip(index.tolist(), best.tolist())
+        ]
+
+    def nearest(
+        self, i: int, k: int = 1, metric: Metric = "duration"
+    ) -> list[tuple[int, int]]:
+        """The ``k`` destinations closest to origin ``i``, as (index, value)."""
+        row = self.row(i, metric)
+        if np is not None:
+            values = np.frombuffer(row, dtype=np.intc)
+            valid = np.flatnonzero(values >= 0)
+            if k < len(valid):
+                valid = valid[np.argpartition(values[valid], k)[:k]]
+            order = valid[np.argsort(values[valid], kind="stable")]
+            return list(zip(order.tolist(), values[order].tolist()))
+        candidates = ((j, v) for j, v in enumerate(row) if v >= 0)
+        return heapq.nsmallest(k, candidates, key=lambda item: item[1])
+
+    def within(self, threshold: int, metric: Metric = "duration") -> list[list[int]]:
+        """Per origin, the destinations reachable within ``threshold``."""
+        if np is not None and len(self):
+            grid = self._grid(metric)
+            mask = (grid >= 0) & (grid <= threshold)
+            return [np.flatnonzero(row).tolist() for row in mask]
+        return [
+            [j for j, v in enumerate(self.row(i, metric)) if 0 <= v <= threshold]
+            for i in range(self.n_origins)
+        ]
+
+    # -------------------------------------------------
+    # Output
+    # -------------------------------------------------
+    def to_dict(self) -> dict[str, Any]:
+        """Compact JSON form: one list per origin for each metric, -1 for missing."""
+        n = self.n_destinations
+        out: dict[str, Any] = {
+            "status": self.status,
+            "distances_m": [self.distances[i * n:(i + 1) * n].tolist() for i in range(self.n_origins)],
+            "durations_s": [self.durations[i * n:(i + 1) * n].tolist() for i in range(self.n_origins)],
+        }
+        if self.ok_count() != len(self):
+            names = self.status_names
+            out["statuses"] = [
+                [names[c] for c in self.statuses[i * n:(i + 1) * n]]
+                for i in range(self.n_origins)
+            ]
+        return out
@@ -0,0 +1,149 @@
+"""
+In-process metrics for the Woosmap MCP server.
+
+A deliberately small registry of counters, gauges and summaries, rendered in
+the Prometheus text format by the ``/metrics`` endpoint of ``server.py``.
+"""
+import asyncio
+import os
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Optional
+
+# Added to every sample when running under the multi-worker launcher.
+WORKER_ID = os.getenv("WOOSMAP_WORKER_ID")
+
+LOOP_LAG_INTERVAL = float(os.getenv("WOOSMAP_LOOP_LAG_INTERVAL", "0.25"))
+
+LabelKey = tuple[tuple[str, str], ...]
+
+# Seconds spent per phase (network, parse, render, ...) by the tool call being
+# served, when its timings are collected (see profiling.tool_timings).
+call_phases: ContextVar[Optional[dict[str, float]]] = ContextVar("woosmap_call_phases", default=None)
+
+
+def _label_key(labels: dict) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(labels: LabelKey) -> str:
+    if WORKER_ID is not None:
+        labels = labels + (("worker", WORKER_ID),)
+    if not labels:
+        return ""
+    inner = ",".join(f'{k}="{v}"' for k, v in labels)
+    return "{" + inner + "}"
+
+
+class Metrics:
+    """Registry of counters, gauges and summaries (count/sum/max)."""
+
+    def __init__(self):
+        self._counters: dict[str, dict[LabelKey, float]] = defaultdict(dict)
+        self._gauges: dict[str, dict[LabelKey, float]] = defaultdict(dict)
+        self._summaries: dict[str, dict[LabelKey, list[float]]] = defaultdict(dict)
+
+    def inc(self, name: str, value: float = 1.0, **labels) -> None:
+        series = self._counters[name]
+        key = _label_key(labels)
+        series[key] = series.get(key, 0.0) + value
+
+    def set(self, name: str, value: float, **labels) -> None:
+        self._gauges[name][_label_key(labels)] = value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        series = self._summaries[name]
+        key = _label_key(labels)
+        summary = series.get(key)
+        if summary is None:
+            series[key] = [1, value, value]
+        else:
+            summary[0] += 1
+            summary[1] += value
+            summary[2] = max(summary[2], value)
+
+    def get(self, name: str, **labels) -> Optional[float]:
+        key = _label_key(labels)
+        for family in (self._counters, self._gauges):
+            if key in family.get(name, {}):
+                return family[name][key]
+        return None
+
+    def render(self) -> str:
+        """Render all series in the Prometheus text exposition format."""
+        lines = []
+        for name, series in sorted(self._counters.items()):
+            lines.append(f"# TYPE {name} counter")
+            for key, value in series.items():
+                lines.append(f"{name}{_format_labels(key)} {value}")
+        for name, series in sorted(self._gauges.items()):
+            lines.append(f"# TYPE {name} gauge")
+            for key, value in series.items():
+                lines.append(f"{name}{_format_labels(key)} {value}")
+        for name, series in sorted(self._summaries.items()):
+            lines.append(f"# TYPE {name} summary")
+            for key, (count, total, peak) in series.items():
+                labels = _format_labels(key)
+                lines.append(f"{name}_count{labels} {count}")
+                lines.append(f"{name}_sum{labels} {total}")
+                lines.append(f"{name}_max{labels} {peak}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+def add_phase(phase: str, seconds: float) -> None:
+    """Add time to a phase of the current tool call's breakdown, if collected."""
+    phases = call_phases.get()
+    if phases is not None:
+        phases[phase] = phases.get(phase, 0.0) + seconds
+
+
+class Timer:
+    """
+    Context manager observing the elapsed time into a summary, and into
+    ``phase`` of the current tool call's breakdown when one is given.
+    """
+
+    def __init__(self, name: str, phase: Optional[str] = None, **labels):
+        self.name = name
+        self.phase = phase
+        self.labels = labels
+        self.elapsed = 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self._start
+        metrics.observe(self.name, self.elapsed, **self.labels)
+        if self.phase is not None:
+            add_phase(self.phase, self.elapsed)
+        return False
+
+
+# -------------------------------------------------
+# Event-loop lag
+# -------------------------------------------------
+_lag_tasks: dict[int, asyncio.Task] = {}
+
+
+async def _watch_loop_lag(interval: float) -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - start - interval)
+        metrics.set("woosmap_event_loop_lag_seconds", lag)
+        metrics.observe("woosmap_event_loop_lag", lag)
+
+
+def start_loop_monitor(interval: float = LOOP_LAG_INTERVAL) -> None:
+    """Start measuring event-loop lag on the running loop (idempotent)."""
+    loop = asyncio.get_running_loop()
+    task = _lag_tasks.get(id(loop))
+    if task is None or task.done():
+        _lag_tasks[id(loop)] = loop.create_task(_watch_loop_lag(interval))
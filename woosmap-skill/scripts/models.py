@@ -0,0 +1,402 @@
+"""
+Typed models of the Woosmap responses the tools render.
+
+Slotted dataclasses that keep only the fields the tools use, instead of the
+whole parsed JSON tree. With msgspec installed, ``decode`` builds them
+straight from the response bytes and skips every other field without
+allocating it; otherwise the body is parsed as usual and converted with
+``from_dict``.
+
+The models serialize back to JSON with ``render.dumps`` (orjson handles
+dataclasses natively) and survive the render process pool (they pickle).
+"""
+import dataclasses
+import json
+from dataclasses import dataclass, field
+from typing import Any, Optional, TypeVar, Union
+
+try:
+    import msgspec
+except ImportError:  # optional, falls back to from_dict on the parsed body
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+Number = Union[int, float]
+
+M = TypeVar("M")
+
+
+# -------------------------------------------------
+# Shared value types
+# -------------------------------------------------
+@dataclass(slots=True)
+class Measure:
+    """A ``{"value": ..., "text": ...}`` pair (distance, duration, time)."""
+
+    value: Optional[Number] = None
+    text: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, d: Optional[dict[str, Any]]) -> Optional["Measure"]:
+        if d is None:
+            return None
+        return cls(d.get("value"), d.get("text"))
+
+
+@dataclass(slots=True)
+class LatLng:
+    lat: Optional[float] = None
+    lng: Optional[float] = None
+
+    @classmethod
+    def from_dict(cls, d: Optional[dict[str, Any]]) -> Optional["LatLng"]:
+        if d is None:
+            return None
+        return cls(d.get("lat"), d.get("lng"))
+
+
+@dataclass(slots=True)
+class Bounds:
+    northeast: Optional[LatLng] = None
+    southwest: Optional[LatLng] = None
+
+    @classmethod
+    def from_dict(cls, d: Optional[dict[str, Any]]) -> Optional["Bounds"]:
+        if d is None:
+            return None
+        return cls(LatLng.from_dict(d.get("northeast")), LatLng.from_dict(d.get("southwest")))
+
+
+@dataclass(slots=True)
+class Polyline:
+    points: str = ""
+
+    @classmethod
+    def from_dict(cls, d: Optional[dict[str, Any]]) -> Optional["Polyline"]:
+        if d is None:
+            return None
+        return cls(d.get("points", ""))
+
+
+def _value(measure: Optional[Measure]) -> Number:
+    return measure.value or 0 if measure is not None else 0
+
+
+# -------------------------------------------------
+# Localities
+# -------------------------------------------------
+@dataclass(slots=True)
+class Geometry:
+    location: Optional[LatLng] = None
+
+    @classmethod
+    def from_dict(cls, d: Optional[dict[str, Any]]) -> Optional["Geometry"]:
+        if d is None:
+            return None
+        return cls(LatLng.from_dict(d.get("location")))
+
+
+@dataclass(slots=True)
+class Locality:
+    public_id: Optional[str] = None
+    name: Optional[str] = None
+    description: Optional[str] = None
+    formatted_address: Optional[str] = None
+    types: list[str] = field(default_factory=list)
+    geometry: Optional[Geometry] = None
+    distance: Optional[Number] = None
+
+    @property
+    def location(self) -> Optional[LatLng]:
+        return self.geometry.location if self.geometry is not None else None
+
+    @classmethod
+    def from_dict(cls, d: dict[str, Any]) -> "Locality":
+        return cls(
+            d.get("public_id"),
+            d.get("name"),
+            d.get("description"),
+            d.get("formatted_address"),
+            d.get("types") or [],
+            Geometry.from_dict(d.get("geometry")),
+            d.get("distance"),
+        )
+
+
+@dataclass(slots=True)
+class GeocodeResponse:
+    status: Optional[str] = None
+    results: list[Locality] = field(default_factory=list)
+
+    @classmethod
+    def from_dict(cls, d: dict[str, Any]) -> "GeocodeResponse":
+        return cls(d.get("status"), [Locality.from_dict(r) for r in d.get("results", [])])
+
+
+# -------------------------------------------------
+# Distance
+# -------------------------------------------------
+@dataclass(slots=True)
+class Step:
+    distance: Optional[Measure] = None
+    duration: Optional[Measure] = None
+    start_location: Optional[LatLng] = None
+    end_location: Optional[LatLng] = None
+    polyline: Optional[Polyline] = None
+    travel_mode: Optional[str] = None
+    instructions: Optional[dict[str, Any]] = None
+
+    @classmethod
+    def from_dict(cls, d: dict[str, Any]) -> "Step":
+        return cls(
+            Measure.from_dict(d.get("distance")),
+            Measure.from_dict(d.get("duration")),
+            LatLng.from_dict(d.get("start_location")),
+            LatLng.from_dict(d.get("end_location")),
+            Polyline.from_dict(d.get("polyline")),
+            d.get("travel_mode"),
+            d.get("instructions"),
+        )
+
+
+@dataclass(slots=True)
+class Leg:
+    distance: Optional[Measure] = None
+    duration: Optional[Measure] = None
+    start_location: Optional[LatLng] = None
+    end_location: Optional[LatLng] = None
+    steps: list[Step] = field(default_factory=list)
+
+    @classmethod
+    def from_dict(cls, d: dict[str, Any]) -> "Leg":
+        return cls(
+            Measure.from_dict(d.get("distance")),
+            Measure.from_dict(d.get("duration")),
+            LatLng.from_dict(d.get("start_location")),
+            LatLng.from_dict(d.get("end_location")),
+            [Step.from_dict(s) for s in d.get("steps", [])],
+        )
+
+
+@dataclass(slots=True)
+class Route:
+    overview_polyline: Optional[Polyline] = None
+    bounds: Optional[Bounds] = None
+    notice: Optional[str] = None
+    legs: list[Leg] = field(default_factory=list)
+
+    @property
+    def distance(self) -> Number:
+        """Total distance of the legs in meters."""
+        return sum(_value(leg.distance) for leg in self.legs)
+
+    @property
+    def duration(self) -> Number:
+        """Total duration of the legs in seconds."""
+        return sum(_value(leg.duration) for leg in self.legs)
+
+    @classmethod
+    def from_dict(cls, d: dict[str, Any]) -> "Route":
+        return cls(
+            Polyline.from_dict(d.get("overview_polyline")),
+            Bounds.from_dict(d.get("bounds")),
+            d.get("notice"),
+            [Leg.from_dict(leg) for leg in d.get("legs", [])],
+        )
+
+
+@dataclass(slots=True)
+class RouteResponse:
+    status: str = "UNKNOWN"
+    routes: list[Route] = field(default_factory=list)
+
+    @classmethod
+    def from_dict(cls, d: dict[str, Any]) -> "RouteResponse":
+        return cls(d.get("status", "UNKNOWN"), [Route.from_dict(r) for r in d.get("routes", [])])
+
+
+@dataclass(slots=True)
+class Price:
+    value: Number = 0
+    currency: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, d: Optional[dict[str, Any]]) -> Optional["Price"]:
+        if d is None:
+            return None
+        return cls(d.get("value", 0), d.get("currency"))
+
+
+@dataclass(slots=True)
+class Toll:
+    name: Optional[str] = None
+    price: Optional[Price] = None
+    location: Optional[LatLng] = None
+
+    @classmethod
+    def from_dict(cls, d: dict[str, Any]) -> "Toll":
+        return cls(d.get("name"), Price.from_dict(d.get("price")), LatLng.from_dict(d.get("location")))
+
+
+@dataclass(slots=True)
+class TollRoute(Route):
+    tolls: list[Toll] = field(default_factory=list)
+
+    @classmethod
+    def from_dict(cls, d: dict[str, Any]) -> "TollRoute":
+        route = Route.from_dict(d)
+        return cls(
+            route.overview_polyline,
+            route.bounds,
+            route.notice,
+            route.legs,
+            [Toll.from_dict(t) for t in d.get("tolls", [])],
+        )
+
+
+@dataclass(slots=True)
+class TollsResponse:
+    status: str = "UNKNOWN"
+    routes: list[TollRoute] = field(default_factory=list)
+
+    @classmethod
+    def from_dict(cls, d: dict[str, Any]) -> "TollsResponse":
+        return cls(d.get("status", "UNKNOWN"), [TollRoute.from_dict(r) for r in d.get("routes", [])])
+
+
+@dataclass(slots=True)
+class MatrixElement:
+    status: str = "UNKNOWN"
+    distance: Optional[Measure] = None
+    duration: Optional[Measure] = None
+
+    @classmethod
+    def from_dict(cls, d: dict[str, Any]) -> "MatrixElement":
+        return cls(
+            d.get("status", "UNKNOWN"),
+            Measure.from_dict(d.get("distance")),
+            Measure.from_dict(d.get("duration")),
+        )
+
+
+@dataclass(slots=True)
+class MatrixRow:
+    elements: list[MatrixElement] = field(default_factory=list)
+
+    @classmethod
+    def from_dict(cls, d: dict[str, Any]) -> "MatrixRow":
+        return cls([MatrixElement.from_dict(e) for e in d.get("elements", [])])
+
+
+@dataclass(slots=True)
+class MatrixResponse:
+    status: str = "UNKNOWN"
+    rows: list[MatrixRow] = field(default_factory=list)
+
+    @classmethod
+    def from_dict(cls, d: dict[str, Any]) -> "MatrixResponse":
+        return cls(d.get("status", "UNKNOWN"), [MatrixRow.from_dict(r) for r in d.get("rows", [])])
+
+
+# -------------------------------------------------
+# Transit
+# -------------------------------------------------
+@dataclass(slots=True)
+class TransitStep:
+    travel_mode: Optional[str] = None
+    html_instructions: Optional[str] = None
+    distance: Optional[Measure] = None
+    duration: Optional[Measure] = None
+
+    @classmethod
+    def from_dict(cls, d: dict[str, Any]) -> "TransitStep":
+        return cls(
+            d.get("travel_mode"),
+            d.get("html_instructions"),
+            Measure.from_dict(d.get("distance")),
+            Measure.from_dict(d.get("duration")),
+        )
+
+
+@dataclass(slots=True)
+class TransitLeg:
+    distance: Optional[Measure] = None
+    duration: Optional[Measure] = None
+    departure_time: Optional[Measure] = None
+    arrival_time: Optional[Measure] = None
+    steps: list[TransitStep] = field(default_factory=list)
+
+    @classmethod
+    def from_dict(cls, d: dict[str, Any]) -> "TransitLeg":
+        return cls(
+            Measure.from_dict(d.get("distance")),
+            Measure.from_dict(d.get("duration")),
+            Measure.from_dict(d.get("departure_time")),
+            Measure.from_dict(d.get("arrival_time")),
+            [TransitStep.from_dict(s) for s in d.get("steps", [])],
+        )
+
+
+@dataclass(slots=True)
+class TransitRoute:
+    duration: Optional[Number] = None
+    legs: list[TransitLeg] = field(default_factory=list)
+
+    @property
+    def distance(self) -> Number:
+        """Total distance of the legs in meters."""
+        return sum(_value(leg.distance) for leg in self.legs)
+
+    @property
+    def legs_duration(self) -> Number:
+        """Total duration of the legs in seconds."""
+        return sum(_value(leg.duration) for leg in self.legs)
+
+    @classmethod
+    def from_dict(cls, d: dict[str, Any]) -> "TransitRoute":
+        return cls(d.get("duration"), [TransitLeg.from_dict(leg) for leg in d.get("legs", [])])
+
+
+@dataclass(slots=True)
+class TransitResponse:
+    status: str = "UNKNOWN"
+    routes: list[TransitRoute] = field(default_factory=list)
+
+    @classmethod
+    def from_dict(cls, d: dict[str, Any]) -> "TransitResponse":
+        return cls(
+            d.get("status", "UNKNOWN"),
+            [TransitRoute.from_dict(r) for r in d.get("routes", [])],
+        )
+
+
+# -------------------------------------------------
+# Decoding / encoding
+# -------------------------------------------------
+_decoders: dict[type, Any] = {}
+
+
+def decode(model: type[M], body: bytes) -> M:
+    """Decode a response body into ``model``, keeping only the model's fields."""
+    if msgspec is not None:
+        decoder = _decoders.get(model)
+        if decoder is None:
+            decoder = _decoders[model] = msgspec.json.Decoder(model)
+        try:
+            return decoder.decode(body)
+        except msgspec.ValidationError:
+            # Unexpected types in a field; the lenient path below copes.
+            pass
+    data = orjson.loads(body) if orjson is not None else json.loads(body)
+    return model.from_dict(data)
+
+
+def to_builtins(obj: Any) -> Any:
+    """``json.dumps`` default hook turning models into plain dicts."""
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.asdict(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
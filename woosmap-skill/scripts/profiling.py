@@ -0,0 +1,165 @@
+"""
+Profiling hooks for the Woosmap MCP server.
+
+Per-tool timing breakdowns
+    With ``WOOSMAP_TOOL_TIMINGS=1`` every tool call records where its time
+    goes: ``throttle`` (waiting for the rate limiter), ``network`` (until the
+    upstream response headers arrive), ``parse`` (streaming and decoding the
+    body), ``render`` (formatting through ``render.render``) and ``other``
+    (the rest: cache lookups, inline formatting, ...). Phases are summed over
+    the call's upstream requests, so with concurrent requests they can add up
+    to more than the call itself. Each call is logged and observed in the
+    ``woosmap_tool_phase_seconds`` summary.
+
+On-demand profilers
+    ``sample_stacks`` samples the Python stack of the event-loop thread every
+    few milliseconds for a while, and ``trace_allocations`` diffs tracemalloc
+    snapshots taken at both ends of a window. Both return collapsed stacks
+    (``frame;frame;frame weight`` per line), the input format of
+    flamegraph.pl, speedscope and inferno. ``server.py`` serves them on
+    ``/admin/profile``.
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from types import FrameType
+from typing import Iterator, Optional
+
+from metrics import call_phases, metrics
+
+logger = logging.getLogger(__name__)
+
+TOOL_TIMINGS = os.getenv("WOOSMAP_TOOL_TIMINGS", "0") == "1"
+PROFILE_MAX_SECONDS = float(os.getenv("WOOSMAP_PROFILE_MAX_SECONDS", "60"))
+# Frames kept per allocation traceback; deeper is more precise and slower.
+TRACEMALLOC_FRAMES = int(os.getenv("WOOSMAP_TRACEMALLOC_FRAMES", "16"))
+
+PHASES = ("throttle", "network", "parse", "render")
+
+
+# -------------------------------------------------
+# Per-tool timing breakdowns
+# -------------------------------------------------
+@contextmanager
+def tool_timings(tool: str, enabled: Optional[bool] = None) -> Iterator[Optional[dict[str, float]]]:
+    """
+    Collect the phase breakdown of the tool call run in the block.
+
+    Does nothing unless ``enabled`` (default ``WOOSMAP_TOOL_TIMINGS``), or when
+    the block runs inside a call that is already being timed.
+    """
+    if not (TOOL_TIMINGS if enabled is None else enabled) or call_phases.get() is not None:
+        yield None
+        return
+    phases: dict[str, float] = {}
+    token = call_phases.set(phases)
+    start = time.perf_counter()
+    try:
+        yield phases
+    finally:
+        call_phases.reset(token)
+        total = time.perf_counter() - start
+        phases["other"] = max(0.0, total - sum(phases.get(p, 0.0) for p in PHASES))
+        for phase, seconds in phases.items():
+            metrics.observe("woosmap_tool_phase_seconds", seconds, tool=tool, phase=phase)
+        breakdown = ", ".join(f"{p} {s * 1e3:.1f}" for p, s in phases.items() if s >= 5e-5)
+        logger.info(f"Tool {tool} took {total * 1e3:.1f} ms ({breakdown} ms)")
+
+
+# -------------------------------------------------
+# Stack sampling
+# -------------------------------------------------
+def _frame_name(frame: FrameType) -> str:
+    code = frame.f_code
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+
+
+def collapsed_stack(frame: Optional[FrameType]) -> str:
+    """``outermost;...;innermost`` frame names of a stack."""
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def _is_idle(frame: FrameType) -> bool:
+    """Is the event loop waiting for I/O (the selector's select call)?"""
+    return frame.f_code.co_name in ("select", "poll", "_poll") and "selectors" in frame.f_code.co_filename
+
+
+def _sample(thread_id: int, seconds: float, interval: float, idle: bool) -> Counter:
+    samples: Counter = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        frame = sys._current_frames().get(thread_id)
+        if frame is None:
+            break
+        if idle or not _is_idle(frame):
+            samples[collapsed_stack(frame)] += 1
+        time.sleep(interval)
+    return samples
+
+
+async def sample_stacks(seconds: float, interval: float = 0.005, idle: bool = False) -> str:
+    """
+    Sample the stack of the event-loop thread for ``seconds``.
+
+    Args:
+        seconds: Length of the profile.
+        interval: Time between samples in seconds.
+        idle: Also count samples where the loop is waiting for I/O.
+
+    Returns:
+        Collapsed stacks weighted by sample count, most frequent first.
+    """
+    thread_id = threading.get_ident()
+    samples = await asyncio.to_thread(_sample, thread_id, seconds, interval, idle)
+    return "".join(f"{stack} {count}\n" for stack, count in samples.most_common())
+
+
+# -------------------------------------------------
+# Allocation tracing
+# -------------------------------------------------
+def _traceback_stack(traceback: tracemalloc.Traceback) -> str:
+    # tracemalloc keeps the most recent frame first.
+    return ";".join(f"{Path(f.filename).name}:{f.lineno}" for f in reversed(traceback))
+
+
+async def trace_allocations(seconds: float, limit: int = 500) -> str:
+    """
+    Trace memory allocated and still held after ``seconds``.
+
+    tracemalloc is started for the window unless it is already running, and
+    stopped again afterwards.
+
+    Returns:
+        Collapsed allocation stacks weighted by bytes of net growth, largest
+        first, at most ``limit`` of them.
+    """
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+    try:
+        before = tracemalloc.take_snapshot()
+        await asyncio.sleep(seconds)
+        after = tracemalloc.take_snapshot()
+    finally:
+        if started:
+            tracemalloc.stop()
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    diff = after.filter_traces(ignore).compare_to(before.filter_traces(ignore), "traceback")
+    lines = [
+        f"{_traceback_stack(stat.traceback)} {stat.size_diff}\n"
+        for stat in diff[:limit]
+        if stat.size_diff > 0
+    ]
+    return "".join(lines)
@@ -0,0 +1,217 @@
+"""
+Usage accounting and budgets for upstream Woosmap calls.
+
+Every request sent upstream is charged, in billed units (one per request, one
+per element for Distance Matrix requests), to the tool, MCP session and
+tenant it was made for. Cache hits and coalesced requests are free.
+
+Budgets are ``soft:hard`` unit counts per window of ``WOOSMAP_QUOTA_WINDOW``
+seconds (default one day); a single number is a hard budget, 0 or unset means
+unlimited:
+
+- ``WOOSMAP_QUOTA_SESSION``: per MCP session, so a runaway agent loop cannot
+  drain the shared API key;
+- ``WOOSMAP_QUOTA_TENANT``: per tenant, overridden per tenant with
+  ``WOOSMAP_QUOTA_TENANT_<NAME>``;
+- ``WOOSMAP_QUOTA_TOOL_<TOOL_NAME>``: per tool, across sessions.
+
+Past its soft budget a scope is cache-only: cached responses are served, but
+requests that would reach the API fail with WoosmapQuotaExceededError. Past
+the hard budget every call in that scope is rejected. Both checks happen
+before the request is sent, so the local budget runs out before the API
+answers 429 for the whole key.
+
+Tenants are read from the ``X-Woosmap-Tenant`` header (``WOOSMAP_TENANT_HEADER``)
+of HTTP transports, so set it at a gateway; stdio sessions and requests
+without the header belong to tenant "default". With ``WOOSMAP_STATE_DIR``
+set, tenant and tool usage is kept in SQLite and shared by all worker
+processes; session usage stays in the process serving the session and is
+dropped when the session ends.
+"""
+import os
+import sqlite3
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Optional
+
+from exceptions import WoosmapQuotaExceededError
+from metrics import metrics
+
+QUOTA_WINDOW = int(os.getenv("WOOSMAP_QUOTA_WINDOW", "86400"))
+TENANT_HEADER = os.getenv("WOOSMAP_TENANT_HEADER", "x-woosmap-tenant")
+DEFAULT_TENANT = "default"
+
+current_session: ContextVar[Optional[str]] = ContextVar("woosmap_session", default=None)
+current_tenant: ContextVar[str] = ContextVar("woosmap_tenant", default=DEFAULT_TENANT)
+
+
+@dataclass(slots=True)
+class Budget:
+    soft: Optional[int] = None
+    hard: Optional[int] = None
+
+    @classmethod
+    def parse(cls, value: Optional[str]) -> "Budget":
+        """Parse ``"soft:hard"`` or ``"hard"``; 0 or empty means unlimited."""
+        if not value:
+            return cls()
+        soft, _, hard = value.partition(":") if ":" in value else ("", "", value)
+        return cls(int(soft) or None if soft else None, int(hard) or None if hard else None)
+
+
+def budget_for(scope: str, key: str) -> Budget:
+    """Configured budget of a scope ("session", "tenant" or "tool")."""
+    if scope == "session":
+        return Budget.parse(os.getenv("WOOSMAP_QUOTA_SESSION"))
+    if scope == "tenant":
+        return Budget.parse(
+            os.getenv(f"WOOSMAP_QUOTA_TENANT_{key.upper()}", os.getenv("WOOSMAP_QUOTA_TENANT"))
+        )
+    return Budget.parse(os.getenv(f"WOOSMAP_QUOTA_TOOL_{key.upper()}"))
+
+
+def request_units(endpoint: str, params: dict[str, Any]) -> int:
+    """Billed units of one request: its elements for a Distance Matrix."""
+    if endpoint.startswith("distance/distancematrix"):
+        origins = str(params.get("origins", "")).count("|") + 1
+        destinations = str(params.get("destinations", "")).count("|") + 1
+        return origins * destinations
+    return 1
+
+
+class QuotaTracker:
+    """Counts units per scope and window, and enforces the budgets."""
+
+    def __init__(self, window: int = QUOTA_WINDOW, state_dir: Optional[str] = None):
+        self.window = max(1, window)
+        self._usage: dict[tuple[str, str], tuple[int, int]] = {}
+        self._db: Optional[Path] = None
+        self._pruned = 0
+        self._local_pruned = 0
+        self._local = threading.local()
+        if state_dir:
+            path = Path(state_dir)
+            path.mkdir(parents=True, exist_ok=True)
+            self._db = path / "quota.sqlite3"
+            self._connect().execute(
+                "CREATE TABLE IF NOT EXISTS usage ("
+                "scope TEXT NOT NULL, key TEXT NOT NULL, window INTEGER NOT NULL, "
+                "units INTEGER NOT NULL, PRIMARY KEY (scope, key, window))"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._db, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _window(self) -> int:
+        return int(time.time() // self.window)
+
+    def _shared(self, scope: str) -> bool:
+        return self._db is not None and scope != "session"
+
+    def usage(self, scope: str, key: str) -> int:
+        """Units used by a scope in the current window."""
+        window = self._window()
+        if self._shared(scope):
+            row = self._connect().execute(
+                "SELECT units FROM usage WHERE scope = ? AND key = ? AND window = ?",
+                (scope, key, window),
+            ).fetchone()
+            return row[0] if row else 0
+        start, units = self._usage.get((scope, key), (window, 0))
+        return units if start == window else 0
+
+    def _add(self, scope: str, key: str, units: int) -> None:
+        window = self._window()
+        if self._shared(scope):
+            conn = self._connect()
+            conn.execute(
+                "INSERT INTO usage (scope, key, window, units) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (scope, key, window) DO UPDATE SET units = units + excluded.units",
+                (scope, key, window, units),
+            )
+            if window != self._pruned:
+                conn.execute("DELETE FROM usage WHERE window < ?", (window,))
+                self._pruned = window
+            return
+        if window != self._local_pruned:
+            self._usage = {k: v for k, v in self._usage.items() if v[0] == window}
+            self._local_pruned = window
+        start, used = self._usage.get((scope, key), (window, 0))
+        self._usage[(scope, key)] = (window, (used if start == window else 0) + units)
+
+    def forget_session(self, session: str) -> None:
+        """Drop the usage of a session that has ended."""
+        self._usage.pop(("session", session), None)
+
+    def _scopes(self, tool: Optional[str]) -> list[tuple[str, str]]:
+        scopes = [("tenant", current_tenant.get())]
+        session = current_session.get()
+        if session is not None:
+            scopes.append(("session", session))
+        if tool is not None:
+            scopes.append(("tool", tool))
+        return scopes
+
+    def _check(self, scopes: list[tuple[str, str]], units: int) -> None:
+        """Raise if a scope cannot spend ``units`` more (0: is any budget spent)."""
+        for scope, key in scopes:
+            budget = budget_for(scope, key)
+            levels = [("hard", budget.hard)]
+            if units:
+                levels.append(("soft", budget.soft))
+            used = None
+            for level, limit in levels:
+                if limit is None:
+                    continue
+                if used is None:
+                    used = self.usage(scope, key)
+                if used + max(units, 1) <= limit:
+                    continue
+                metrics.inc("woosmap_quota_rejections_total", scope=scope, level=level)
+                message = (
+                    f"{scope.capitalize()} {key!r} has used {used} of its {level} budget "
+                    f"of {limit} units for this {self.window}s window"
+                )
+                if level == "soft":
+                    message += "; only cached results are available"
+                raise WoosmapQuotaExceededError(
+                    message,
+                    {"scope": scope, "key": key, "used": used, "budget": limit, "level": level},
+                )
+
+    def check(self, tool: Optional[str]) -> None:
+        """
+        Reject the call if a hard budget is spent.
+
+        Raises:
+            WoosmapQuotaExceededError: A scope of the current call is over its hard budget.
+        """
+        self._check(self._scopes(tool), 0)
+
+    def charge(self, endpoint: str, params: dict[str, Any], tool: Optional[str]) -> None:
+        """
+        Account for a request about to be sent upstream.
+
+        Raises:
+            WoosmapQuotaExceededError: The request would take a scope over its
+                soft (cache-only) or hard budget; nothing is charged.
+        """
+        scopes = self._scopes(tool)
+        units = request_units(endpoint, params)
+        self._check(scopes, units)
+        for scope, key in scopes:
+            budget = budget_for(scope, key)
+            # Usage only matters to budgets; metrics count everything else.
+            if budget.soft is not None or budget.hard is not None:
+                self._add(scope, key, units)
+        labels = {"tool": tool or "none", "tenant": current_tenant.get()}
+        metrics.inc("woosmap_quota_requests_total", **labels)
+        metrics.inc("woosmap_quota_units_total", units, **labels)
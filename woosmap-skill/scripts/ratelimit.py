@@ -0,0 +1,107 @@
+"""
+Token-bucket rate limiter for upstream Woosmap calls.
+
+Without a state directory the bucket lives in process memory. With one, the
+bucket is a single SQLite row that every worker process draws from, so
+running several workers does not multiply the request rate sent upstream.
+Its transactions can wait up to five seconds on another process's lock, so
+they run on a dedicated thread and the event loop keeps serving sessions.
+"""
+import asyncio
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+
+class RateLimiter:
+    """Limit upstream requests to ``rate`` per second with bursts of ``burst``."""
+
+    def __init__(self, rate: float, burst: int, state_dir: Optional[str] = None):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._db: Optional[Path] = None
+        self._local = threading.local()
+        self._db_thread: Optional[ThreadPoolExecutor] = None
+        if rate > 0 and state_dir:
+            path = Path(state_dir)
+            path.mkdir(parents=True, exist_ok=True)
+            self._db = path / "ratelimit.sqlite3"
+            # One thread: waiters queue behind each other instead of all
+            # retrying write transactions against the same lock.
+            self._db_thread = ThreadPoolExecutor(1, thread_name_prefix="woosmap-ratelimit")
+            conn = self._connect()
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS bucket ("
+                "name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            conn.execute(
+                "INSERT OR IGNORE INTO bucket (name, tokens, updated) VALUES ('upstream', ?, ?)",
+                (float(self.burst), time.time()),
+            )
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._db, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _refill(self, tokens: float, elapsed: float) -> float:
+        return min(float(self.burst), tokens + max(0.0, elapsed) * self.rate)
+
+    def _take_local(self) -> float:
+        now = time.monotonic()
+        self._tokens = self._refill(self._tokens, now - self._updated)
+        self._updated = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+    def _take_shared(self) -> float:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            tokens, updated = conn.execute(
+                "SELECT tokens, updated FROM bucket WHERE name = 'upstream'"
+            ).fetchone()
+            now = time.time()
+            tokens = self._refill(tokens, now - updated)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+            conn.execute(
+                "UPDATE bucket SET tokens = ?, updated = ? WHERE name = 'upstream'",
+                (tokens, now),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+    async def acquire(self) -> None:
+        """Wait until a token is available and consume it."""
+        if not self.enabled:
+            return
+        loop = asyncio.get_running_loop()
+        while True:
+            if self._db:
+                wait = await loop.run_in_executor(self._db_thread, self._take_shared)
+            else:
+                wait = self._take_local()
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
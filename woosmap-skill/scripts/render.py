@@ -0,0 +1,145 @@
+"""
+Rendering helpers for tool responses.
+
+Formatting a large upstream response (markdown summary plus an indented JSON
+dump) is CPU-bound and would stall every other session sharing the event
+loop. ``render`` runs small formatters inline and hands anything above
+``RENDER_OFFLOAD_THRESHOLD`` items to a worker pool.
+
+``fit_payload`` keeps a tool result within its payload budget, so a huge
+route or matrix does not turn into a multi-megabyte message.
+"""
+import asyncio
+import functools
+import json
+import os
+import re
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from metrics import Timer, metrics
+from models import to_builtins
+
+try:
+    import orjson
+except ImportError:  # optional, falls back to the stdlib encoder
+    orjson = None
+
+# Items (matrix elements, route steps, ...) above which rendering is offloaded.
+RENDER_OFFLOAD_THRESHOLD = int(os.getenv("WOOSMAP_RENDER_OFFLOAD_THRESHOLD", "200"))
+# "thread" keeps the loop responsive; "process" also spreads work across cores.
+RENDER_POOL = os.getenv("WOOSMAP_RENDER_POOL", "thread")
+RENDER_WORKERS = int(os.getenv("WOOSMAP_RENDER_WORKERS", "4"))
+# Largest text payload of a tool result in bytes (0: unlimited); per tool with
+# WOOSMAP_PAYLOAD_BUDGET_<TOOL_NAME>.
+DEFAULT_PAYLOAD_BUDGET = int(os.getenv("WOOSMAP_PAYLOAD_BUDGET", str(256 * 1024)))
+
+# Heading of the raw response (or parsed fields) dump that tools append to
+# their summary; the group is its label.
+_RAW_HEADING = re.compile(r"\n\n(?:---\n\n)?\*\*(Raw[\w ]*|Parsed fields)\b[^\n]*\n")
+
+_executor: Optional[Executor] = None
+
+
+def dumps(obj: Any, indent: bool = False) -> str:
+    """Serialize to JSON, using orjson when it is installed."""
+    if orjson is not None:
+        try:
+            option = orjson.OPT_INDENT_2 if indent else 0
+            return orjson.dumps(obj, option=option).decode()
+        except TypeError:
+            pass
+    if indent:
+        return json.dumps(obj, indent=2, default=to_builtins)
+    return json.dumps(obj, separators=(",", ":"), default=to_builtins)
+
+
+def _get_executor() -> Executor:
+    global _executor
+    if _executor is None:
+        if RENDER_POOL == "process":
+            _executor = ProcessPoolExecutor(max_workers=RENDER_WORKERS)
+        else:
+            _executor = ThreadPoolExecutor(
+                max_workers=RENDER_WORKERS, thread_name_prefix="render"
+            )
+    return _executor
+
+
+async def render(formatter: Callable[..., str], *args: Any, weight: int = 0) -> str:
+    """
+    Run ``formatter(*args)``, offloading it when ``weight`` is large.
+
+    Args:
+        formatter: Module-level function building the response text (it must
+            be picklable when the process pool is used).
+        *args: Arguments passed to the formatter.
+        weight: Cheap size estimate of the payload, e.g. matrix elements.
+    """
+    if weight < RENDER_OFFLOAD_THRESHOLD:
+        with Timer("woosmap_render_seconds", "render", offloaded="false"):
+            return formatter(*args)
+
+    loop = asyncio.get_running_loop()
+    with Timer("woosmap_render_seconds", "render", offloaded="true"):
+        return await loop.run_in_executor(
+            _get_executor(), functools.partial(formatter, *args)
+        )
+
+
+def payload_budget(tool_name: str) -> int:
+    """Payload budget of a tool in bytes, 0 for unlimited."""
+    return int(os.getenv(f"WOOSMAP_PAYLOAD_BUDGET_{tool_name.upper()}", DEFAULT_PAYLOAD_BUDGET))
+
+
+def _fit_text(text: str, budget: int) -> tuple[str, Optional[str]]:
+    """Shorten one text to ``budget`` bytes; returns it and how it was cut."""
+    size = len(text.encode())
+    if size <= budget:
+        return text, None
+    headings = list(_RAW_HEADING.finditer(text))
+    if headings:
+        # The raw dump repeats the summary; drop it first.
+        summary = text[:headings[-1].start()]
+        note = (
+            f"\n\n_{headings[-1].group(1)} omitted: the result is {size // 1024} KiB, "
+            f"over the {budget // 1024} KiB payload budget._"
+        )
+        if len((summary + note).encode()) <= budget:
+            return summary + note, "raw"
+        text = summary
+    note = f"\n\n_Truncated: the result is {size // 1024} KiB, over the {budget // 1024} KiB payload budget._"
+    head = text.encode()[:max(0, budget - len(note.encode()))].decode(errors="ignore")
+    # Cut at a line boundary so no entry is left half written.
+    if "\n" in head:
+        head = head[:head.rindex("\n")]
+    return head + note, "cut"
+
+
+def fit_payload(result: Any, tool_name: str) -> Any:
+    """
+    Keep the text of a tool result within the tool's payload budget.
+
+    The raw response dump that follows the summary is dropped first; if
+    that is not enough the text is cut at a line boundary. Either way a note
+    says so. Payload sizes are observed in ``woosmap_tool_payload_bytes``.
+    """
+    if not isinstance(result, dict) or not isinstance(result.get("content"), list):
+        return result
+    texts = [item for item in result["content"] if isinstance(item, dict) and item.get("type") == "text"]
+    size = sum(len(item.get("text", "").encode()) for item in texts)
+    metrics.observe("woosmap_tool_payload_bytes", size, tool=tool_name)
+    budget = payload_budget(tool_name)
+    if not budget or size <= budget:
+        return result
+    content = []
+    for item in result["content"]:
+        if isinstance(item, dict) and item.get("type") == "text":
+            # Share the budget in proportion to each text's size.
+            share = budget * len(item.get("text", "").encode()) // size
+            text, how = _fit_text(item.get("text", ""), share)
+            if how is not None:
+                metrics.inc("woosmap_tool_payload_truncated_total", tool=tool_name, how=how)
+            item = {**item, "text": text}
+        content.append(item)
+    return {**result, "content": content}
@@ -1,24 +1,57 @@
 """
 HTTP-enabled MCP server for Web Claude deployment
 """
-from fastapi import FastAPI
+import asyncio
+import hmac
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from mcp.server.sse import SseServerTransport
+from starlette.responses import JSONResponse, PlainTextResponse, Response
 import uvicorn
 import logging
+import os
 
 # Import the MCP instance and tools
-from core import mcp
+from core import close_http_client, mcp, response_cache
 import localities  # noqa
 import distance  # noqa
 import transit  # noqa
+import stores  # noqa
+from compression import COMPRESS_ENABLED, CompressionMiddleware
+from metrics import metrics, start_loop_monitor
+from profiling import PROFILE_MAX_SECONDS, sample_stacks, trace_allocations
+from watchdog import watchdog
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8000"))
+WORKERS = int(os.getenv("WOOSMAP_WORKERS", os.getenv("WEB_CONCURRENCY", "1")))
+
+# Set by the multi-worker launcher. Each worker advertises its own message
+# path so the front proxy can route an SSE session's POSTs back to it.
+WORKER_ID = os.getenv("WOOSMAP_WORKER_ID")
+MESSAGE_PATH = f"/w{WORKER_ID}/messages/" if WORKER_ID else "/messages/"
+
+# Bearer token of the /admin endpoints; they are disabled when unset.
+ADMIN_TOKEN = os.getenv("WOOSMAP_ADMIN_TOKEN", "")
+
+# One profile at a time: samplers would otherwise profile each other.
+_profile_lock = asyncio.Lock()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    start_loop_monitor()
+    watchdog.start()
+    yield
+    await close_http_client()
+    response_cache.flush_hits()
+
 # Create FastAPI app
-app = FastAPI(title="Woosmap MCP Server", version="1.0.0")
+app = FastAPI(title="Woosmap MCP Server", version="1.0.0", lifespan=lifespan)
 
 # Enable CORS for web Claude
 app.add_middleware(
@@ -33,6 +66,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress responses and the SSE stream for clients that accept it.
+if COMPRESS_ENABLED:
+    app.add_middleware(CompressionMiddleware)
+
+sse = SseServerTransport(MESSAGE_PATH)
+
 @app.get("/")
 async def root():
     """Health check endpoint"""
@@ -46,23 +85,86 @@ async def root():
 @app.get("/health")
 async def health():
     """Health check for monitoring"""
-    return {"status": "healthy"}
+    return {
+        "status": "saturated" if watchdog.saturated else "healthy",
+        "worker": WORKER_ID,
+        "sessions": watchdog.sessions,
+    }
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus metrics (upstream calls, cache, render time, loop lag)"""
+    return PlainTextResponse(metrics.render())
+
+def _check_admin(request: Request) -> None:
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404)
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, headers={"WWW-Authenticate": "Bearer"})
+
+@app.get("/admin/profile")
+async def profile_endpoint(
+    request: Request,
+    seconds: float = 10,
+    mode: str = "cpu",
+    interval_ms: float = 5,
+    idle: bool = False,
+):
+    """
+    Profile this worker for a few seconds (requires WOOSMAP_ADMIN_TOKEN).
+
+    ``mode=cpu`` samples the event-loop thread's stack every ``interval_ms``;
+    ``mode=memory`` reports allocations still held at the end of the window.
+    The output is collapsed stacks for flamegraph.pl or speedscope.
+    """
+    _check_admin(request)
+    if not 0 < seconds <= PROFILE_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be in (0, {PROFILE_MAX_SECONDS:g}]")
+    if mode not in ("cpu", "memory"):
+        raise HTTPException(status_code=400, detail="mode must be cpu or memory")
+    if _profile_lock.locked():
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    async with _profile_lock:
+        logger.info(f"Running a {seconds:g}s {mode} profile")
+        if mode == "cpu":
+            stacks = await sample_stacks(seconds, max(interval_ms, 1) / 1000, idle)
+        else:
+            stacks = await trace_allocations(seconds)
+    return PlainTextResponse(stacks)
 
 @app.get("/sse")
-async def sse_endpoint():
+async def sse_endpoint(request: Request):
     """
     SSE endpoint for MCP protocol over HTTP.
     This is what web Claude connects to.
     """
+    if not watchdog.admit():
+        logger.warning(f"SSE connection refused: {watchdog.reason}")
+        return JSONResponse(
+            {"error": "server saturated", "reason": watchdog.reason},
+            status_code=503,
+            headers={"Retry-After": "5"},
+        )
     logger.info("SSE connection initiated")
-    async with SseServerTransport("/messages") as transport:
-        await mcp.run(transport=transport)
+    with watchdog.session():
+        async with sse.connect_sse(request.scope, request.receive, request._send) as streams:
+            server = mcp._mcp_server
+            await server.run(streams[0], streams[1], server.create_initialization_options())
+    return Response()
+
+app.mount(MESSAGE_PATH, app=sse.handle_post_message)
 
 if __name__ == "__main__":
-    # Run the server
-    uvicorn.run(
-        app,
-        host="0.0.0.0",
-        port=8000,
-        log_level="info"
-    )
+    if WORKERS > 1:
+        from workers import serve_workers
+
+        serve_workers(WORKERS, HOST, PORT)
+    else:
+        # Run the server
+        uvicorn.run(
+            app,
+            host=HOST,
+            port=PORT,
+            log_level="info"
+        )
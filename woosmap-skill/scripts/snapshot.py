@@ -0,0 +1,291 @@
+"""
+Read-only cache snapshots.
+
+A snapshot holds hot, long-lived responses (geocodes, place details) taken
+from the shared disk cache tier of a running deployment, so a fresh install
+answers common requests without paying for them again:
+
+    python snapshot.py export --state-dir /var/lib/woosmap --out cache.snapshot
+    python snapshot.py info cache.snapshot
+    python snapshot.py import cache.snapshot --state-dir /var/lib/woosmap
+
+The file is memory-mapped at startup (``WOOSMAP_CACHE_SNAPSHOT``, by default
+``cache.snapshot`` next to this module) and consulted after the memory and
+disk tiers. Layout, little-endian:
+
+- header: magic, format version, creation time, entry count, metadata and
+  dictionary sizes, offset of the value data;
+- metadata (JSON) and a zlib preset dictionary sampled from the values;
+- index: (SHA-1 cache key, value offset, value length, TTL, fetch time)
+  records sorted by key, searched by bisection without being loaded;
+- values: compact JSON, each raw-deflated on its own with the dictionary, so
+  any entry can be read without inflating the others.
+
+An entry expires at its fetch time plus its TTL, in the snapshot as in the
+cache it came from; ``snapshot.py import`` keeps that expiry. The TTL is the
+cache lifetime of the endpoint unless ``WOOSMAP_CACHE_SNAPSHOT_TTLS`` set a
+longer one for it when the response was cached (see cache.py).
+"""
+import argparse
+import bisect
+import json
+import mmap
+import os
+import sqlite3
+import struct
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Iterable, Optional
+
+MAGIC = b"WMCS"
+FORMAT_VERSION = 2
+_HEADER = struct.Struct("<4sHHdIIIQ")  # magic, version, flags, created, count, meta, zdict, data offset
+_ENTRY = struct.Struct("<20sQIId")  # key, offset, length, ttl, fetched
+# zlib only uses the last 32 KiB of a preset dictionary.
+ZDICT_SIZE = 32 * 1024
+# Fewer, longer samples capture the shared structure of JSON responses best.
+ZDICT_SAMPLES = 32
+ZDICT_SAMPLE_SIZE = 4096
+
+DEFAULT_MIN_TTL = 24 * 3600
+DEFAULT_MAX_ENTRIES = 50_000
+DEFAULT_MAX_AGE = 30 * 24 * 3600
+
+
+class SnapshotError(Exception):
+    """Unreadable or incompatible snapshot file."""
+
+
+class _Keys:
+    """Sequence view of the sorted index keys, for bisect."""
+
+    __slots__ = ("_index", "_count")
+
+    def __init__(self, index: memoryview, count: int):
+        self._index = index
+        self._count = count
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, i: int) -> bytes:
+        start = i * _ENTRY.size
+        return self._index[start:start + 20].tobytes()
+
+
+class SnapshotTier:
+    """Memory-mapped, read-only cache tier."""
+
+    def __init__(self, path: Path, max_age: float = DEFAULT_MAX_AGE):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            try:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError as e:  # empty file
+                raise SnapshotError(f"{self.path} is empty") from e
+        view = memoryview(self._mmap)
+        if len(view) < _HEADER.size:
+            raise SnapshotError(f"{self.path} is truncated")
+        magic, version, _, created, count, meta_len, zdict_len, data_offset = _HEADER.unpack_from(view)
+        if magic != MAGIC:
+            raise SnapshotError(f"{self.path} is not a cache snapshot")
+        if version != FORMAT_VERSION:
+            raise SnapshotError(f"{self.path} has format {version}, expected {FORMAT_VERSION}")
+        index_offset = _HEADER.size + meta_len + zdict_len
+        if index_offset + count * _ENTRY.size != data_offset or data_offset > len(view):
+            raise SnapshotError(f"{self.path} is truncated")
+
+        self.created = created
+        self.expires = created + max_age
+        self.meta = json.loads(bytes(view[_HEADER.size:_HEADER.size + meta_len]))
+        self._zdict = bytes(view[_HEADER.size + meta_len:index_offset])
+        self._view = view
+        self._index = view[index_offset:data_offset]
+        self._data_offset = data_offset
+        self._keys = _Keys(self._index, count)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def get(self, key: str) -> Optional[tuple[float, Any]]:
+        """Return (expiry, value) of a cache key, or None once it has expired."""
+        now = time.time()
+        if now > self.expires:
+            return None
+        try:
+            raw = bytes.fromhex(key)
+        except ValueError:
+            return None
+        i = bisect.bisect_left(self._keys, raw)
+        if i == len(self._keys) or self._keys[i] != raw:
+            return None
+        _, offset, length, ttl, fetched = _ENTRY.unpack_from(self._index, i * _ENTRY.size)
+        if fetched + ttl < now:
+            return None
+        return fetched + ttl, json.loads(self._value(offset, length))
+
+    def items(self) -> Iterable[tuple[str, int, float, bytes]]:
+        """Yield (key, ttl, fetch time, JSON value) of every unexpired entry."""
+        now = time.time()
+        for i in range(len(self._keys)):
+            key, offset, length, ttl, fetched = _ENTRY.unpack_from(self._index, i * _ENTRY.size)
+            if fetched + ttl >= now:
+                yield key.hex(), ttl, fetched, self._value(offset, length)
+
+    def _value(self, offset: int, length: int) -> bytes:
+        start = self._data_offset + offset
+        inflater = zlib.decompressobj(-15, zdict=self._zdict)
+        return inflater.decompress(self._view[start:start + length]) + inflater.flush()
+
+
+def _build_zdict(values: list[bytes]) -> bytes:
+    """Preset dictionary: samples of the values, most frequent last."""
+    if not values:
+        return b""
+    step = max(1, len(values) // ZDICT_SAMPLES)
+    samples = values[::step][:ZDICT_SAMPLES]
+    per_sample = max(ZDICT_SAMPLE_SIZE, ZDICT_SIZE // len(samples))
+    # Entries are ordered hottest first; zlib favours the end of the dictionary.
+    return b"".join(sample[:per_sample] for sample in reversed(samples))[-ZDICT_SIZE:]
+
+
+def write_snapshot(
+    path: Path, entries: list[tuple[str, int, float, bytes]], meta: Optional[dict[str, Any]] = None
+) -> int:
+    """
+    Write a snapshot atomically.
+
+    Args:
+        path: Output file
+        entries: (cache key, ttl, fetch time, JSON value) tuples, hottest first
+        meta: Extra metadata stored in the file
+
+    Returns:
+        Size of the file in bytes
+    """
+    path = Path(path)
+    zdict = _build_zdict([value for _, _, _, value in entries])
+    records, data, offset = [], [], 0
+    for key, ttl, fetched, value in entries:
+        deflater = zlib.compressobj(9, zlib.DEFLATED, -15, zdict=zdict) if zdict else \
+            zlib.compressobj(9, zlib.DEFLATED, -15)
+        compressed = deflater.compress(value) + deflater.flush()
+        records.append((bytes.fromhex(key), offset, len(compressed), ttl, fetched))
+        data.append(compressed)
+        offset += len(compressed)
+    order = sorted(range(len(records)), key=lambda i: records[i][0])
+
+    created = time.time()
+    meta_bytes = json.dumps({
+        "entries": len(records),
+        "raw_bytes": sum(len(value) for _, _, _, value in entries),
+        **(meta or {}),
+    }).encode()
+    data_offset = _HEADER.size + len(meta_bytes) + len(zdict) + len(records) * _ENTRY.size
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(
+            MAGIC, FORMAT_VERSION, 0, created, len(records), len(meta_bytes), len(zdict), data_offset
+        ))
+        f.write(meta_bytes)
+        f.write(zdict)
+        for i in order:
+            f.write(_ENTRY.pack(*records[i]))
+        for chunk in data:
+            f.write(chunk)
+    os.replace(tmp, path)
+    return path.stat().st_size
+
+
+def export_disk_tier(
+    db_path: Path,
+    out: Path,
+    min_ttl: int = DEFAULT_MIN_TTL,
+    max_entries: int = DEFAULT_MAX_ENTRIES,
+    max_age: float = DEFAULT_MAX_AGE,
+) -> tuple[int, int]:
+    """
+    Snapshot the most used long-lived entries of a disk cache tier.
+
+    Entries with a snapshot lifetime of at least ``min_ttl``, fetched within
+    ``max_age`` seconds and not yet expired are exported, most hits first.
+    An entry's lifetime is its snapshot TTL if one was set, else its cache TTL.
+
+    Returns:
+        (entries written, file size in bytes)
+    """
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    now = time.time()
+    try:
+        rows = conn.execute(
+            "SELECT key, life, fetched, value FROM ("
+            "SELECT key, COALESCE(snapshot_ttl, ttl) AS life, expires - ttl AS fetched, "
+            "value, hits, expires FROM cache) "
+            "WHERE life >= ? AND fetched >= ? AND fetched + life > ? "
+            "ORDER BY hits DESC, expires DESC LIMIT ?",
+            (min_ttl, now - max_age, now, max_entries),
+        ).fetchall()
+    except sqlite3.OperationalError as e:
+        raise SnapshotError(f"{db_path} has no hit statistics to export from: {e}") from e
+    finally:
+        conn.close()
+    entries = [(key, int(life), fetched, bytes(value)) for key, life, fetched, value in rows]
+    size = write_snapshot(out, entries, {"min_ttl": min_ttl, "source": str(db_path)})
+    return len(entries), size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export, inspect and import cache snapshots")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="Snapshot the hot entries of a disk cache tier")
+    export.add_argument("--state-dir", required=True, help="WOOSMAP_STATE_DIR of the source deployment")
+    export.add_argument("--out", required=True, help="Snapshot file to write")
+    export.add_argument("--min-ttl", type=int, default=DEFAULT_MIN_TTL,
+                        help="Only entries cached at least this long, in seconds (default: one day)")
+    export.add_argument("--max-entries", type=int, default=DEFAULT_MAX_ENTRIES)
+    export.add_argument("--max-age", type=float, default=DEFAULT_MAX_AGE,
+                        help="Skip entries fetched longer ago than this, in seconds (default: 30 days)")
+
+    info = commands.add_parser("info", help="Describe a snapshot")
+    info.add_argument("snapshot")
+
+    load = commands.add_parser("import", help="Copy a snapshot into a disk cache tier")
+    load.add_argument("snapshot")
+    load.add_argument("--state-dir", required=True)
+
+    args = parser.parse_args()
+
+    if args.command == "export":
+        count, size = export_disk_tier(
+            Path(args.state_dir) / "cache.sqlite3", Path(args.out),
+            args.min_ttl, args.max_entries, args.max_age,
+        )
+        print(f"Exported {count} entries to {args.out} ({size / 1024:.0f} KiB)")
+    elif args.command == "info":
+        tier = SnapshotTier(Path(args.snapshot), max_age=float("inf"))
+        size = tier.path.stat().st_size
+        raw = tier.meta.get("raw_bytes", 0)
+        print(f"{tier.path}: {len(tier)} entries, {size / 1024:.0f} KiB "
+              f"({raw / max(size, 1):.1f}x smaller than the JSON values)")
+        print(f"created {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(tier.created))}")
+        print(json.dumps(tier.meta, indent=2))
+    else:
+        from cache import DiskTier
+
+        tier = SnapshotTier(Path(args.snapshot))
+        state_dir = Path(args.state_dir)
+        state_dir.mkdir(parents=True, exist_ok=True)
+        disk = DiskTier(state_dir / "cache.sqlite3")
+        count = 0
+        # Expired entries are skipped and the others keep their expiry. The
+        # snapshot lifetime becomes the TTL, so fetched = expires - ttl holds.
+        for key, ttl, fetched, value in tier.items():
+            disk.set(key, json.loads(value), fetched + ttl, ttl, ttl)
+            count += 1
+        print(f"Imported {count} entries into {state_dir / 'cache.sqlite3'}")
+
+
+if __name__ == "__main__":
+    main()
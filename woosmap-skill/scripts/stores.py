@@ -0,0 +1,191 @@
+import asyncio
+import json
+import os
+from typing import Any, Dict, Optional
+import logging
+
+from mcp.server.fastmcp import Context
+
+from core import make_woosmap_request, tool
+from datasets import Dataset, get_dataset, registered
+from distance import fetch_distance_matrix
+from exceptions import WoosmapBadRequestError, WoosmapError, WoosmapNotFoundError
+from geo import LatLngTuple, parse_latlng
+from models import GeocodeResponse
+from render import render
+
+logger = logging.getLogger(__name__)
+
+# Stores pre-ranked by straight-line distance and sent to the Distance Matrix API.
+STORE_CANDIDATES = int(os.getenv("WOOSMAP_STORE_CANDIDATES", "25"))
+
+
+def _error_response(error: WoosmapError, context: dict[str, Any]) -> dict[str, Any]:
+    """Format a WoosmapError into a proper MCP response."""
+    return {
+        "content": [
+            {
+                "type": "text",
+                "text": f"### Error\n\n**{error.__class__.__name__}**: {error.message}\n\n"
+                f"**Details:** {json.dumps({**error.details, **context}, indent=2)}",
+            }
+        ]
+    }
+
+
+def _as_latlng(value: str) -> Optional[LatLngTuple]:
+    """Return ``value`` as coordinates if it is a "lat,lng" string."""
+    try:
+        lat, lng = parse_latlng(value)
+    except ValueError:
+        return None
+    return (lat, lng) if -90 <= lat <= 90 and -180 <= lng <= 180 else None
+
+
+async def _locate(
+    address: str, language: str, components: Optional[str]
+) -> tuple[LatLngTuple, str]:
+    """Coordinates and label of an address, geocoded unless already "lat,lng"."""
+    point = _as_latlng(address)
+    if point is not None:
+        return point, address
+    params: Dict[str, Any] = {"address": address}
+    if language:
+        params["language"] = language
+    if components:
+        params["components"] = components
+    data = await make_woosmap_request(
+        "localities/geocode", params, fields={"results": 1}, model=GeocodeResponse
+    )
+    top = data.results[0] if data.results else None
+    location = top.location if top is not None else None
+    if location is None or location.lat is None or location.lng is None:
+        raise WoosmapNotFoundError(f"No geocoding result for {address!r}")
+    return (location.lat, location.lng), top.formatted_address or address
+
+
+def _format_stores(
+    dataset: Dataset,
+    origin: LatLngTuple,
+    label: str,
+    ranked: list[tuple[int, Optional[int], Optional[int], float]],
+    rank_by: str,
+    mode: str,
+    searched: int,
+) -> str:
+    """Build the ranked table of nearest stores."""
+    lines = [
+        f"**From:** {label} ({origin[0]:.6f},{origin[1]:.6f})",
+        f"**Dataset:** {dataset.name} ({len(dataset)} points, "
+        f"{searched} nearest as the crow flies compared by {mode} {rank_by})",
+        "",
+        "| # | Name | Id | Location | Travel time | Road distance | Straight line |",
+        "|---|---|---|---|---|---|---|",
+    ]
+    for n, (i, distance, duration, crow) in enumerate(ranked, 1):
+        lat, lng = dataset.point(i)
+        travel = f"{round(duration / 60)} min ({duration} sec)" if duration is not None else "n/a"
+        road = f"{distance / 1000:.1f} km" if distance is not None else "n/a"
+        lines.append(
+            f"| {n} | {dataset.names[i]} | {dataset.ids[i]} | {lat:.6f},{lng:.6f} "
+            f"| {travel} | {road} | {crow / 1000:.1f} km |"
+        )
+    return "### Nearest Stores\n\n" + "\n".join(lines)
+
+
+@tool()
+async def find_nearest_stores(
+    address: str,
+    dataset: str,
+    language: str,
+    k: int = 3,
+    mode: Optional[str] = None,
+    rank_by: str = "duration",
+    components: Optional[str] = None,
+    departure_time: Optional[str] = None,
+    ctx: Optional[Context] = None,
+) -> Dict[str, Any]:
+    """
+    Find the stores of a registered dataset closest to an address by travel time,
+    using Woosmap Geocode and Distance Matrix APIs.
+
+    Geocodes the address, pre-selects the nearest stores as the crow flies and
+    ranks them by road travel time (or distance) in a single call. Use this
+    instead of geocode_locality followed by get_distance_matrix.
+
+    Args:
+        address: Address to search from, or "lat,lng".
+        dataset: Name of a registered store dataset (see list_datasets).
+        language: Request language (ISO code).
+        k: Number of stores to return, from 1 to WOOSMAP_STORE_CANDIDATES (25 by default).
+        mode: Travel mode ("driving", "walking", "cycling"), driving by default.
+        rank_by: "duration" or "distance".
+        components: Optional component filters for geocoding (e.g. "country:FR").
+        departure_time: "now" or timestamp for traffic-aware durations.
+    """
+    try:
+        if rank_by not in ("duration", "distance"):
+            raise WoosmapBadRequestError('rank_by must be "duration" or "distance"')
+        if not 1 <= k <= STORE_CANDIDATES:
+            raise WoosmapBadRequestError(f"k must be between 1 and {STORE_CANDIDATES}")
+        # The first load reads the whole file: keep it off the event loop.
+        points = await asyncio.to_thread(get_dataset, dataset)
+        origin, label = await _locate(address, language, components)
+
+        candidates = points.nearest(origin, STORE_CANDIDATES)
+        if not candidates:
+            raise WoosmapNotFoundError(f"Dataset {dataset!r} has no points")
+
+        params: Dict[str, Any] = {"mode": mode or "driving"}
+        if language:
+            params["language"] = language
+        if departure_time:
+            params["departure_time"] = departure_time
+        destinations = [f"{lat},{lng}" for lat, lng in (points.point(i) for i, _ in candidates)]
+        matrix = await fetch_distance_matrix(
+            [f"{origin[0]},{origin[1]}"], destinations, params, ctx
+        )
+
+        ranked = []
+        for j, _ in matrix.nearest(0, k, rank_by):
+            _, distance, duration = matrix.element(0, j)
+            i, crow = candidates[j]
+            ranked.append((i, distance, duration, crow))
+        if not ranked:
+            # No road values at all: fall back to the straight-line ranking.
+            ranked = [(i, None, None, crow) for i, crow in candidates[:k]]
+
+        text = await render(
+            _format_stores, points, origin, label, ranked, rank_by,
+            params["mode"], len(candidates),
+        )
+        return {"content": [{"type": "text", "text": text}]}
+
+    except WoosmapError as e:
+        logger.error(f"Store search failed: {e.message}")
+        return _error_response(e, {"address": address, "dataset": dataset})
+
+
+@tool()
+async def list_datasets() -> Dict[str, Any]:
+    """
+    List the local store datasets available to find_nearest_stores.
+    """
+    datasets = registered()
+    if not datasets:
+        return {
+            "content": [
+                {
+                    "type": "text",
+                    "text": "No datasets registered. Set WOOSMAP_DATASETS to name=path pairs.",
+                }
+            ]
+        }
+    lines = []
+    for name, path in sorted(datasets.items()):
+        try:
+            size = f"{len(await asyncio.to_thread(get_dataset, name))} points"
+        except WoosmapError as e:
+            size = f"unavailable ({e.message})"
+        lines.append(f"- **{name}**: {size} ({path.name})")
+    return {"content": [{"type": "text", "text": "### Datasets\n\n" + "\n".join(lines)}]}
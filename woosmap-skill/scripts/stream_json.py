@@ -0,0 +1,195 @@
+"""
+Incremental parsing of upstream JSON bodies.
+
+Most tools only look at a few top-level fields of a response, often just the
+first items of one array. A ``fields`` projection maps each top-level key to
+keep onto ``None`` (keep the whole value) or an item limit (keep the first N
+items of an array).
+
+With ijson installed the body is parsed as it arrives, only projected values
+are built, and reading stops once every projected field has been seen.
+Without it the body is buffered and the projection is applied after a
+regular parse. Both paths enforce a maximum body size.
+"""
+import json
+from typing import Any, AsyncIterator, Optional
+
+from exceptions import WoosmapResponseTooLargeError
+
+try:
+    import ijson
+except ImportError:  # optional, falls back to buffered parsing
+    ijson = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+Fields = dict[str, Optional[int]]
+
+_OPEN = ("start_map", "start_array")
+_CLOSE = ("end_map", "end_array")
+
+
+def project(data: Any, fields: Optional[Fields]) -> Any:
+    """Apply a projection to an already parsed response."""
+    if not fields or not isinstance(data, dict):
+        return data
+    out = {}
+    for key, limit in fields.items():
+        if key in data:
+            value = data[key]
+            out[key] = value[:limit] if limit is not None and isinstance(value, list) else value
+    return out
+
+
+class _Projector:
+    """Build the projected response from a stream of ijson events."""
+
+    def __init__(self, fields: Fields):
+        self.fields = fields
+        self.result: dict[str, Any] = {}
+        self.remaining = set(fields)
+        self.depth = 0
+        self.key: Optional[str] = None
+        self.builder = None
+        self.items: Optional[list] = None
+        self.item_builder = None
+
+    @property
+    def complete(self) -> bool:
+        return not self.remaining
+
+    def _done(self, key: str) -> None:
+        self.remaining.discard(key)
+
+    def feed(self, event: str, value: Any) -> None:
+        if event in _CLOSE:
+            self.depth -= 1
+        level = self.depth
+        if event in _OPEN:
+            self.depth += 1
+
+        if level == 0:
+            return
+        if level == 1:
+            if event == "map_key":
+                self.key = value
+                return
+            self._feed_value(event, value)
+            return
+        if self.builder is not None:
+            self.builder.event(event, value)
+        elif self.items is not None:
+            self._feed_item(event, value, level)
+
+    def _feed_value(self, event: str, value: Any) -> None:
+        key = self.key
+        if key not in self.fields:
+            return
+        if event in _CLOSE:
+            if self.builder is not None:
+                self.builder.event(event, value)
+                self.result[key] = self.builder.value
+                self.builder = None
+            self.items = None
+            self._done(key)
+        elif event == "start_array" and self.fields[key] is not None:
+            self.items = self.result[key] = []
+            if not self.fields[key]:
+                self._done(key)
+        elif event in _OPEN:
+            self.builder = ijson.ObjectBuilder()
+            self.builder.event(event, value)
+        else:
+            self.result[key] = value
+            self._done(key)
+
+    def _feed_item(self, event: str, value: Any, level: int) -> None:
+        limit = self.fields[self.key]
+        if level > 2:
+            if self.item_builder is not None:
+                self.item_builder.event(event, value)
+            return
+        if event in _OPEN:
+            if len(self.items) < limit:
+                self.item_builder = ijson.ObjectBuilder()
+                self.item_builder.event(event, value)
+        elif event in _CLOSE:
+            if self.item_builder is not None:
+                self.item_builder.event(event, value)
+                self.items.append(self.item_builder.value)
+                self.item_builder = None
+        elif len(self.items) < limit:
+            self.items.append(value)
+        if len(self.items) >= limit:
+            # Later items are skipped; nothing more is needed from this array.
+            self._done(self.key)
+
+
+def _too_large(max_bytes: int) -> WoosmapResponseTooLargeError:
+    return WoosmapResponseTooLargeError(
+        f"Response body exceeds {max_bytes} bytes",
+        details={"max_bytes": max_bytes},
+    )
+
+
+def _loads(body: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+
+async def read_body(chunks: AsyncIterator[bytes], max_bytes: int = 0) -> bytes:
+    """Buffer a body from an async byte stream, enforcing ``max_bytes``."""
+    buf = bytearray()
+    async for chunk in chunks:
+        buf += chunk
+        if max_bytes and len(buf) > max_bytes:
+            raise _too_large(max_bytes)
+    return bytes(buf)
+
+
+async def read_json(
+    chunks: AsyncIterator[bytes],
+    fields: Optional[Fields] = None,
+    max_bytes: int = 0,
+) -> tuple[Any, int]:
+    """
+    Parse a JSON body from an async byte stream.
+
+    Args:
+        chunks: Body chunks, e.g. ``httpx.Response.aiter_bytes()``.
+        fields: Optional top-level projection (see module docstring).
+        max_bytes: Maximum number of bytes to read, 0 for no limit.
+
+    Returns:
+        The parsed (projected) value and the number of bytes read.
+
+    Raises:
+        WoosmapResponseTooLargeError: The body is larger than ``max_bytes``.
+    """
+    read = 0
+    if fields and ijson is not None:
+        events = ijson.sendable_list()
+        parser = ijson.parse_coro(events, use_float=True)
+        projector = _Projector(fields)
+        async for chunk in chunks:
+            read += len(chunk)
+            if max_bytes and read > max_bytes:
+                raise _too_large(max_bytes)
+            parser.send(chunk)
+            for _, event, value in events:
+                projector.feed(event, value)
+            events.clear()
+            if projector.complete:
+                # Everything requested has been seen; skip the rest of the body.
+                return projector.result, read
+        parser.close()
+        for _, event, value in events:
+            projector.feed(event, value)
+        return projector.result, read
+
+    body = await read_body(chunks, max_bytes)
+    return project(_loads(body), fields), len(body)
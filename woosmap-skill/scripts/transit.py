@@ -1,12 +1,24 @@
 import json
+import os
+import re
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
 from typing import Any, Dict, List, Optional
 import logging
 
-from core import mcp, make_woosmap_request
-from exceptions import WoosmapError
+from mcp.server.fastmcp import Context
+
+from batching import run_batch
+from core import make_woosmap_request, tool
+from models import TransitResponse, TransitRoute
+from exceptions import WoosmapBadRequestError, WoosmapError
+from render import dumps, render
 
 logger = logging.getLogger(__name__)
 
+# Most Transit Route requests a single departure sweep may send.
+TRANSIT_SWEEP_MAX_REQUESTS = int(os.getenv("WOOSMAP_TRANSIT_SWEEP_MAX_REQUESTS", "60"))
+
 
 def _error_response(error: WoosmapError, context: dict[str, Any]) -> dict[str, Any]:
     """Format a WoosmapError into a proper MCP response."""
@@ -21,7 +33,38 @@ def _error_response(error: WoosmapError, context: dict[str, Any]) -> dict[str, A
     }
 
 
-@mcp.tool()
+def _format_transit(data: TransitResponse, origin: str, destination: str) -> str:
+    """Build the markdown summary of a transit route response."""
+    # Use first route
+    route = data.routes[0]
+
+    lines = [
+        f"**Status:** {data.status}",
+        f"**Origin:** {origin}",
+        f"**Destination:** {destination}",
+        "",
+        "### Transit Itinerary",
+    ]
+
+    for leg in route.legs:
+        for step in leg.steps:
+            travel_mode = step.travel_mode or "UNKNOWN"
+            instruction = step.html_instructions or ""
+            lines.append(f"- **{travel_mode}**: {instruction}")
+
+    lines.append("")
+    lines.append(f"**Total distance:** {route.distance} m")
+    lines.append(f"**Total duration:** {route.legs_duration} sec")
+
+    return (
+        "### Transit Route Summary\n\n"
+        + "\n".join(lines)
+        + "\n\n---\n\n"
+        "**Parsed fields:**\n" + dumps(data, indent=True)
+    )
+
+
+@tool()
 async def get_transit_route(
     origin: str,
     destination: str,
@@ -69,70 +112,287 @@ async def get_transit_route(
         data = await make_woosmap_request(
             "transit/route",
             params,
+            model=TransitResponse,
         )
 
-        status = data.get("status", "UNKNOWN")
-        routes = data.get("routes", [])
-
-        if not routes:
+        if not data.routes:
             return {
                 "content": [
                     {
                         "type": "text",
-                        "text": f"No transit route found. Status: {status}",
+                        "text": f"No transit route found. Status: {data.status}",
                     }
                 ]
             }
 
-        # Use first route
-        route = routes[0]
-        legs = route.get("legs", [])
+        weight = sum(len(leg.steps) for r in data.routes for leg in r.legs)
+        text = await render(_format_transit, data, origin, destination, weight=weight)
+        return {"content": [{"type": "text", "text": text}]}
+
+    except WoosmapError as e:
+        logger.error(f"Transit route request failed: {e.message}")
+        return _error_response(e, {
+            "origin": origin,
+            "destination": destination,
+        })
+
+
+# -------------------------------------------------
+# Departure-time sweeps
+# -------------------------------------------------
+@dataclass(slots=True)
+class Itinerary:
+    """One distinct journey found by a sweep, reduced to its schedule."""
+
+    origin: int
+    departure: Optional[int]
+    arrival: Optional[int]
+    duration: int
+    summary: str
+
+
+_TAGS = re.compile(r"<[^>]+>")
+_RIDE = re.compile(r"^(?:take|board)\s+(?:the\s+)?|\s+(?:towards|to|direction)\s+.*$", re.I)
+_MAX_RIDES_SHOWN = 4
+
+
+def _ride_label(instructions: Optional[str]) -> str:
+    """Shorten "Take metro line 5 towards X" to "metro line 5"."""
+    return _RIDE.sub("", _TAGS.sub("", instructions or "")).strip()
+
+
+def _parse_time(value: str) -> tuple[datetime, bool]:
+    """Parse an ISO 8601 or Unix timestamp; the flag tells which format it was."""
+    value = value.strip()
+    if value.lstrip("-").isdigit():
+        return datetime.fromtimestamp(int(value), timezone.utc), True
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")), False
+    except ValueError:
+        raise WoosmapBadRequestError(
+            f"Invalid time {value!r}: expected ISO 8601 or a Unix timestamp"
+        ) from None
+
+
+def _departure_slots(
+    window_start: str, window_end: str, interval_minutes: int, origins: int = 1
+) -> list[str]:
+    """
+    Departure times every ``interval_minutes`` in the window, in the input's format.
+
+    Raises:
+        WoosmapBadRequestError: Invalid window, or searching every slot from
+            ``origins`` origins would exceed WOOSMAP_TRANSIT_SWEEP_MAX_REQUESTS
+            (checked before any slot is built).
+    """
+    start, unix = _parse_time(window_start)
+    end, _ = _parse_time(window_end)
+    if start.tzinfo is None and end.tzinfo is not None:
+        start = start.replace(tzinfo=end.tzinfo)
+    elif end.tzinfo is None and start.tzinfo is not None:
+        end = end.replace(tzinfo=start.tzinfo)
+    if end < start:
+        raise WoosmapBadRequestError("window_end is before window_start")
+    if interval_minutes <= 0:
+        raise WoosmapBadRequestError("interval_minutes must be positive")
+    step = timedelta(minutes=interval_minutes)
+    total = ((end - start) // step + 1) * origins
+    if total > TRANSIT_SWEEP_MAX_REQUESTS:
+        raise WoosmapBadRequestError(
+            f"Sweep needs {total} requests, more than the limit of "
+            f"{TRANSIT_SWEEP_MAX_REQUESTS}: widen interval_minutes or narrow the window"
+        )
+    slots = []
+    t = start
+    while t <= end:
+        slots.append(str(int(t.timestamp())) if unix else t.isoformat())
+        t += step
+    return slots
+
+
+def _itinerary(origin: int, route: TransitRoute) -> Itinerary:
+    legs = route.legs
+    departure = legs[0].departure_time.value if legs and legs[0].departure_time else None
+    arrival = legs[-1].arrival_time.value if legs and legs[-1].arrival_time else None
+    if departure is not None and arrival is not None:
+        duration = arrival - departure
+    else:
+        duration = route.duration or route.legs_duration
+    rides = [
+        label
+        for leg in legs
+        for step in leg.steps
+        if step.travel_mode != "WALKING" and (label := _ride_label(step.html_instructions))
+    ]
+    summary = " → ".join(rides[:_MAX_RIDES_SHOWN]) or "Walk"
+    if len(rides) > _MAX_RIDES_SHOWN:
+        summary += f" (+{len(rides) - _MAX_RIDES_SHOWN} more)"
+    return Itinerary(
+        origin,
+        int(departure) if departure is not None else None,
+        int(arrival) if arrival is not None else None,
+        int(duration),
+        summary,
+    )
+
+
+def _dedupe(itineraries: list[Itinerary]) -> list[Itinerary]:
+    """Drop journeys found by several departure slots, sorted by departure."""
+    seen: dict[tuple, Itinerary] = {}
+    for it in itineraries:
+        seen.setdefault((it.origin, it.departure, it.arrival, it.summary), it)
+    return sorted(
+        seen.values(),
+        key=lambda it: (it.origin, it.departure is None, it.departure or 0, it.duration),
+    )
 
-        lines = [
-            f"**Status:** {status}",
-            f"**Origin:** {origin}",
-            f"**Destination:** {destination}",
-            "",
-            "### Transit Itinerary",
+
+def _clock(timestamp: Optional[int], tz) -> str:
+    if timestamp is None:
+        return "?"
+    return datetime.fromtimestamp(timestamp, tz or timezone.utc).strftime("%H:%M")
+
+
+def _minutes(seconds: int) -> str:
+    minutes = round(seconds / 60)
+    return f"{minutes // 60} h {minutes % 60:02d} min" if minutes >= 60 else f"{minutes} min"
+
+
+def _format_sweep(
+    itineraries: list[Itinerary],
+    origins: list[str],
+    destination: str,
+    slots: list[str],
+    failures: list[tuple[str, str, str]],
+    tz,
+) -> str:
+    """Build the schedule table of a departure sweep."""
+    lines = [
+        f"**Destination:** {destination}",
+        f"**Departures searched:** {slots[0]} → {slots[-1]} "
+        f"({len(slots)} times × {len(origins)} origins)",
+        f"**Distinct itineraries:** {len(itineraries)}",
+    ]
+
+    earliest: dict[int, Itinerary] = {}
+    for i, origin in enumerate(origins):
+        found = [it for it in itineraries if it.origin == i]
+        lines += ["", f"#### Origin {i + 1}: {origin}"]
+        if not found:
+            lines.append("No itinerary found.")
+            continue
+        timed = [it for it in found if it.arrival is not None]
+        first = min(timed, key=lambda it: (it.arrival, it.duration)) if timed else None
+        shortest = min(found, key=lambda it: (it.duration, it.arrival or 0))
+        if first is not None:
+            earliest[i] = first
+            lines.append(
+                f"**Earliest arrival:** {_clock(first.arrival, tz)} "
+                f"(departs {_clock(first.departure, tz)}, {_minutes(first.duration)})"
+            )
+        lines.append(
+            f"**Shortest trip:** {_minutes(shortest.duration)} "
+            f"(departs {_clock(shortest.departure, tz)}, arrives {_clock(shortest.arrival, tz)})"
+        )
+        lines += ["", "| Departs | Arrives | Duration | Itinerary |", "|---|---|---|---|"]
+        for it in found:
+            marks = ("★" if it is first else "") + ("⏱" if it is shortest else "")
+            lines.append(
+                f"| {_clock(it.departure, tz)} | {_clock(it.arrival, tz)} "
+                f"| {_minutes(it.duration)} {marks}".rstrip() + f" | {it.summary} |"
+            )
+
+    if len(origins) > 1 and earliest:
+        best = min(earliest, key=lambda i: (earliest[i].arrival, earliest[i].duration))
+        lines += ["", f"**Best origin by earliest arrival:** origin {best + 1} ({origins[best]})"]
+
+    if failures:
+        lines += ["", f"**Failed requests:** {len(failures)}"]
+        lines += [
+            f"- {origin} at {slot}: {error}" for origin, slot, error in failures[:10]
         ]
+    return "### Transit Departure Sweep\n\n" + "\n".join(lines)
+
+
+@tool()
+async def sweep_transit_departures(
+    origins: List[str],
+    destination: str,
+    window_start: str,
+    window_end: str,
+    language: str,
+    interval_minutes: int = 15,
+    transit_modes: Optional[List[str]] = None,
+    ctx: Optional[Context] = None,
+) -> Dict[str, Any]:
+    """
+    Find the best departure times for a transit trip, from one or more origins,
+    using Woosmap Transit Route API.
+
+    Searches every departure time in the window (e.g. every 15 minutes between
+    7:00 and 9:00) for each origin, merges identical itineraries and returns a
+    schedule table with the earliest arrival and shortest trip per origin.
 
-        total_duration = 0
-        total_distance = 0
-
-        for leg in legs:
-            leg_distance = leg.get("distance", {}).get("value", 0)
-            leg_duration = leg.get("duration", {}).get("value", 0)
-
-            total_distance += leg_distance
-            total_duration += leg_duration
-
-            steps = leg.get("steps", [])
-            for step in steps:
-                travel_mode = step.get("travel_mode", "UNKNOWN")
-                instruction = step.get("html_instructions", "")
-                lines.append(f"- **{travel_mode}**: {instruction}")
-
-        lines.append("")
-        lines.append(f"**Total distance:** {total_distance} m")
-        lines.append(f"**Total duration:** {total_duration} sec")
-
-        return {
-            "content": [
-                {
-                    "type": "text",
-                    "text": (
-                        "### Transit Route Summary\n\n"
-                        + "\n".join(lines)
-                        + "\n\n---\n\n"
-                        "**Raw response:**\n" + json.dumps(data, indent=2)
-                    ),
-                }
-            ]
-        }
+    Args:
+        origins: List of "lat,lng" start points to compare.
+        destination: "lat,lng" of the end point.
+        window_start: First departure time (ISO 8601 or Unix timestamp).
+        window_end: Last departure time (ISO 8601 or Unix timestamp).
+        language: Request language (ISO code).
+        interval_minutes: Minutes between searched departure times.
+        transit_modes: Allowed transit modes
+            (e.g. ["bus","subway","train","tram","rail"]).
+    """
+    try:
+        if not origins:
+            raise WoosmapBadRequestError("At least one origin is required")
+        slots = _departure_slots(window_start, window_end, interval_minutes, len(origins))
+
+        common: Dict[str, Any] = {"destination": destination}
+        if language:
+            common["language"] = language
+        if transit_modes:
+            common["transit_modes"] = "|".join(transit_modes)
+
+        searches = [(i, slot) for i in range(len(origins)) for slot in slots]
+
+        async def search(item: tuple[int, str]) -> TransitResponse:
+            i, slot = item
+            params = {**common, "origin": origins[i], "departure_time": slot}
+            return await make_woosmap_request("transit/route", params, model=TransitResponse)
+
+        def describe(index: int, item: tuple[int, str], result: Any) -> str:
+            i, slot = item
+            outcome = result.message if isinstance(result, WoosmapError) else (
+                f"{len(result.routes)} itineraries"
+            )
+            return f"Origin {i + 1} at {slot}: {outcome}"
+
+        results = await run_batch(searches, search, ctx, describe)
+
+        errors = [r for r in results if isinstance(r, WoosmapError)]
+        if errors and len(errors) == len(results):
+            raise errors[0]
+
+        itineraries = []
+        failures = []
+        for (i, slot), result in zip(searches, results):
+            if isinstance(result, WoosmapError):
+                failures.append((origins[i], slot, f"{result.__class__.__name__}: {result.message}"))
+                continue
+            itineraries.extend(_itinerary(i, route) for route in result.routes)
+
+        tz = _parse_time(window_start)[0].tzinfo
+        text = await render(
+            _format_sweep, _dedupe(itineraries), origins, destination, slots, failures, tz,
+            weight=len(itineraries),
+        )
+        return {"content": [{"type": "text", "text": text}]}
 
     except WoosmapError as e:
-        logger.error(f"Transit route request failed: {e.message}")
+        logger.error(f"Transit sweep failed: {e.message}")
         return _error_response(e, {
-            "origin": origin,
+            "origins": origins,
             "destination": destination,
+            "window": [window_start, window_end],
         })
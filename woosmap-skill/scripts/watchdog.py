@@ -0,0 +1,230 @@
+"""
+Event-loop and memory watchdog.
+
+Every ``WOOSMAP_WATCHDOG_INTERVAL`` seconds the watchdog reads the event-loop
+lag (measured by the probe of ``metrics.py``) and the process RSS, and
+exports them with the number of open SSE sessions and the memory added per
+session since startup. It also:
+
+- logs the Python stack of the event-loop thread when the loop has not run
+  for ``WOOSMAP_WATCHDOG_STALL`` seconds, from a helper thread, so the code
+  blocking every session is named while it is still blocking;
+- logs the top allocation sites (tracemalloc) when RSS crosses
+  ``WOOSMAP_WATCHDOG_RSS_MB``: the sites that grew most over a
+  ``TRACE_WINDOW`` traced for the report and stopped afterwards, or, with
+  ``WOOSMAP_WATCHDOG_TRACEMALLOC=1`` tracing for the whole process, the
+  growth since the previous report. Snapshots are taken and compared off the
+  event loop;
+- marks the server saturated while the smoothed lag is above
+  ``WOOSMAP_SHED_LAG`` seconds, RSS is above ``WOOSMAP_SHED_RSS_MB`` or
+  ``WOOSMAP_MAX_SESSIONS`` sessions are open. ``server.py`` then answers new
+  SSE sessions with 503 and Retry-After; open sessions are kept.
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from metrics import metrics
+from profiling import TRACEMALLOC_FRAMES, collapsed_stack
+
+logger = logging.getLogger(__name__)
+
+WATCHDOG_INTERVAL = float(os.getenv("WOOSMAP_WATCHDOG_INTERVAL", "1"))
+STALL_SECONDS = float(os.getenv("WOOSMAP_WATCHDOG_STALL", "1"))
+RSS_ALERT_MB = float(os.getenv("WOOSMAP_WATCHDOG_RSS_MB", "0"))
+TRACEMALLOC_AT_START = os.getenv("WOOSMAP_WATCHDOG_TRACEMALLOC", "0") == "1"
+SHED_LAG = float(os.getenv("WOOSMAP_SHED_LAG", "0"))
+SHED_RSS_MB = float(os.getenv("WOOSMAP_SHED_RSS_MB", "0"))
+MAX_SESSIONS = int(os.getenv("WOOSMAP_MAX_SESSIONS", "0"))
+# Minimum time between two allocation reports.
+REPORT_COOLDOWN = 300.0
+# Seconds allocations are traced for a report when tracing is not always on.
+TRACE_WINDOW = 30.0
+# Weight of the newest lag sample in the smoothed lag.
+LAG_SMOOTHING = 0.3
+TOP_ALLOCATIONS = 15
+# Innermost frames logged for a stalled loop.
+STALL_FRAMES = 8
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def rss_bytes() -> Optional[int]:
+    """Resident set size of this process, or None where it cannot be read."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    # Peak rather than current RSS; kilobytes on Linux, bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class Watchdog:
+    """Loop-stall, memory and saturation monitor of one event loop."""
+
+    def __init__(self):
+        self.sessions = 0
+        self.lag = 0.0
+        self.rss: Optional[int] = None
+        self.saturated = False
+        self.reason: Optional[str] = None
+        self._baseline: Optional[int] = None
+        self._tick = time.monotonic()
+        self._loop_thread: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._report: Optional[asyncio.Task] = None
+        self._last_report = -REPORT_COOLDOWN
+        self._last_snapshot: Optional[tracemalloc.Snapshot] = None
+
+    # ---- sessions ----
+    @contextmanager
+    def session(self) -> Iterator[None]:
+        """Count an open SSE session for the duration of the block."""
+        self.sessions += 1
+        metrics.set("woosmap_sessions_open", self.sessions)
+        try:
+            yield
+        finally:
+            self.sessions -= 1
+            metrics.set("woosmap_sessions_open", self.sessions)
+
+    def admit(self) -> bool:
+        """Should a new session be accepted? Counts the ones turned away."""
+        if MAX_SESSIONS and self.sessions >= MAX_SESSIONS:
+            self._set_saturated(f"{self.sessions} sessions open")
+        if self.saturated:
+            metrics.inc("woosmap_sessions_shed_total")
+            return False
+        return True
+
+    # ---- monitoring ----
+    def start(self) -> None:
+        """Start watching the running loop (idempotent)."""
+        if self._task is not None and not self._task.done():
+            return
+        if TRACEMALLOC_AT_START and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        self._loop_thread = threading.get_ident()
+        self._tick = time.monotonic()
+        self._baseline = rss_bytes()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        if STALL_SECONDS > 0:
+            threading.Thread(
+                target=self._watch_stalls, args=(self._task,), name="watchdog", daemon=True
+            ).start()
+
+    async def _run(self) -> None:
+        while True:
+            self._tick = time.monotonic()
+            self.check()
+            await asyncio.sleep(WATCHDOG_INTERVAL)
+
+    def check(self) -> None:
+        """Refresh the gauges, report memory and update the saturation state."""
+        lag = metrics.get("woosmap_event_loop_lag_seconds") or 0.0
+        self.lag = LAG_SMOOTHING * lag + (1 - LAG_SMOOTHING) * self.lag
+        self.rss = rss_bytes()
+        if self.rss is not None:
+            metrics.set("woosmap_process_rss_bytes", self.rss)
+            if self.sessions and self._baseline is not None:
+                metrics.set(
+                    "woosmap_session_memory_bytes",
+                    max(0, self.rss - self._baseline) / self.sessions,
+                )
+            if RSS_ALERT_MB and self.rss > RSS_ALERT_MB * 2**20:
+                self._start_report()
+
+        if SHED_LAG and self.lag > SHED_LAG:
+            self._set_saturated(f"event loop lag {self.lag * 1e3:.0f} ms")
+        elif SHED_RSS_MB and self.rss is not None and self.rss > SHED_RSS_MB * 2**20:
+            self._set_saturated(f"RSS {self.rss / 2**20:.0f} MB")
+        elif MAX_SESSIONS and self.sessions >= MAX_SESSIONS:
+            self._set_saturated(f"{self.sessions} sessions open")
+        else:
+            self._set_saturated(None)
+
+    def _set_saturated(self, reason: Optional[str]) -> None:
+        saturated = reason is not None
+        if saturated != self.saturated:
+            if saturated:
+                logger.warning(f"Server saturated ({reason}); new sessions are refused")
+            else:
+                logger.info(f"Server no longer saturated ({self.reason} cleared)")
+        self.saturated = saturated
+        self.reason = reason
+        metrics.set("woosmap_saturated", int(saturated))
+
+    def _start_report(self) -> None:
+        now = time.monotonic()
+        if now - self._last_report < REPORT_COOLDOWN or (self._report and not self._report.done()):
+            return
+        self._last_report = now
+        self._report = asyncio.get_running_loop().create_task(self._report_allocations())
+
+    async def _report_allocations(self) -> None:
+        rss_mb = self.rss / 2**20 if self.rss is not None else 0
+        if TRACEMALLOC_AT_START and tracemalloc.is_tracing():
+            snapshot = await asyncio.to_thread(_snapshot)
+            previous, self._last_snapshot = self._last_snapshot, snapshot
+            sites = await asyncio.to_thread(_sites, snapshot, previous)
+            since = "since the previous report" if previous is not None else "since startup"
+        else:
+            # Tracing roughly doubles allocation costs: only for the window.
+            started = not tracemalloc.is_tracing()
+            if started:
+                tracemalloc.start(TRACEMALLOC_FRAMES)
+            try:
+                before = await asyncio.to_thread(_snapshot)
+                await asyncio.sleep(TRACE_WINDOW)
+                after = await asyncio.to_thread(_snapshot)
+            finally:
+                if started:
+                    tracemalloc.stop()
+            sites = await asyncio.to_thread(_sites, after, before)
+            since = f"over {TRACE_WINDOW:g}s"
+        logger.warning(
+            f"RSS {rss_mb:.0f} MB is above {RSS_ALERT_MB:.0f} MB; top allocation sites {since}:\n"
+            + "\n".join(sites)
+        )
+
+    def _watch_stalls(self, task: asyncio.Task) -> None:
+        reported = None
+        while not task.done():
+            time.sleep(min(STALL_SECONDS, WATCHDOG_INTERVAL) / 2)
+            tick = self._tick
+            stalled = time.monotonic() - tick - WATCHDOG_INTERVAL
+            if stalled < STALL_SECONDS or reported == tick:
+                continue
+            reported = tick
+            frame = sys._current_frames().get(self._loop_thread)
+            where = collapsed_stack(frame).split(";")[-STALL_FRAMES:] if frame is not None else ["unknown"]
+            metrics.inc("woosmap_event_loop_stalls_total")
+            logger.warning(f"Event loop blocked for over {stalled:.1f}s in: {' > '.join(where)}")
+
+
+def _snapshot() -> tracemalloc.Snapshot:
+    return tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+
+
+def _sites(snapshot: tracemalloc.Snapshot, previous: Optional[tracemalloc.Snapshot]) -> list[str]:
+    """Top allocation sites of a snapshot, by growth since ``previous`` if given."""
+    if previous is not None:
+        stats = snapshot.compare_to(previous, "lineno")[:TOP_ALLOCATIONS]
+        return [f"  {s.traceback[0]}: {s.size / 1024:.0f} KiB ({s.size_diff / 1024:+.0f} KiB)" for s in stats]
+    stats = snapshot.statistics("lineno")[:TOP_ALLOCATIONS]
+    return [f"  {s.traceback[0]}: {s.size / 1024:.0f} KiB in {s.count} blocks" for s in stats]
+
+
+watchdog = Watchdog()
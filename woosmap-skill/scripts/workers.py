@@ -0,0 +1,179 @@
+"""
+Multi-worker launcher for the HTTP/SSE server.
+
+The launcher starts N copies of ``server.py`` on private loopback ports and
+serves a small proxy on the public port. New SSE streams go to the worker
+with the fewest open streams. Each worker advertises a ``/w<id>/messages/``
+path, so the proxy routes every POST of a session back to the worker that
+owns its stream (session affinity without any shared session table).
+
+All workers share one state directory, which holds the disk cache tier and
+the rate-limit bucket, so adding workers does not multiply upstream usage.
+"""
+import contextlib
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+import httpx
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+logger = logging.getLogger(__name__)
+
+WORKER_PORT_BASE = int(os.getenv("WOOSMAP_WORKER_PORT_BASE", "9100"))
+
+# Hop-by-hop headers must not be forwarded by a proxy.
+_HOP_HEADERS = {
+    "connection",
+    "keep-alive",
+    "proxy-authenticate",
+    "proxy-authorization",
+    "te",
+    "trailers",
+    "transfer-encoding",
+    "upgrade",
+    "host",
+    "content-length",
+}
+
+
+def _forward_headers(headers) -> dict[str, str]:
+    return {k: v for k, v in headers.items() if k.lower() not in _HOP_HEADERS}
+
+
+def build_proxy(ports: list[int]) -> Starlette:
+    """Build the front proxy routing requests to workers listening on ``ports``."""
+    client = httpx.AsyncClient(timeout=httpx.Timeout(None, connect=5.0))
+    open_streams = [0] * len(ports)
+    next_worker = [0]
+
+    async def forward(request: Request, idx: int, on_close=None, path=None) -> Response:
+        url = f"http://127.0.0.1:{ports[idx]}{path or request.url.path}"
+        upstream = client.build_request(
+            request.method,
+            url,
+            params=request.query_params,
+            headers=_forward_headers(request.headers),
+            content=await request.body(),
+        )
+        try:
+            resp = await client.send(upstream, stream=True)
+        except httpx.TransportError as e:
+            if on_close:
+                on_close()
+            logger.error(f"Worker {idx} unavailable: {e}")
+            return JSONResponse({"error": "worker unavailable"}, status_code=503)
+
+        async def body():
+            try:
+                async for chunk in resp.aiter_raw():
+                    yield chunk
+            finally:
+                await resp.aclose()
+                if on_close:
+                    on_close()
+
+        return StreamingResponse(
+            body(),
+            status_code=resp.status_code,
+            headers=_forward_headers(resp.headers),
+        )
+
+    async def sse(request: Request) -> Response:
+        idx = min(range(len(ports)), key=open_streams.__getitem__)
+        open_streams[idx] += 1
+
+        def release():
+            open_streams[idx] -= 1
+
+        return await forward(request, idx, on_close=release)
+
+    async def messages(request: Request) -> Response:
+        idx = request.path_params["worker"]
+        if idx >= len(ports):
+            return JSONResponse({"error": "unknown worker"}, status_code=404)
+        return await forward(request, idx)
+
+    async def admin(request: Request) -> Response:
+        # /w<id>/admin/... targets one worker, e.g. to profile it.
+        idx = request.path_params["worker"]
+        if idx >= len(ports):
+            return JSONResponse({"error": "unknown worker"}, status_code=404)
+        return await forward(request, idx, path=f"/admin/{request.path_params['path']}")
+
+    async def merged_metrics(request: Request) -> Response:
+        # Samples carry a worker label; group them by metric family.
+        families: dict[str, list[str]] = {}
+        for worker_port in ports:
+            try:
+                resp = await client.get(f"http://127.0.0.1:{worker_port}/metrics")
+            except httpx.TransportError:
+                continue
+            family = None
+            for line in resp.text.splitlines():
+                if line.startswith("# TYPE "):
+                    family = line.split()[2]
+                    families.setdefault(family, [line])
+                elif line and family:
+                    families[family].append(line)
+        body = "\n".join(line for name in sorted(families) for line in families[name])
+        return PlainTextResponse(body + "\n")
+
+    async def other(request: Request) -> Response:
+        idx = next_worker[0] % len(ports)
+        next_worker[0] += 1
+        return await forward(request, idx)
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        yield
+        await client.aclose()
+
+    return Starlette(
+        routes=[
+            Route("/sse", sse, methods=["GET"]),
+            Route("/w{worker:int}/messages/", messages, methods=["POST"]),
+            Route("/w{worker:int}/admin/{path:path}", admin, methods=["GET", "POST"]),
+            Route("/metrics", merged_metrics, methods=["GET"]),
+            Route("/{path:path}", other, methods=["GET", "POST", "HEAD"]),
+        ],
+        lifespan=lifespan,
+    )
+
+
+def serve_workers(workers: int, host: str, port: int) -> None:
+    """Run ``workers`` server processes behind the affinity proxy."""
+    state_dir = os.getenv("WOOSMAP_STATE_DIR") or tempfile.mkdtemp(prefix="woosmap-state-")
+    ports = [WORKER_PORT_BASE + i for i in range(workers)]
+    logger.info(f"Starting {workers} workers on ports {ports}, state in {state_dir}")
+
+    procs = []
+    for i, worker_port in enumerate(ports):
+        env = {**os.environ, "WOOSMAP_WORKER_ID": str(i), "WOOSMAP_STATE_DIR": state_dir}
+        procs.append(
+            subprocess.Popen(
+                [
+                    sys.executable, "-m", "uvicorn", "server:app",
+                    "--host", "127.0.0.1",
+                    "--port", str(worker_port),
+                    "--log-level", "info",
+                ],
+                cwd=Path(__file__).parent,
+                env=env,
+            )
+        )
+
+    try:
+        uvicorn.run(build_proxy(ports), host=host, port=port, log_level="info")
+    finally:
+        for proc in procs:
+            proc.terminate()
+        for proc in procs:
+            proc.wait(timeout=10)